@@ -2,7 +2,6 @@ import os
 from colorama import Fore, Style
 from itertools import groupby
 import pandas as pd
-import networkx as nx
 import os
 import datetime
 import sys
@@ -10,6 +9,8 @@ from time import mktime
 
 import psycopg
 
+from topology_loader import binary_topology_file, load_topology
+
 cones = dict()
 degrees = dict()
 
@@ -19,21 +20,15 @@ degrees = dict()
 
 def load_all_degrees(date, db_dir):
     fn = "{}/merged_topology/{}.txt".format(db_dir, date)
-    if not os.path.exists(fn):
+    if not os.path.exists(fn) and not os.path.exists(binary_topology_file(fn)):
         err_msg("Unable to find degree file {} on local disk".format(fn))
         exit(1)
 
-    G = nx.Graph()
-
-    with open(fn, "r") as f:
-        for line in f:
-            as1 = line.replace("\n", "").split(" ")[0]
-            as2 = line.replace("\n", "").split(" ")[1]
-
-            G.add_edge(as1, as2)
+    # The degrees are read from the binary snapshot when available
+    topo = load_topology(fn)
 
-    for node in G.nodes:
-        degrees[node] = G.degree[node]
+    for node, degree in topo.degrees().items():
+        degrees[str(node)] = degree
 
 
 ####
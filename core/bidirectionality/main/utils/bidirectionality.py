@@ -1,10 +1,13 @@
 import os
 import pickle
 import csv
+import numpy as np
 import pandas as pd
-import networkx as nx
 from datetime import datetime, timedelta
 
+from utils.topology_index import read_topology_file_keys, pack_directed
+from utils.irr_store import iter_irr_files_keys
+
 from colorama import Fore
 from colorama import Style
 from colorama import init
@@ -14,98 +17,63 @@ init(autoreset=True)
 def print_prefix():
     return Fore.BLUE+Style.BRIGHT+"[bidirectionality.py]: "+Style.NORMAL
 
-def topo_merger_bgp_irr(bgp_topo_file, irr_topo_file):
-    topo = nx.DiGraph()
-
-    # Read the topology inferred from BGP updates and rib.
-    with open(bgp_topo_file, 'r') as fd:
-        for line in fd.readlines():
-            if line.startswith('#'):
-                continue
-
-            linetab = line.rstrip('\n').split(' ')
-            as1 = int(linetab[0])
-            as2 = int(linetab[1])
-
-            topo.add_edge(as1, as2)
+# Sorted directed links (as1 << 32 | as2) of the BGP topology merged with the IRR topology.
+def topo_merger_bgp_irr(bgp_topo_file, irr_keys):
+    return np.union1d(read_topology_file_keys(bgp_topo_file), np.asarray(irr_keys, dtype=np.uint64))
 
-    # Read the topology inferred from IRR.
-    with open(irr_topo_file, 'r') as fd:
-        for line in fd.readlines():
-            if line.startswith('#'):
-                continue
 
-            linetab = line.rstrip('\n').split(' ')
-            try:
-                as1 = int(linetab[0].replace('as', ''))
-                as2 = int(linetab[1])
-            except ValueError:
-                pass
-                # print (print_prefix()+'Error in the IRR parsed graph: {} in {}'.format(linetab, irr_topo_file)) 
+# Returns, for every key of queries, whether it is in the sorted keys and its position there.
+def lookup_keys(keys, queries):
+    pos = np.searchsorted(keys, queries)
+    found = pos < len(keys)
+    found[found] = keys[pos[found]] == queries[found]
 
-            topo.add_edge(as1, as2)
-
-    return topo
+    return found, np.minimum(pos, max(len(keys) - 1, 0))
 
 
 def bidirectional_links(links, rib_file: str, bgp_topo_files: list, irr_topo_files: list, threshold_days_appearance: int=2):
-    df = pd.DataFrame(columns=['as1', 'as2', 'bidi'])
-    topo_updates = nx.DiGraph()
-    topo_rib = nx.DiGraph()
-
     # First, Merge topology (irr & bgp together) from multiple consecutive days.
-    for bgp_topo_file, irr_topo_file in zip(bgp_topo_files, irr_topo_files):
+    # The IRR topologies are read from the IRR store (one base plus daily deltas).
+    all_keys = []
+    for bgp_topo_file, irr_topo_file, irr_keys in zip(bgp_topo_files, irr_topo_files, iter_irr_files_keys(irr_topo_files)):
         print (print_prefix()+'Processing update files {} and {}.'.format(bgp_topo_file, irr_topo_file))
 
-        tmp = topo_merger_bgp_irr(bgp_topo_file, irr_topo_file)
+        all_keys.append(topo_merger_bgp_irr(bgp_topo_file, irr_keys))
 
-        # For every edge, count the number of days that it appears.
-        for as1, as2 in tmp.edges():
-            if topo_updates.has_edge(as1, as2):
-                topo_updates[as1][as2]['count'] += 1
-            else:
-                topo_updates.add_edge(as1, as2)
-                topo_updates[as1][as2]['count'] = 1
+    # For every edge, count the number of days that it appears (every day has unique keys).
+    if len(all_keys) > 0:
+        keys_updates, count_updates = np.unique(np.concatenate(all_keys), return_counts=True)
+    else:
+        keys_updates, count_updates = np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
 
     # Second, load the rib dump of the next month, if it exists.
     print (print_prefix()+'Processing RIB file {}.'.format(rib_file))
 
     if rib_file is not None:
-        with open(rib_file, 'r') as fd:
-            for line in fd.readlines():
-                if line.startswith('#'):
-                    continue
-
-                linetab = line.rstrip('\n').split(' ')
-                as1 = int(linetab[0])
-                as2 = int(linetab[1])
-
-                topo_rib.add_edge(as1, as2)
-
-    # # Just a print: TO BE REMOVED.
-    # for as1, as2 in topo_updates.edges():
-    #     if topo_updates.has_edge(as1, as2) and \
-    #      topo_updates.has_edge(as2, as1) and \
-    #      (topo_updates[as1][as2]['count'] < threshold_days_appearance or \
-    #      topo_updates[as2][as1]['count'] < threshold_days_appearance):
-    #         print (as1, as2, topo_updates[as1][as2]['count'], topo_updates[as2][as1]['count'])
-    
+        keys_rib = read_topology_file_keys(rib_file)
+    else:
+        keys_rib = np.empty(0, dtype=np.uint64)
+
     # Third, keep the links that appear in both directions:
     # - for at least threshold_days_appearance days in update-bases snapshots.
     # - if it appears in the rib-based topology of the following month.
-    for as1, as2 in links:
-        if (topo_updates.has_edge(as1, as2) and \
-            topo_updates.has_edge(as2, as1) and \
-            topo_updates[as1][as2]['count'] >= threshold_days_appearance and \
-            topo_updates[as2][as1]['count'] >= threshold_days_appearance) or\
-            topo_rib.has_edge(as1, as2) and topo_rib.has_edge(as2, as1):
-            
-            df.loc[len(df)] = [as1, as2, 1]
-        else:
-            df.loc[len(df)] = [as1, as2, 0]
-
-
-    return df
+    links = list(links)
+    as1s = np.array([as1 for as1, _ in links], dtype=np.int64)
+    as2s = np.array([as2 for _, as2 in links], dtype=np.int64)
+    forward = pack_directed(as1s, as2s)
+    backward = pack_directed(as2s, as1s)
+
+    threshold = max(threshold_days_appearance, 1)
+    found_fwd, pos_fwd = lookup_keys(keys_updates, forward)
+    found_bwd, pos_bwd = lookup_keys(keys_updates, backward)
+    bidi_updates = found_fwd & found_bwd
+    if len(count_updates) > 0:
+        bidi_updates &= (count_updates[pos_fwd] >= threshold) & (count_updates[pos_bwd] >= threshold)
+
+    bidi_rib = lookup_keys(keys_rib, forward)[0] & lookup_keys(keys_rib, backward)[0]
+
+    return pd.DataFrame({'as1': [as1 for as1, _ in links], 'as2': [as2 for _, as2 in links], \
+        'bidi': (bidi_updates | bidi_rib).astype(np.int64)}, columns=['as1', 'as2', 'bidi'])
    
 if __name__ == "__main__":
     lbf = LinkBidirectionalityFeaturesComputation( \
@@ -0,0 +1,259 @@
+import os
+import re
+import numpy as np
+from datetime import datetime, timedelta
+import click
+
+from colorama import Fore
+from colorama import Style
+
+
+####
+# Rolling store of the IRR topologies (irr/<date>.txt). Every day has one file
+# irr_store/YYYY-MM/DD.npz with the sorted directed links (as1 << 32 | as2):
+#
+#   base days    keys               all the links of the day
+#   delta days   added, removed     links added and removed since the day before
+#
+# A day is stored as a delta when the day before is in the store, and as a
+# base otherwise or on the first day of the month (so at most one month of
+# deltas is replayed to rebuild a day). The IRR changes little from one day
+# to the next, so a 30-day window is read from one base plus small deltas.
+####
+
+def print_prefix():
+    return Fore.CYAN+Style.BRIGHT+"[IrrEdgeStore]: "+Style.NORMAL
+
+
+def pack_directed(as1, as2):
+    return (np.asarray(as1, dtype=np.uint64) << np.uint64(32)) | np.asarray(as2, dtype=np.uint64)
+
+
+def unpack_directed(keys):
+    keys = np.asarray(keys, dtype=np.uint64)
+    return (keys >> np.uint64(32)).astype(np.int64), (keys & np.uint64(0xFFFFFFFF)).astype(np.int64)
+
+
+####
+# Sorted directed links of IRR links (as1, as2), as written in irr/<date>.txt.
+# The links that are not made of two 32-bit ASNs are ignored.
+####
+
+def links_to_keys(links):
+    as1s = []
+    as2s = []
+    for as1, as2 in links:
+        try:
+            as1 = int(str(as1).replace('as', ''))
+            as2 = int(as2)
+        except ValueError:
+            continue
+        if 0 <= as1 < 2**32 and 0 <= as2 < 2**32:
+            as1s.append(as1)
+            as2s.append(as2)
+
+    return np.unique(pack_directed(as1s, as2s))
+
+
+def read_irr_file(filename):
+    links = []
+    with open(filename, 'r') as fd:
+        for line in fd:
+            if line.startswith('#'):
+                continue
+            linetab = line.rstrip('\n').split(' ')
+            if len(linetab) >= 2:
+                links.append((linetab[0], linetab[1]))
+
+    return links_to_keys(links)
+
+
+class IrrEdgeStore:
+    def __init__(self, db_dir: str):
+        self.db_dir = db_dir
+        self.store_dir = db_dir+'/irr_store'
+
+    def text_filename(self, date):
+        return self.db_dir+'/irr/'+date.strftime("%Y-%m-%d")+'.txt'
+
+    def filename(self, date):
+        return self.store_dir+'/'+date.strftime("%Y-%m")+'/'+date.strftime("%d")+'.npz'
+
+    def has_day(self, date):
+        return os.path.isfile(self.filename(date))
+
+    def is_base(self, date):
+        with np.load(self.filename(date)) as part:
+            return 'keys' in part.files
+
+    def write(self, date, **arrays):
+        fname = self.filename(date)
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        fname_tmp = fname+'.{}.tmp'.format(os.getpid())
+        with open(fname_tmp, 'wb') as fd:
+            np.savez(fd, **arrays)
+        os.replace(fname_tmp, fname)
+
+    def write_day(self, date, keys, prev_keys=None):
+        if prev_keys is None or date.day == 1:
+            self.write(date, keys=keys)
+        else:
+            self.write(date, added=np.setdiff1d(keys, prev_keys, assume_unique=True), \
+                removed=np.setdiff1d(prev_keys, keys, assume_unique=True))
+
+    ####
+    # Stores the IRR links of a day (sorted directed keys). If the next day is
+    # a delta, it is rewritten against the new links of this day.
+    ####
+
+    def ingest(self, date, keys):
+        keys = np.unique(np.asarray(keys, dtype=np.uint64))
+        next_date = date + timedelta(days=1)
+        next_keys = self.day(next_date) if self.has_day(next_date) and not self.is_base(next_date) else None
+
+        self.write_day(date, keys, self.day(date - timedelta(days=1)))
+        if next_keys is not None:
+            self.write_day(next_date, next_keys, keys)
+
+    def is_up_to_date(self, date):
+        text_file = self.text_filename(date)
+        return self.has_day(date) and (not os.path.isfile(text_file) or os.path.getmtime(text_file) <= os.path.getmtime(self.filename(date)))
+
+    # Stores the links of irr/<date>.txt. Returns False if there is no such file.
+    def ingest_file(self, date):
+        if not os.path.isfile(self.text_filename(date)):
+            return False
+
+        self.ingest(date, read_irr_file(self.text_filename(date)))
+        return True
+
+    # Applies the delta or base of a day to the links of the day before.
+    def apply(self, date, prev_keys):
+        with np.load(self.filename(date)) as part:
+            if 'keys' in part.files:
+                return part['keys']
+            if prev_keys is None:
+                return None
+            keys = np.setdiff1d(prev_keys, part['removed'], assume_unique=True)
+            return np.union1d(keys, part['added'])
+
+    # Returns the sorted directed links of a day, or None if the day is not in the store.
+    def day(self, date):
+        # Go back to the last base.
+        chain = []
+        cur_date = date
+        while self.has_day(cur_date):
+            chain.append(cur_date)
+            if self.is_base(cur_date):
+                break
+            cur_date -= timedelta(days=1)
+        else:
+            return None
+
+        keys = None
+        for cur_date in reversed(chain):
+            keys = self.apply(cur_date, keys)
+
+        return keys
+
+    # Same as day, rebuilt from the links of prev_date if it is the day before.
+    def day_after(self, date, prev_date=None, prev_keys=None):
+        if prev_keys is not None and date == prev_date + timedelta(days=1) and self.has_day(date):
+            return self.apply(date, prev_keys)
+
+        return self.day(date)
+
+    ####
+    # Yields (date, links of the day) for the given dates, in increasing
+    # order. Consecutive days are rebuilt from the day before, so a window is
+    # read from one base plus the deltas. The links are None for the days that
+    # are not in the store.
+    ####
+
+    def iter_days(self, dates):
+        prev_date = None
+        prev_keys = None
+
+        for date in sorted(dates):
+            keys = self.day_after(date, prev_date, prev_keys)
+            yield date, keys
+            prev_date, prev_keys = date, keys
+
+    ####
+    # Number of days among dates during which every directed link of keys is
+    # in the IRR (the days that are not in the store count as absent).
+    ####
+
+    def presence_counts(self, dates, keys):
+        keys = np.asarray(keys, dtype=np.uint64)
+        counts = np.zeros(len(keys), dtype=np.int64)
+
+        for _, day_keys in self.iter_days(dates):
+            if day_keys is not None:
+                counts += np.isin(keys, day_keys)
+
+        return counts
+
+
+####
+# Yields the sorted directed links of irr/<date>.txt files, in order. The
+# files are read through the store of their database (consecutive days are
+# rebuilt from the day before), and stored first if needed. Any other file
+# with one "as1 as2" link per line is parsed directly.
+####
+
+def iter_irr_files_keys(filenames):
+    prev = {}
+
+    for filename in filenames:
+        keys = None
+
+        m = re.match(r'^(.*)/irr/+(\d{4}-\d{2}-\d{2})\.txt$', filename)
+        if m is not None:
+            store = IrrEdgeStore(m.group(1))
+            date = datetime.strptime(m.group(2), "%Y-%m-%d")
+            prev_date, prev_keys = prev.get(m.group(1), (None, None))
+
+            if not store.is_up_to_date(date):
+                store.ingest_file(date)
+            keys = store.day_after(date, prev_date, prev_keys)
+            prev[m.group(1)] = (date, keys)
+
+        if keys is None:
+            keys = read_irr_file(filename)
+
+        yield keys
+
+
+# Migration tool, stores the existing IRR topologies of a database.
+@click.command()
+@click.option('--db_dir', default="db", help='Directory where is database.', type=str)
+@click.option('--date_start', default=None, help='First day to store, in the format "YYYY-MM-DD". Default is the first day of the irr directory.', type=str)
+@click.option('--date_end', default=None, help='Last day to store (included), in the format "YYYY-MM-DD". Default is the last day of the irr directory.', type=str)
+@click.option('--override', default=False, help='Store again the days that already are in the store.', type=bool)
+
+def build_irr_store(db_dir, date_start, date_end, override):
+    """ Build the rolling store of the IRR topologies."""
+
+    all_dates = []
+    for f in os.listdir(db_dir+'/irr'):
+        m = re.match(r'^(\d{4}-\d{2}-\d{2})\.txt$', f)
+        if m is not None:
+            all_dates.append(m.group(1))
+
+    store = IrrEdgeStore(db_dir)
+    nb_done = 0
+    for datestr in sorted(all_dates):
+        if (date_start is not None and datestr < date_start) or (date_end is not None and datestr > date_end):
+            continue
+
+        date = datetime.strptime(datestr, "%Y-%m-%d")
+        if override or not store.has_day(date):
+            store.ingest_file(date)
+            nb_done += 1
+            print (print_prefix()+'{}: stored.'.format(datestr))
+
+    print (print_prefix()+'{} days stored.'.format(nb_done))
+
+if __name__ == "__main__":
+    build_irr_store()
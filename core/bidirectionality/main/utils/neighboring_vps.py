@@ -1,6 +1,6 @@
 import sys
 import urllib.request
-import networkx as nx
+from utils.topology_loader import load_topology
 import pandas as pd
 
 
@@ -59,19 +59,8 @@ def get_vps():
 
 class CountNeighboringVPs:
     def __init__(self, topo_file):
-        self.topo = nx.Graph()
-
-        # Load the graph on which the features will be computed.
-        with open(topo_file, 'r') as fd:
-            for line in fd.readlines():
-                if line.startswith('#'):
-                    continue
-
-                linetab = line.rstrip('\n').split(' ')
-                as1 = int(linetab[0])
-                as2 = int(linetab[1])
-
-                self.topo.add_edge(as1, as2)
+        # Load the graph, the binary snapshot of the topology is memory-mapped when available.
+        self.topo = load_topology(topo_file)
 
         self.vps = get_vps()
         self.features = None
@@ -80,7 +69,7 @@ class CountNeighboringVPs:
     def number_of_ngh_vps(self, asn):
         vps_set = set()
 
-        if asn not in self.topo.nodes:
+        if not self.topo.has_node(asn):
             return vps_set
 
         for ngh in self.topo.neighbors(asn):
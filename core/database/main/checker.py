@@ -39,7 +39,7 @@ class Checker:
 
     def check_paths_database(self, date):
         fn = self.db_dir+"/paths/{}_paths.txt".format(date.replace(day=1).strftime("%Y-%m-%d"))
-        if not os.path.isfile(fn): 
+        if not os.path.isfile(fn) and not os.path.isfile(fn+".gz"): 
             print (self.print_prefix()+"Missing {}".format(fn))
 
     def check_cone_database(self, date):
@@ -12,11 +12,13 @@ init(autoreset=True)
 
 from utils.collect_ribs import CollectRibs
 from utils.collect_updates import CollectUpdates
+from utils import api_cache
 from utils.collect_peeringdb import crawl_peeringdb_dump, crawl_ix_asns, crawl_as_org
 from utils.collect_irr import CollectIRR
 from utils.irrparser import parse_irr_snapshot
+from utils.irr_store import IrrEdgeStore, links_to_keys
 from utils.collect_cone import collect_cone_snapshot
-from utils.peeringdbparser import read_asn_facilities, read_asn_ixps, read_asn_country, read_ixps
+from utils.peeringdbparser import parse_peeringdb_snapshot
 from utils.collect_roas import collect_roas_snapshot
 
 class Orchestrator:
@@ -62,8 +64,9 @@ class Orchestrator:
         # Download the RIB file for the corresponding month.
         rib_file = self.db_dir+'/topology/'+month_first_day.strftime("%Y-%m-%d")+"_ribs.txt"
 
-        # File containing all the AS paths used to build the RIB.
-        allpaths_file = self.db_dir+'/paths/'+month_first_day.strftime("%Y-%m-%d")+"_paths.txt"
+        # File containing all the AS paths used to build the RIB (gzip-compressed,
+        # the plain text _paths.txt files of the previous months are still accepted).
+        allpaths_file = self.db_dir+'/paths/'+month_first_day.strftime("%Y-%m-%d")+"_paths.txt.gz"
 
         # Get the ixp list filename.
         ixp_file = self.get_ixp_filename(month_first_day)
@@ -71,7 +74,7 @@ class Orchestrator:
             print (self.print_prefix()+"IXP File {} not available, continuing without it.".format(ixp_file))
 
         # Check if the RIB topo is not yet in the DB.
-        if not os.path.isfile(rib_file) or not os.path.isfile(allpaths_file) or override: 
+        if not os.path.isfile(rib_file) or not (os.path.isfile(allpaths_file) or os.path.isfile(allpaths_file[:-3])) or override: 
             cr = CollectRibs(nb_vps=nb_vps, max_workers=max_workers_rib)
             # cr.build_snapshot(month_first_day.strftime("%Y-%m-%dT%H:%M:%S"), \
             cr.build_snapshot(ts, \
@@ -125,10 +128,8 @@ class Orchestrator:
             crawl_as_org(date_str, astocountry_file)
 
             # Parse the raw json file and save results in correponding files.
-            read_asn_facilities(peeringdb_tmp_file, peeringdb_file_fac)
-            read_asn_ixps(peeringdb_tmp_file, peeringdb_file_ixp)
-            read_asn_country(peeringdb_tmp_file, astocountry_file, peeringdb_file_country)
-            read_ixps(peeringdb_tmp_file, caidaixp_tmp_file, peeringdb_file_ixplist)
+            parse_peeringdb_snapshot(peeringdb_tmp_file, caidaixp_tmp_file, astocountry_file, \
+                peeringdb_file_fac, peeringdb_file_ixp, peeringdb_file_country, peeringdb_file_ixplist)
 
             # Remove the raw file.
             os.remove(peeringdb_tmp_file)
@@ -138,7 +139,7 @@ class Orchestrator:
         else:
             print (self.print_prefix()+"PeeringDB file {} already exists.".format(peeringdb_tmp_file))
 
-    def download_timestamp_irr(self, ts: str=None, override: bool=False):
+    def download_timestamp_irr(self, ts: str=None, override: bool=False, max_workers: int=1):
         date_str = datetime.strptime(ts, "%Y-%m-%dT%H:%M:%S").strftime("%Y-%m-%d")
         cirr = CollectIRR(db_dir=self.db_dir+'/')
 
@@ -158,7 +159,10 @@ class Orchestrator:
 
 
             # Parse the downloaded IRR file and return the inferred topology.
-            parse_irr_snapshot(all_irr_files, self.db_dir+'/irr/{}.txt'.format(date_str))
+            links = parse_irr_snapshot(all_irr_files, self.db_dir+'/irr/{}.txt'.format(date_str), nb_workers=max_workers)
+
+            # Store the links in the IRR store, as a delta from the day before.
+            IrrEdgeStore(self.db_dir).ingest(datetime.strptime(date_str, "%Y-%m-%d"), links_to_keys(links))
             
             # Remove the raw files.
             for f in all_irr_files:
@@ -166,6 +170,10 @@ class Orchestrator:
         else:
             print (self.print_prefix()+"IRR files for date {} already exists.".format(date_str))
 
+            store = IrrEdgeStore(self.db_dir)
+            if not store.is_up_to_date(datetime.strptime(date_str, "%Y-%m-%d")):
+                store.ingest_file(datetime.strptime(date_str, "%Y-%m-%d"))
+
     def download_timestamp_cone(self, ts: str=None, override: bool=False):
         # Take the first day of the month,
         date = datetime.strptime(ts, "%Y-%m-%dT%H:%M:%S").replace(day=1, hour=0, minute=0, second=0, microsecond=0)
@@ -205,6 +213,7 @@ class Orchestrator:
         override_roa: bool=False, \
         max_workers_updates: int=100, \
         max_workers_rib: int=5, \
+        max_workers_irr: int=1, \
         nb_vps_updates: int=20):
 
         # First, we need to get peeringDB info, required to process ribs and updates.
@@ -215,7 +224,7 @@ class Orchestrator:
 
         plist = []
         if not rib_only and not updates_only and not peeringdb_only and not cone_only and not roa_only:
-            pirr = Process(target=self.download_timestamp_irr, args=(ts, override_irr,))
+            pirr = Process(target=self.download_timestamp_irr, args=(ts, override_irr, max_workers_irr))
             plist.append(pirr)
 
         if not rib_only and not updates_only and not peeringdb_only and not irr_only and not roa_only:
@@ -261,8 +270,12 @@ class Orchestrator:
 @click.option('--roa_override', default=False, help='Override the existing files in the DB (if any).', type=bool)
 @click.option('--max_workers', default=4, help='Maximum number of workers when downloading the updates.', type=int)
 @click.option('--max_workers_rib', default=2, help='Maximum number of workers when downloading the ribs.', type=int)
+@click.option('--max_workers_irr', default=1, help='Number of processes parsing the IRR files.', type=int)
 @click.option('--nb_vps', default=10, help='Number of vantage points from which to download updates data .', type=int)
 @click.option('--db_dir', default="db", help='Directory where is database.', type=str)
+@click.option('--api_cache_dir', default=None, help='Directory of the cache of the bgproutes.io API responses (no cache if not set).', type=str)
+@click.option('--api_cache_mode', default='readwrite', help='"readwrite" to use and fill the API cache, "offline" to only replay it (no network).', type=click.Choice(['readwrite', 'offline']))
+@click.option('--api_cache_max_size', default=4096, help='Maximum size of the API cache, in MB.', type=int)
 
 def launch_orchestrator(\
     date,\
@@ -280,10 +293,16 @@ def launch_orchestrator(\
     roa_override,\
     max_workers,\
     max_workers_rib,\
+    max_workers_irr,\
     nb_vps,\
-    db_dir):
+    db_dir,\
+    api_cache_dir,\
+    api_cache_mode,\
+    api_cache_max_size):
     """Collect raw data used for hijack detection and store it in a database."""
 
+    api_cache.configure(api_cache_dir, api_cache_mode, api_cache_max_size)
+
     o = Orchestrator(db_dir)
     o.download_timestamp(\
         ts=date, \
@@ -301,6 +320,7 @@ def launch_orchestrator(\
         override_roa=roa_override, \
         max_workers_updates=max_workers, \
         max_workers_rib=max_workers_rib, \
+        max_workers_irr=max_workers_irr, \
         nb_vps_updates=nb_vps)
 
 if __name__ == "__main__":
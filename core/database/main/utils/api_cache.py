@@ -0,0 +1,231 @@
+import os
+import json
+import gzip
+import pickle
+import hashlib
+import requests
+
+from colorama import Fore
+from colorama import Style
+
+
+####
+# On-disk cache of the responses of the bgproutes.io API. A response is
+# stored gzip-compressed in <cache_dir>/<h[:2]>/<h>.pkl.gz, where h is the
+# sha256 of the request (endpoint and parameters, with the VP objects replaced
+# by their IP). The cache is bounded in size: when it grows beyond
+# max_size, the least recently used responses are evicted (every cache hit
+# refreshes the modification time of the file).
+#
+# The API returns its error responses as-is (e.g. on rate limiting), so the
+# responses are checked before being stored: an error response raises ApiError
+# and is never cached.
+#
+# Modes: "off" (no cache), "readwrite" (use the cache and store the new
+# responses) and "offline" (replay only, a request that is not in the cache
+# raises CacheMiss without querying the API).
+#
+# The configuration goes through environment variables, so that it is
+# inherited by the worker processes.
+####
+
+ENV_DIR = 'DFOH_API_CACHE_DIR'
+ENV_MODE = 'DFOH_API_CACHE_MODE'
+ENV_MAX_SIZE = 'DFOH_API_CACHE_MAX_SIZE'
+
+MODES = ['off', 'readwrite', 'offline']
+
+# Keys of a valid response, per endpoint.
+RESPONSE_KEYS = {'topology': ('links', 'aspaths')}
+
+# Keys of an error response.
+ERROR_KEYS = ('error', 'errors', 'status', 'status_code', 'message', 'detail')
+
+# Size of the cache of the current process, computed at the first write.
+cache_size = None
+
+
+class CacheMiss(LookupError):
+    pass
+
+
+# Error response of the API, status_code is None if the response does not have one.
+class ApiError(requests.HTTPError):
+    def __init__(self, endpoint, response):
+        self.status_code = None
+        for k in ('status_code', 'status', 'code'):
+            if str(response.get(k, '')).isdigit():
+                self.status_code = int(response[k])
+                break
+
+        super().__init__('{} request failed: {}'.format(endpoint, response))
+
+
+# Raises ApiError if the response is an error response.
+def check_response(endpoint, response):
+    if not isinstance(response, dict):
+        return
+
+    expected = RESPONSE_KEYS.get(endpoint, ())
+    if any(k in response for k in expected):
+        return
+
+    if len(expected) > 0 or any(k in response for k in ERROR_KEYS):
+        raise ApiError(endpoint, response)
+
+
+def print_prefix():
+    return Fore.BLUE+Style.BRIGHT+"[api_cache.py]: "+Style.NORMAL
+
+
+def configure(cache_dir: str=None, mode: str='readwrite', max_size_mb: int=4096):
+    if cache_dir is None or mode == 'off':
+        os.environ[ENV_MODE] = 'off'
+        return
+
+    if mode not in MODES:
+        raise ValueError('Unknown API cache mode {}'.format(mode))
+
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ[ENV_DIR] = cache_dir
+    os.environ[ENV_MODE] = mode
+    os.environ[ENV_MAX_SIZE] = str(max_size_mb)
+
+
+def get_mode():
+    if os.getenv(ENV_DIR) is None:
+        return 'off'
+
+    return os.getenv(ENV_MODE, 'readwrite')
+
+
+# VP objects are identified by their IP.
+def normalize(obj):
+    if hasattr(obj, 'ip'):
+        return str(obj.ip)
+    if hasattr(obj, '__dict__'):
+        return vars(obj)
+
+    return str(obj)
+
+
+def request_key(endpoint, args, kwargs):
+    request = json.dumps([endpoint, args, kwargs], sort_keys=True, default=normalize)
+
+    return hashlib.sha256(request.encode()).hexdigest()
+
+
+def cache_filename(key):
+    return os.path.join(os.getenv(ENV_DIR), key[:2], key+'.pkl.gz')
+
+
+####
+# Returns (True, response) if the request is in the cache, (False, None)
+# otherwise. Volatile requests (e.g. the list of VPs, which changes over time)
+# are only replayed in offline mode. Error responses cached by older versions
+# are removed and count as misses.
+####
+
+def lookup(endpoint, args, kwargs, volatile=False):
+    mode = get_mode()
+    if mode == 'off' or (volatile and mode != 'offline'):
+        return False, None
+
+    fn = cache_filename(request_key(endpoint, args, kwargs))
+    try:
+        with gzip.open(fn, 'rb') as fd:
+            response = pickle.load(fd)
+        check_response(endpoint, response)
+        os.utime(fn)
+        return True, response
+    except (OSError, EOFError, pickle.UnpicklingError, ApiError) as e:
+        if isinstance(e, ApiError) and mode == 'readwrite':
+            os.remove(fn)
+        if mode == 'offline':
+            raise CacheMiss('{} request not in the API cache (offline mode)'.format(endpoint))
+        return False, None
+
+
+def store(endpoint, args, kwargs, response):
+    global cache_size
+
+    check_response(endpoint, response)
+
+    if get_mode() != 'readwrite':
+        return
+
+    fn = cache_filename(request_key(endpoint, args, kwargs))
+    os.makedirs(os.path.dirname(fn), exist_ok=True)
+
+    fn_tmp = '{}.{}.tmp'.format(fn, os.getpid())
+    with gzip.open(fn_tmp, 'wb', compresslevel=6) as fd:
+        pickle.dump(response, fd, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(fn_tmp, fn)
+
+    if cache_size is None:
+        cache_size = sum(size for _, size, _ in list_entries())
+    else:
+        cache_size += os.path.getsize(fn)
+
+    if cache_size > int(os.getenv(ENV_MAX_SIZE, 4096)) * 1024 * 1024:
+        evict()
+
+
+def list_entries():
+    entries = []
+    for root, _, files in os.walk(os.getenv(ENV_DIR)):
+        for f in files:
+            if f.endswith('.pkl.gz'):
+                try:
+                    st = os.stat(os.path.join(root, f))
+                    entries.append((os.path.join(root, f), st.st_size, st.st_mtime))
+                except FileNotFoundError:
+                    pass
+
+    return entries
+
+
+# Removes the least recently used responses until the cache is below 90% of its maximum size.
+def evict():
+    global cache_size
+
+    entries = sorted(list_entries(), key=lambda e: e[2])
+    cache_size = sum(size for _, size, _ in entries)
+    target = int(os.getenv(ENV_MAX_SIZE, 4096)) * 1024 * 1024 * 0.9
+
+    nb_evicted = 0
+    for fn, size, _ in entries:
+        if cache_size <= target:
+            break
+        try:
+            os.remove(fn)
+        except FileNotFoundError:
+            pass
+        cache_size -= size
+        nb_evicted += 1
+
+    print (print_prefix()+'{} responses evicted from the API cache.'.format(nb_evicted))
+
+
+# Returns the response to func(*args, **kwargs) from the cache, or queries the API and caches the response.
+def cached_call(endpoint, func, *args, **kwargs):
+    found, response = lookup(endpoint, args, kwargs)
+    if found:
+        return response
+
+    response = func(*args, **kwargs)
+    store(endpoint, args, kwargs, response)
+
+    return response
+
+
+# Same as cached_call for a volatile request: always queries the API, except in offline mode.
+def recorded_call(endpoint, func, *args, **kwargs):
+    found, response = lookup(endpoint, args, kwargs, volatile=True)
+    if found:
+        return response
+
+    response = func(*args, **kwargs)
+    store(endpoint, args, kwargs, response)
+
+    return response
@@ -1,5 +1,7 @@
 import os
 from pybgproutesapi import topology, vantage_points
+from utils.api_cache import cached_call, recorded_call
+from utils.path_spill import ShardedPathSet, PackedLinkSet
 
 from colorama import Fore
 from colorama import Style
@@ -12,7 +14,7 @@ class CollectRibs:
         self.max_workers = max_workers
 
         # Get list of vantage points with MVP.
-        self.vps_set = vantage_points(sources=["ris", "routeviews", "bgproutes.io", "pch", "cgtf"])
+        self.vps_set = recorded_call('vantage_points', vantage_points, sources=["ris", "routeviews", "bgproutes.io", "pch", "cgtf"])
 
     def print_prefix(self):
         return Fore.CYAN+Style.BRIGHT+"[collect_ribs.py]: "+Style.NORMAL
@@ -28,39 +30,48 @@ class CollectRibs:
 
         return ixps
 
-    def build_snapshot(self, date_str: str=None, ixp_file:str=None, outfile: str=None, outfile_paths: str=None, vp_ips_batch_size: int=10):
+    ####
+    # Builds the RIB topology (outfile) and the file with all the unique AS
+    # paths (outfile_paths, gzip-compressed if it ends with .gz). The links are
+    # kept as packed integers and the paths are de-duplicated through shard
+    # files on disk (next to outfile_paths), so the memory stays bounded.
+    ####
+
+    def build_snapshot(self, date_str: str=None, ixp_file:str=None, outfile: str=None, outfile_paths: str=None, vp_ips_batch_size: int=10, nb_shards: int=64):
         print(self.print_prefix() + '{}: Building RIB snapshot from bgproutes.io'.format(date_str))
         
-        allpaths = set()
-        all_links = set()
+        all_links = PackedLinkSet()
+        allpaths = ShardedPathSet(tmp_dir=os.path.dirname(outfile_paths) if outfile_paths is not None else None, nb_shards=nb_shards)
 
         # Load IXP ASN file.
         ases_to_ignore = list(self.get_ixps(ixp_file))
 
-        for i in range(0, len(self.vps_set), vp_ips_batch_size):
-            print(f"{self.print_prefix()} Processing batch {i // vp_ips_batch_size + 1} of VPs...")
-            batch = self.vps_set[i:i + vp_ips_batch_size]
-            batch = [vp for vp in batch if vp.is_active]
-            try:
-                topo = topology(batch, date_str, with_aspath=True, with_rib=True, with_updates=False, as_to_ignore=ases_to_ignore, ignore_private_asns=True)
-                # Normalize links as tuples of integers
-                for link in topo["links"]:
-                    all_links.add(tuple(link))
-                for aspath in topo['aspaths']:
-                    allpaths.add(aspath)
-            except Exception as e:
-                print(f"{self.print_prefix()} Error processing batch {i // vp_ips_batch_size + 1}: {e}")
+        try:
+            for i in range(0, len(self.vps_set), vp_ips_batch_size):
+                print(f"{self.print_prefix()} Processing batch {i // vp_ips_batch_size + 1} of VPs...")
+                batch = self.vps_set[i:i + vp_ips_batch_size]
+                batch = [vp for vp in batch if vp.is_active]
+                try:
+                    topo = cached_call('topology', topology, batch, date_str, with_aspath=True, with_rib=True, with_updates=False, as_to_ignore=ases_to_ignore, ignore_private_asns=True)
+                    all_links.update(topo["links"])
+                    if outfile_paths is not None:
+                        allpaths.update(topo['aspaths'])
+                except Exception as e:
+                    print(f"{self.print_prefix()} Error processing batch {i // vp_ips_batch_size + 1}: {e}")
+
+            nb_paths = 0
+            if outfile_paths is not None:
+                nb_paths = allpaths.write(outfile_paths)
+        finally:
+            allpaths.close()
 
-        print(f"{self.print_prefix()} {date_str}: Topology size: {len(all_links)} links, {len(allpaths)} unique AS paths")
+        print(f"{self.print_prefix()} {date_str}: Topology size: {len(all_links)} links, {nb_paths} unique AS paths")
         
         if outfile is not None:
+            as1s, as2s = all_links.links()
             with open(outfile, 'w') as fd:
-                for as1, as2 in all_links:
+                for as1, as2 in zip(as1s.tolist(), as2s.tolist()):
                     fd.write("{} {}\n".format(as1, as2))
-        if outfile_paths is not None:
-            with open(outfile_paths, 'w') as fd:
-                for path in allpaths:
-                    fd.write(path+'\n')
 
 if __name__ == "__main__":
     cr = CollectRibs(max_workers=1)
\ No newline at end of file
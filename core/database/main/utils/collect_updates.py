@@ -1,5 +1,8 @@
 import os
+import shutil
+from concurrent import futures
 from pybgproutesapi import topology, vantage_points
+from utils.api_cache import cached_call, recorded_call
 
 from colorama import Fore
 from colorama import Style
@@ -13,7 +16,7 @@ class CollectUpdates:
         self.max_workers = max_workers
 
         # Get list of vantage points
-        self.vps_set = vantage_points(sources=["ris", "routeviews", "bgproutes.io", "pch", "cgtf"])
+        self.vps_set = recorded_call('vantage_points', vantage_points, sources=["ris", "routeviews", "bgproutes.io", "pch", "cgtf"])
 
     def print_prefix(self):
         return Fore.YELLOW+Style.BRIGHT+"[collect_updates.py]: "+Style.NORMAL
@@ -29,6 +32,49 @@ class CollectUpdates:
 
         return ixps
 
+    # Checkpoint file with the links of a VP, in the partial directory of the snapshot.
+    def checkpoint_filename(self, partial_dir, vp):
+        return os.path.join(partial_dir, '{}.txt'.format(vp.ip))
+
+    ####
+    # Downloads the links of a VP and writes them in its checkpoint file (under
+    # a temporary name first, so only the completed VPs have a checkpoint).
+    ####
+
+    def process_vp(self, vp, date_str, ases_to_ignore, partial_dir):
+        topo = cached_call('topology', topology, [vp], date_str, with_aspath=False, with_rib=False, with_updates=True, as_to_ignore=ases_to_ignore, ignore_private_asns=True)
+
+        fn = self.checkpoint_filename(partial_dir, vp)
+        with open(fn+'.tmp', 'w') as fd:
+            for link in topo['links']:
+                fd.write("{} {}\n".format(link[0], link[1]))
+        os.replace(fn+'.tmp', fn)
+
+    # Processes the VPs with max_workers threads, returns the VPs that failed.
+    def collect_vps(self, vps, date_str, ases_to_ignore, partial_dir):
+        failed_vps = []
+        with futures.ThreadPoolExecutor(max_workers=max(self.max_workers, 1)) as executor:
+            futures_vps = {executor.submit(self.process_vp, vp, date_str, ases_to_ignore, partial_dir): vp for vp in vps}
+            for i, future in enumerate(futures.as_completed(futures_vps)):
+                if i % 10 == 0:
+                    print(f"{self.print_prefix()} Processing VP {i + 1}/{len(vps)}...")
+                try:
+                    future.result()
+                except Exception as e:
+                    print(self.print_prefix() + 'Error retrieving topology for VP {}: {}'.format(futures_vps[future].ip, e))
+                    failed_vps.append(futures_vps[future])
+
+        return failed_vps
+
+    ####
+    # The VPs are processed by max_workers threads and the links of every VP
+    # are checkpointed in <outfile>.partial/. The VPs that fail are retried
+    # once. If some VPs still fail (or the process is interrupted), outfile is
+    # not written and the checkpoints are kept, so the next run only downloads
+    # the VPs without a checkpoint. Otherwise the checkpoints are merged into
+    # outfile, which is renamed atomically. Returns True if outfile is complete.
+    ####
+
     def build_snapshot(self, ts_start: str=None, ixp_file: str=None, outfile: str=None):
         date_str = ts_start.strftime("%Y-%m-%d")
         print(self.print_prefix() + '{}: Building updates snapshot from bgproutes.io'.format(date_str))
@@ -36,25 +82,45 @@ class CollectUpdates:
         # Load IXP ASN file.
         ases_to_ignore = list(self.get_ixps(ixp_file))
 
+        partial_dir = (outfile if outfile is not None else date_str+'_updates')+'.partial'
+        os.makedirs(partial_dir, exist_ok=True)
+
+        active_vps = [vp for vp in self.vps_set if vp.is_active]
+        todo_vps = [vp for vp in active_vps if not os.path.isfile(self.checkpoint_filename(partial_dir, vp))]
+        if len(todo_vps) < len(active_vps):
+            print(self.print_prefix() + '{}: Resuming, {}/{} VPs already collected'.format(date_str, len(active_vps)-len(todo_vps), len(active_vps)))
+
+        failed_vps = self.collect_vps(todo_vps, date_str, ases_to_ignore, partial_dir)
+        if len(failed_vps) > 0:
+            print(self.print_prefix() + '{}: Retrying {} failed VPs'.format(date_str, len(failed_vps)))
+            failed_vps = self.collect_vps(failed_vps, date_str, ases_to_ignore, partial_dir)
+
+        if len(failed_vps) > 0:
+            print(self.print_prefix() + '{}: {} VPs failed ({}), snapshot not written, checkpoints kept in {}'.format( \
+                date_str, len(failed_vps), ' '.join(sorted(str(vp.ip) for vp in failed_vps)), partial_dir))
+            return False
+
+        # Merge the checkpoints of the VPs.
         all_links = set()
-        for i, vp in enumerate(self.vps_set):
-            if i % 10 == 0:
-                print(f"{self.print_prefix()} Processing VP {i + 1}/{len(self.vps_set)}...")
-            if not vp.is_active:
-                continue
-            try:
-                topo = topology([vp], date_str, with_aspath=False, with_rib=False, with_updates=True, as_to_ignore=ases_to_ignore, ignore_private_asns=True)
-                for link in topo['links']:
-                    all_links.add((link[0], link[1], vp.ip))
-            except Exception as e:
-                print(self.print_prefix() + 'Error retrieving topology for VP {}: {}'.format(vp.ip, e))
+        for vp in active_vps:
+            fn = self.checkpoint_filename(partial_dir, vp)
+            if os.path.isfile(fn):
+                with open(fn, 'r') as fd:
+                    for line in fd:
+                        as1, as2 = line.split()
+                        all_links.add((as1, as2, vp.ip))
 
         print(self.print_prefix() + '{}: Topology size: {} links'.format(date_str, len(all_links)))
 
         if outfile is not None:
-            with open(outfile, 'w') as fd:
+            with open(outfile+'.tmp', 'w') as fd:
                 for as1, as2, vp_ip in all_links:
                     fd.write("{} {} {}\n".format(as1, as2, vp_ip))
+            os.replace(outfile+'.tmp', outfile)
+
+        shutil.rmtree(partial_dir, ignore_errors=True)
+
+        return True
 
 if __name__ == "__main__":
     cu = CollectUpdates(nb_vps=20, max_workers=20)
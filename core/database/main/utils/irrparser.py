@@ -1,279 +1,384 @@
-import networkx as nx
-import re 
+import os
+import re
+import io
+import sys
+import codecs
+from concurrent import futures
+import numpy as np
 
 from colorama import Fore
 from colorama import Style
 from colorama import init
 init(autoreset=True)
 
-class ASset:
-    def __init__(self, text: str):
-        self.text = text
+# Regexes used to parse the RPSL objects.
+RE_AS_MEMBER = re.compile('AS[0-9]+[:]*')
+RE_AS_SET_MEMBER = re.compile('AS[a-zA-Z0-9:_.-]+')
+RE_POLICY_AS = re.compile(' AS[0-9]+ ')
+RE_POLICY_AS_SET = re.compile('to AS[a-zA-Z0-9:_.-]+ ')
+
+POLICY_ATTRIBUTES = ('import:', 'mp-import', 'export:', 'mp-export')
 
-        # Variable in the as-set objects.
-        self.as_set_name = None
-        self.mnt_by = set()
-        self.source = None
-        self.changed = None
+# Position right after a "\n\n" that is neither preceded nor followed by
+# another newline: the IRR files can be cut there between two objects.
+RE_OBJECT_BOUNDARY = re.compile(rb'(?<![\r\n])\n\n(?![\r\n])')
 
-        self.as_members = set()
-        self.as_members_rec = set()
+
+class ASset:
+    def __init__(self, as_set_name: str=None):
+        # Name of the as-set object.
+        self.as_set_name = as_set_name
+
+        # Direct AS members and AS members inferred recursively (sorted arrays of
+        # ASNs), and names of the as-set members.
+        self.as_members = np.empty(0, dtype=np.int64)
+        self.as_members_rec = np.empty(0, dtype=np.int64)
         self.as_set_rec = set()
 
     def __str__(self):
-        s = "{} {} {} {}\n{}\n{}\n{}".format( \
+        s = "{}\n{}\n{}\n{}".format( \
             self.as_set_name, \
-            self.mnt_by, \
-            self.source, \
-            self.changed, \
             self.as_members, \
             self.as_members_rec, \
             self.as_set_rec)
 
         return s
 
-    def init_metadata(self):
-
-        for line in self.text.split('\n'):
-            # Tranform multiple consecutive spaces into one space
-            line = ' '.join(line.split())
-
-            # Get the maintainer.
-            if line.startswith('mnt-by'):
-                if ' ' in line:
-                    self.mnt_by.add(line.rstrip('\n').split(' ')[1])
-                else:
-                    self.mnt_by.add(line.rstrip('\n').replace('mnt-by: ', ''))
-
-            if line.startswith('as-set'):
-                self.as_set_name = line.rstrip('\n').replace('as-set: ', '')
-                # print (self.as_set_name)
-            
-            if line.startswith('source'):
-                self.source= line.rstrip('\n').replace('source: ', '')
-
-            if line.startswith('changed'):
-                self.changed = line.rstrip('\n').replace('changed: ', '')
-
-    def get_members(self):
+    def parse(obj: str):
+        as_set = ASset()
+        as_members = set()
         members_line = False
 
-        for line in self.text.split('\n'):
+        for line in obj.split('\n'):
 
             if line.startswith(' '):
                 subline = True
             else: subline = False
 
             # Tranform multiple consecutive spaces into one space
-            line = ' '.join(line.split()).rstrip('\n')
+            line = ' '.join(line.split())
+
+            if line.startswith('as-set'):
+                as_set.as_set_name = sys.intern(line.replace('as-set: ', ''))
 
             if line.startswith('members:') or (subline and members_line):
                 members_line = True
 
                 # Get the direct AS members.
-                for as_mem in re.findall('AS[0-9]+[:]*', line):
+                for as_mem in RE_AS_MEMBER.findall(line):
                     if ":" not in as_mem: # To avoid matching on cases like: AS13826:AS-CUSTOMERS
-                        self.as_members.add(as_mem)
+                        as_members.add(as_mem)
 
                 # Get the reference to other AS set objects.
-                for as_set in re.findall('AS[a-zA-Z0-9:_.-]+', line):
-                    if as_set not in self.as_members:
-                        self.as_set_rec.add(as_set)
+                for as_set_name in RE_AS_SET_MEMBER.findall(line):
+                    if as_set_name not in as_members:
+                        as_set.as_set_rec.add(sys.intern(as_set_name))
             else:
                 members_line = False
 
-    def get_as_set_members_recursively(as_set_name: str, as_set_dic: dict, max_rec: int=10):
-        # Initialisation of the recursion.
-        members_rec = set()
-        as_set_next_iter = as_set_dic[as_set_name].as_set_rec
-        as_set_already_iter = as_set_dic[as_set_name].as_set_rec
-        nb_iter = 0
-
-        while nb_iter < 10 and len(as_set_next_iter) > 0:
-            # Update the set of AS sets already processed, to avoid processing twice the same AS set.
-            as_set_already_iter = as_set_already_iter.union(as_set_next_iter)
+        as_set.as_members = np.unique(np.array([int(as_mem[2:]) for as_mem in as_members], dtype=np.int64))
 
-            new_as_set_next_iter = set()
-
-            # For every AS set in the batch for the current iteration.
-            for as_set in as_set_next_iter:
-
-                if as_set in as_set_dic:
-                    # Add the members of this AS set.
-                    members_rec = members_rec.union(as_set_dic[as_set].as_members)
-
-                    # Add the AS set of this AS set in the next batch.
-                    for as_set_tmp in as_set_dic[as_set].as_set_rec:
-                        if as_set_tmp not in as_set_already_iter:
-                            new_as_set_next_iter.add(as_set_tmp)
-
-            # Prepare the next iteration.
-            as_set_next_iter = new_as_set_next_iter
-            nb_iter += 1
-
-        return members_rec
+        return as_set
 
 
 class AutNum:
-    def __init__(self, text: str):
-        self.text = text
-
-        # Variables in the aut-num objects.
-        self.aut_num = None
-        self.as_name = None
-        self.mnt_by = set()
-        self.source = None
-        self.changed = None
+    def __init__(self, aut_num: str=None):
+        # ASN of the aut-num object, ASNs found directly in the import/export
+        # policies and names of the as-set objects used in these policies.
+        self.aut_num = aut_num
+        self.as_links = set()
+        self.as_set_links = set()
 
     def __str__(self):
-        s = "{} {} {} {} {}".format( \
+        s = "{} {} {}".format( \
             self.aut_num, \
-            self.as_name, \
-            self.mnt_by, \
-            self.source, \
-            self.changed)
+            self.as_links, \
+            self.as_set_links)
 
         return s
 
-    def init_metadata(self):
-
-        for line in self.text.split('\n'):
-            # Tranform multiple consecutive spaces into one space
-            line = ' '.join(line.split())
-
-            # Get the maintainer.
-            if line.startswith('mnt-by'):
-                if ' ' in line:
-                    self.mnt_by.add(line.rstrip('\n').split(' ')[1])
-                else:
-                    self.mnt_by.add(line.rstrip('\n').replace('mnt-by: ', ''))
-
-            if line.startswith('aut-num'):
-                self.aut_num = line.rstrip('\n').replace('aut-num: ', '')
-
-            if line.startswith('as-name'):
-                self.as_name = line.rstrip('\n').replace('as-name: ', '')
-            
-            if line.startswith('source'):
-                self.source= line.rstrip('\n').replace('source: ', '')
-
-            if line.startswith('changed'):
-                self.changed = line.rstrip('\n').replace('changed: ', '')
-
-    def get_links(self, as_set_dic):
-        import_line = False
-        export_line = False
-
-        cur_as = self.aut_num.replace('AS', '')
+    def parse(obj: str):
+        autnum = AutNum()
+        policy_line = False
 
-        for line in self.text.split('\n'):
+        for line in obj.split('\n'):
 
             if line.startswith(' '):
                 subline = True
             else: subline = False
 
             # Tranform multiple consecutive spaces into one space
-            line = ' '.join(line.split()).rstrip('\n')
+            line = ' '.join(line.split())
+
+            if line.startswith('aut-num'):
+                autnum.aut_num = sys.intern(line.replace('aut-num: ', '').replace('AS', ''))
 
-            if line.startswith('import:') or line.startswith("mp-import") or (subline and import_line):
-                import_line = True
-                export_line = False
+            if line.startswith(POLICY_ATTRIBUTES) or (subline and policy_line):
+                policy_line = True
 
                 # Find direct AS numbers.
-                as_list = set(map(lambda x:x.replace(' ', ''), re.findall(' AS[0-9]+ ', line)))
+                as_list = set(map(lambda x:x.replace(' ', ''), RE_POLICY_AS.findall(line)))
                 for asn in as_list:
-                    yield (cur_as, int(asn.replace('AS', '')), 0)
+                    autnum.as_links.add(int(asn[2:]))
 
-                # Recusively find ases in as-set.
-                as_object_list = re.findall('to AS[a-zA-Z0-9:_.-]+ ', line)
-                for obj in as_object_list:
+                # Find the as-set objects, their members are added once all the as-sets are known.
+                for obj_name in RE_POLICY_AS_SET.findall(line):
                     # Remove direct AS labels.
-                    obj_name = obj.replace('to ', '').replace(' ', '')
+                    obj_name = obj_name.replace('to ', '').replace(' ', '')
 
                     if obj_name not in as_list and obj_name != 'AS-ANY':
-                        # Return all the links infered from the AS set object.
-                        if obj_name in as_set_dic:
-                            for as_member in as_set_dic[obj_name].as_members:
-                                yield (cur_as, int(as_member.replace('AS', '')), 1)
-                            
-                            for as_member in as_set_dic[obj_name].as_members_rec:
-                                yield (cur_as, int(as_member.replace('AS', '')), 1)
-
-            elif line.startswith('export:') or line.startswith("mp-export") or (subline and export_line):
-                export_line = True
-                import_line = False
+                        autnum.as_set_links.add(sys.intern(obj_name))
+            else:
+                policy_line = False
 
-                # Find direct AS numbers.
-                as_list = set(map(lambda x:x.replace(' ', ''), re.findall(' AS[0-9]+ ', line)))
-                for asn in as_list:
-                    yield (cur_as, int(asn.replace('AS', '')), 0)
+        return autnum
 
-                # Recusively find ases in as-set.
-                as_object_list = re.findall('to AS[a-zA-Z0-9:_.-]+ ', line)
-                for obj in as_object_list:
-                    # Remove direct AS labels.
-                    obj_name = obj.replace('to ', '').replace(' ', '')
+    def get_links(self, as_set_dic):
+        cur_as = self.aut_num
 
-                    if obj_name not in as_list and obj_name != 'AS-ANY':
-                        # Return all the links infered from the AS set object.
-                        if obj_name in as_set_dic:
-                            for as_member in as_set_dic[obj_name].as_members:
-                                yield (cur_as, int(as_member.replace('AS', '')), 1)
-                            
-                            for as_member in as_set_dic[obj_name].as_members_rec:
-                                yield (cur_as, int(as_member.replace('AS', '')), 1)
+        for asn in self.as_links:
+            yield (cur_as, asn, 0)
 
-            else:
-                import_line = False
-                export_line = False
+        # Return all the links infered from the AS set objects.
+        for obj_name in self.as_set_links:
+            if obj_name in as_set_dic:
+                for as_member in as_set_dic[obj_name].as_members.tolist():
+                    yield (cur_as, as_member, 1)
+
+                for as_member in as_set_dic[obj_name].as_members_rec.tolist():
+                    yield (cur_as, as_member, 1)
 
 
 def print_prefix():
     return Fore.MAGENTA+Style.BRIGHT+"[irrparser.py]: "+Style.NORMAL
 
 
-def parse_irr_snapshot(infile_list: list, outfile: str):
-    # First, process the as-set objects and infer their members, recursively.
-    as_set_dic = {}
+# Union of sorted arrays of ASNs.
+def union_members(arrays: list):
+    arrays = [a for a in arrays if len(a) > 0]
+    if len(arrays) == 0:
+        return np.empty(0, dtype=np.int64)
+    if len(arrays) == 1:
+        return arrays[0]
+
+    return np.unique(np.concatenate(arrays))
+
+
+####
+# Strongly connected components of the graph of the as-sets (an as-set points
+# to the as-sets in its members), with Tarjan's algorithm (iterative). The
+# components are returned children first: a component only points to
+# itself or to components that come before it.
+####
+
+def as_set_components(as_set_dic: dict):
+    children = lambda name: [c for c in as_set_dic[name].as_set_rec if c in as_set_dic]
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+
+    for root in as_set_dic:
+        if root in index:
+            continue
+
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(children(root)))]
+
+        while len(work) > 0:
+            v, it = work[-1]
+            for w in it:
+                if w not in index:
+                    index[w] = low[w] = len(index)
+                    stack.append(w)
+                    on_stack.add(w)
+                    work.append((w, iter(children(w))))
+                    break
+                elif w in on_stack:
+                    low[v] = min(low[v], index[w])
+            else:
+                work.pop()
+                if len(work) > 0:
+                    low[work[-1][0]] = min(low[work[-1][0]], low[v])
+
+                # v is the root of a component.
+                if low[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack.discard(w)
+                        component.append(w)
+                        if w == v:
+                            break
+                    components.append(component)
+
+    return components
+
+
+####
+# Sets as_members_rec for all the as-sets: the members of all the as-sets
+# reachable through the members, at any depth. The components are resolved
+# bottom-up, so the members of every component are computed once, and the
+# as-sets of the same component share the same array.
+####
+
+def expand_as_sets(as_set_dic: dict):
+    components = as_set_components(as_set_dic)
+
+    component_of = {}
+    for i, component in enumerate(components):
+        for name in component:
+            component_of[name] = i
+
+    # Members of the as-sets of every component and of all the components below.
+    all_members = []
+
+    for i, component in enumerate(components):
+        child_components = set(component_of[c] for name in component for c in as_set_dic[name].as_set_rec if c in as_set_dic)
+        members_below = union_members([all_members[j] for j in child_components if j != i])
+        all_members.append(union_members([as_set_dic[name].as_members for name in component] + [members_below]))
+
+        # The as-sets in a cycle reach all the as-sets of their component, including themselves.
+        if len(component) > 1 or i in child_components:
+            members_rec = all_members[i]
+        else:
+            members_rec = members_below
+
+        for name in component:
+            as_set_dic[name].as_members_rec = members_rec
+
+    return len(components)
+
+
+####
+# Generator over the RPSL objects (the "\n\n"-separated records) of the bytes
+# [start, end) of an IRR file, read by chunks of chunk_size bytes. The records
+# are the same as with fd.read().split('\n\n') on the file opened in text mode.
+####
+
+def read_objects(infile: str, start: int=0, end: int=None, chunk_size: int=1<<22):
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder('utf-8')(errors='ignore'), translate=True)
+    buffer = ''
+
+    with open(infile, 'rb') as fd:
+        fd.seek(start)
+        remaining = end - start if end is not None else None
+
+        while True:
+            data = fd.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if remaining is not None:
+                remaining -= len(data)
+
+            buffer += decoder.decode(data, final=len(data) == 0)
+            objs = buffer.split('\n\n')
+            buffer = objs.pop()
+            yield from objs
+
+            if len(data) == 0:
+                break
+
+    yield buffer
+
+
+####
+# Splits an IRR file into (at most) nb_shards byte ranges, cut between two
+# objects, so that the shards can be parsed independently.
+####
+
+def shard_file(infile: str, nb_shards: int=1, window: int=1<<20):
+    size = os.path.getsize(infile)
+    cuts = [0]
+
+    with open(infile, 'rb') as fd:
+        for i in range(1, nb_shards):
+            offset = max(size * i // nb_shards, cuts[-1]+1)
+
+            # Look for the first object boundary after the offset.
+            while offset < size:
+                fd.seek(offset-1)
+                data = fd.read(window+3)
+                m = RE_OBJECT_BOUNDARY.search(data, 1)
+                if m is not None and (m.end() < len(data) or offset+len(data)-1 == size):
+                    cuts.append(offset-1+m.end())
+                    break
+                offset += window
+
+    cuts.append(size)
 
-    print (print_prefix()+"Reading the as-set objects.")
+    return [(start, end) for start, end in zip(cuts[:-1], cuts[1:]) if end > start]
+
+
+####
+# Parses in a single pass the objects of the byte range [start, end) of an IRR
+# file. Returns the as-set objects (in the order of the file), the direct
+# links of the aut-num objects, and the aut-num objects using as-sets, to
+# resolve once all the as-sets are known.
+####
+
+def parse_shard(infile: str, start: int, end: int):
+    as_sets = []
+    direct_links = set()
+    aut_nums = []
+
+    for obj in read_objects(infile, start, end):
+        if 'as-set:' in obj:
+            as_sets.append(ASset.parse(obj))
+
+        if obj.startswith('aut-num:'):
+            autnum = AutNum.parse(obj)
+            for asn in autnum.as_links:
+                direct_links.add((autnum.aut_num, asn))
+            if len(autnum.as_set_links) > 0:
+                autnum.as_links = set()
+                aut_nums.append(autnum)
+
+    return as_sets, direct_links, aut_nums
+
+
+def parse_irr_snapshot(infile_list: list, outfile: str, nb_workers: int=1):
+    # The IRR files are split into byte ranges parsed by nb_workers processes.
+    shards = []
     for infile in infile_list:
-        print (print_prefix()+infile)
-        with open(infile, 'r', encoding='utf-8', errors='ignore') as fd:
-            for obj in fd.read().split('\n\n'):
-                if 'as-set:' in obj:
-                    as_set = ASset(obj)
-                    as_set.init_metadata()
-                    as_set.get_members()
-                    as_set_dic[as_set.as_set_name] = as_set
+        shards.extend((infile, start, end) for start, end in shard_file(infile, nb_workers))
+
+    # First, read the as-set and the aut-num objects.
+    as_set_dic = {}
+    links = set()
+    aut_num_list = []
+
+    print (print_prefix()+"Reading the as-set and aut-num objects.")
+    with futures.ProcessPoolExecutor(max_workers=nb_workers) if nb_workers > 1 else futures.ThreadPoolExecutor(max_workers=1) as executor:
+        for (infile, start, end), (as_sets, direct_links, aut_nums) in zip(shards, executor.map(parse_shard, *zip(*shards))):
+            print (print_prefix()+"{} [{}, {})".format(infile, start, end))
+            for as_set in as_sets:
+                as_set_dic[as_set.as_set_name] = as_set
+            links.update(direct_links)
+            aut_num_list.extend(aut_nums)
 
     print (print_prefix()+'Build as-set objects recursively.')
     # Run the recursive ASset membership inference.
-    for as_set_name, as_set in as_set_dic.items():
-        as_set.as_members_rec = ASset.get_as_set_members_recursively(as_set_name, as_set_dic, max_rec=10)
+    nb_components = expand_as_sets(as_set_dic)
+    print (print_prefix()+'{} as-sets in {} components.'.format(len(as_set_dic), nb_components))
 
-    # Second, process the aut-num objects and infer the AS topologly.
-    aut_num_list = []
-    topo = nx.DiGraph()
-
-    print (print_prefix()+"Constructing the topology.")    
-    for infile in infile_list:
-        print (print_prefix()+infile)
-        with open(infile, 'r', encoding='utf-8', errors='ignore') as fd:
-            for obj in fd.read().split('\n\n'):
-                if obj.startswith('aut-num:'):
-                    autnum = AutNum(obj)
-                    autnum.init_metadata()
-                    for (as1, as2, t) in autnum.get_links(as_set_dic):
-                        topo.add_edge(as1, as2)
+    # Second, infer the AS topology from the as-sets used by the aut-num objects.
+    print (print_prefix()+"Constructing the topology.")
+    for autnum in aut_num_list:
+        for (as1, as2, t) in autnum.get_links(as_set_dic):
+            links.add((as1, as2))
 
-    print (print_prefix()+"IRR topo size {} nodes and {} edges".format(topo.number_of_nodes(), topo.number_of_edges()))
+    nb_nodes = len(set(as1 for as1, _ in links)) + len(set(as2 for _, as2 in links))
+    print (print_prefix()+"IRR topo size {} nodes and {} edges".format(nb_nodes, len(links)))
 
     # Write the resulting graph in the output file.
     with open(outfile, 'w') as fd:
-        for as1, as2 in topo.edges():
+        for as1, as2 in links:
             fd.write('{} {}\n'.format(as1, as2))
 
+    return links
+
 
 
 if __name__ == "__main__":
@@ -0,0 +1,107 @@
+import os
+import gzip
+import zlib
+import shutil
+import tempfile
+import numpy as np
+
+
+####
+# Set of AS paths spilled to disk, to de-duplicate the paths of all the VPs
+# with a bounded memory. The paths are hashed into nb_shards shard files; a
+# shard is only loaded in memory (as a set) when the output file is written,
+# so the memory used is roughly the size of the largest shard.
+####
+
+class ShardedPathSet:
+    def __init__(self, tmp_dir: str=None, nb_shards: int=64, buffer_size: int=100000):
+        self.nb_shards = nb_shards
+        self.buffer_size = buffer_size
+        self.dir = tempfile.mkdtemp(prefix='paths_', dir=tmp_dir)
+        self.buffers = [[] for _ in range(nb_shards)]
+        self.nb_buffered = 0
+
+    def shard_filename(self, i):
+        return os.path.join(self.dir, '{}.txt'.format(i))
+
+    def add(self, aspath):
+        self.buffers[zlib.crc32(aspath.encode()) % self.nb_shards].append(aspath)
+        self.nb_buffered += 1
+
+        if self.nb_buffered >= self.buffer_size:
+            self.flush()
+
+    def update(self, aspaths):
+        for aspath in aspaths:
+            self.add(aspath)
+
+    def flush(self):
+        for i, buffer in enumerate(self.buffers):
+            if buffer:
+                with open(self.shard_filename(i), 'a') as fd:
+                    fd.write('\n'.join(buffer))
+                    fd.write('\n')
+                self.buffers[i] = []
+        self.nb_buffered = 0
+
+    ####
+    # Writes the unique paths in outfile (gzip-compressed if it ends with .gz),
+    # under a temporary name first. Returns the number of unique paths.
+    ####
+
+    def write(self, outfile):
+        self.flush()
+
+        nb_paths = 0
+        outfile_tmp = '{}.{}.tmp'.format(outfile, os.getpid())
+        with (gzip.open(outfile_tmp, 'wt', compresslevel=6) if outfile.endswith('.gz') else open(outfile_tmp, 'w')) as fd:
+            for i in range(self.nb_shards):
+                if not os.path.isfile(self.shard_filename(i)):
+                    continue
+                with open(self.shard_filename(i), 'r') as fd_shard:
+                    aspaths = set(fd_shard.read().splitlines())
+                for aspath in aspaths:
+                    fd.write(aspath+'\n')
+                nb_paths += len(aspaths)
+        os.replace(outfile_tmp, outfile)
+
+        return nb_paths
+
+    def close(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+####
+# Set of directed links stored as packed integers (as1 << 32 | as2), merged
+# into a sorted array without duplicates every merge_size added links.
+####
+
+class PackedLinkSet:
+    def __init__(self, merge_size: int=1000000):
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.pending = []
+        self.nb_pending = 0
+        self.merge_size = merge_size
+
+    def update(self, links):
+        links = np.asarray(links, dtype=np.uint64).reshape(-1, 2)
+        self.pending.append((links[:, 0] << np.uint64(32)) | links[:, 1])
+        self.nb_pending += len(links)
+
+        if self.nb_pending >= self.merge_size:
+            self.merge()
+
+    def merge(self):
+        if self.pending:
+            self.keys = np.unique(np.concatenate([self.keys] + self.pending))
+            self.pending = []
+            self.nb_pending = 0
+
+    def __len__(self):
+        self.merge()
+        return len(self.keys)
+
+    # Arrays (as1, as2) of all the links.
+    def links(self):
+        self.merge()
+        return (self.keys >> np.uint64(32)).astype(np.int64), (self.keys & np.uint64(0xFFFFFFFF)).astype(np.int64)
@@ -6,6 +6,11 @@ import gzip
 from pprint import pprint
 import json_lines
 
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 from colorama import Fore
 from colorama import Style
 from colorama import init
@@ -14,20 +19,42 @@ init(autoreset=True)
 def print_prefix():
     return Fore.BLUE+Style.BRIGHT+"[peerindbparser.py]: "+Style.NORMAL
 
-def read_asn_facilities(peeringdb_file, outfile):
+####
+# The PeeringDB dump is read once: the items of the sections used below are
+# streamed one by one with ijson if it is installed (otherwise the whole
+# document is loaded with json), and all the outputs are filled at once.
+####
+
+SECTIONS = ['org', 'net', 'netfac', 'netixlan']
+
+# Yields the (section, item) of the PeeringDB dump, in the order of the file.
+def iter_peeringdb_items(peeringdb_file):
+    if ijson is None:
+        with open(peeringdb_file, 'r') as fd:
+            data = json.load(fd)
+        for section in SECTIONS:
+            for item in data[section]["data"]:
+                yield section, item
+        return
+
+    item_prefixes = {section+'.data.item': section for section in SECTIONS}
+    builder = None
+    with open(peeringdb_file, 'rb') as fd:
+        for prefix, event, value in ijson.parse(fd, use_float=True):
+            if builder is not None:
+                builder.event(event, value)
+                if prefix == builder_prefix and event == 'end_map':
+                    yield item_prefixes[prefix], builder.value
+                    builder = None
+            elif event == 'start_map' and prefix in item_prefixes:
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                builder_prefix = prefix
+
+
+def write_asn_facilities(net_to_fac, outfile):
     print (print_prefix()+"Parsing facilities, saving in: {}".format(outfile))
 
-    net_to_fac = {}  # AS ID -> Fac list.
-
-    # Read the PeeringDB from a CAIDA's snaphot.
-    data = json.load(open(peeringdb_file, 'r'))
-
-    # Focus on the netfac item, and get facilities for every AS.
-    for netfac in data['netfac']["data"]:
-        if netfac["local_asn"] not in net_to_fac:
-            net_to_fac[netfac["local_asn"]] = set()
-        net_to_fac[netfac["local_asn"]].add((netfac['fac_id'], netfac['name'], netfac['country'], netfac['city']))
-    
     # Print the output
     with open(outfile, 'w') as fd:
         for k in sorted(net_to_fac.keys()):
@@ -39,20 +66,9 @@ def read_asn_facilities(peeringdb_file, outfile):
 
             fd.write('{} {}\n'.format(k, s))
 
-def read_asn_ixps(peeringdb_file, outfile):
+def write_asn_ixps(net_to_ixp, outfile):
     print (print_prefix()+"Parsing ixps, saving in: {}".format(outfile))
 
-    net_to_ixp = {}  # AS ID -> Fac list.
-    
-    # Read the PeeringDB from a CAIDA's snaphot.
-    data = json.load(open(peeringdb_file, 'r'))
-
-    # Focus on the netixlan item, and get ixp for every AS.
-    for netixlan in data['netixlan']["data"]:
-        if netixlan["asn"] not in net_to_ixp:
-            net_to_ixp[netixlan["asn"]] = set()
-        net_to_ixp[netixlan["asn"]].add((netixlan['ix_id'], netixlan['name']))
-    
     # Print the output
     with open(outfile, 'w') as fd:
         for k in sorted(net_to_ixp.keys()):
@@ -64,7 +80,7 @@ def read_asn_ixps(peeringdb_file, outfile):
 
             fd.write('{} {}\n'.format(k, s))
 
-def read_ixps(peeringdb_file, caidaixp_tmp_file, outfile):
+def write_ixps(route_server_asn, caidaixp_tmp_file, outfile):
     print (print_prefix()+"Parsing caida ixps, saving in: {}".format(outfile))
 
     # Read the IXP info from a CAIDA's files.
@@ -74,22 +90,11 @@ def read_ixps(peeringdb_file, caidaixp_tmp_file, outfile):
             if not line.startswith('#'):
                 caida_ixp_asn.add(json.loads(line.rstrip('\n|\r'))['asn'])
 
-    # Read the PeeringDB from a CAIDA's snaphot.
-    data = json.load(open(peeringdb_file, 'r'))
-
-    # Get the ASN of all the network with type "route server".
-    route_server_asn = set()
-    for net in data['net']["data"]:
-        if net["info_type"].lower() == "route server" or net["info_type"].lower() == "non-profit":
-            route_server_asn.add(net["asn"])
-
     with open(outfile, 'w') as fd:
         for asn in caida_ixp_asn.intersection(route_server_asn):
             fd.write('{}\n'.format(asn))
 
-
-
-def read_asn_country(peeringdb_file, astocountry_file, outfile):
+def write_asn_country(org_to_country_peeringdb, net_to_org, astocountry_file, outfile):
     print (print_prefix()+"Parsing country, saving in: {}".format(outfile))
 
     asn_to_country = {}
@@ -107,19 +112,10 @@ def read_asn_country(peeringdb_file, astocountry_file, outfile):
     for asn, org_id in asn_to_org.items():
         asn_to_country[int(asn)] = (org_to_country[org_id], 'caida')
 
-    # Parse PeerginDB database.
-    org_to_country = {} # Org ID -> country.
-    # Read the PeeringDB from a CAIDA's snaphot.
-    data = json.load(open(peeringdb_file, 'r'))
-
-    # Get the country for every organisation.
-    for org in data['org']["data"]:
-        org_to_country[org['id']] = org['country']
-
     # Get the country for every network, using organzation's country.
-    for net in data['net']["data"]:
-        if net['org_id'] in org_to_country and len(org_to_country[net['org_id']]) > 0:
-            asn_to_country[int(net['asn'])] = (org_to_country[net['org_id']], 'peeringdb')
+    for asn, org_id in net_to_org:
+        if org_id in org_to_country_peeringdb and len(org_to_country_peeringdb[org_id]) > 0:
+            asn_to_country[int(asn)] = (org_to_country_peeringdb[org_id], 'peeringdb')
 
     # Write the resulting inferred country, with priority given to peeringdb whenever possible.
     with open(outfile, 'w') as fd:
@@ -127,6 +123,44 @@ def read_asn_country(peeringdb_file, astocountry_file, outfile):
             fd.write('{} {} {}\n'.format(asn, value[0], value[1]))
 
 
+def parse_peeringdb_snapshot(peeringdb_file, caidaixp_tmp_file, astocountry_file, outfile_fac, outfile_ixp, outfile_country, outfile_ixplist):
+    net_to_fac = {}  # AS ID -> Fac list.
+    net_to_ixp = {}  # AS ID -> IXP list.
+    org_to_country = {} # Org ID -> country.
+    net_to_org = [] # (AS ID, Org ID) of every network.
+    route_server_asn = set()
+
+    print (print_prefix()+"Reading {}".format(peeringdb_file))
+    for section, item in iter_peeringdb_items(peeringdb_file):
+        # Get facilities for every AS.
+        if section == 'netfac':
+            if item["local_asn"] not in net_to_fac:
+                net_to_fac[item["local_asn"]] = set()
+            net_to_fac[item["local_asn"]].add((item['fac_id'], item['name'], item['country'], item['city']))
+
+        # Get ixp for every AS.
+        elif section == 'netixlan':
+            if item["asn"] not in net_to_ixp:
+                net_to_ixp[item["asn"]] = set()
+            net_to_ixp[item["asn"]].add((item['ix_id'], item['name']))
+
+        # Get the country for every organisation.
+        elif section == 'org':
+            org_to_country[item['id']] = item['country']
+
+        elif section == 'net':
+            net_to_org.append((item['asn'], item['org_id']))
+
+            # Get the ASN of all the network with type "route server".
+            if item["info_type"].lower() == "route server" or item["info_type"].lower() == "non-profit":
+                route_server_asn.add(item["asn"])
+
+    write_asn_facilities(net_to_fac, outfile_fac)
+    write_asn_ixps(net_to_ixp, outfile_ixp)
+    write_asn_country(org_to_country, net_to_org, astocountry_file, outfile_country)
+    write_ixps(route_server_asn, caidaixp_tmp_file, outfile_ixplist)
+
+
 
 
 
@@ -5,6 +5,12 @@ from datetime import datetime, timedelta
 from concurrent import futures
 import click 
 
+import numpy as np
+
+from utils.topology_loader import binary_topology_file, load_text_topology, write_binary_topology
+from utils.edge_keys import pack_edges, unpack_edges
+from utils.topology_index import TopologyIndex
+
 from colorama import Fore
 from colorama import Style
 from colorama import init
@@ -20,6 +26,10 @@ class TopoGenerator:
         if not os.path.isdir(self.db_dir+'/'+self.prefix_dir):
             os.mkdir(self.db_dir+'/'+self.prefix_dir)
 
+        # Directory with the state used by the incremental mode.
+        if not os.path.isdir(self.db_dir+'/'+self.prefix_dir+'/state'):
+            os.mkdir(self.db_dir+'/'+self.prefix_dir+'/state')
+
     def print_prefix():
         return Fore.WHITE+Style.BRIGHT+"[TopoGenerator]: "+Style.NORMAL
 
@@ -31,11 +41,13 @@ class TopoGenerator:
 
     # Function call to generate the topologies for an interval of time (ie multiple days).
     # The function parralellized the generation of the topologies.
+    # In incremental mode, every day depends on the previous one, so the days are done in order.
     def get_topo_interval(self, \
                             start_date:str, \
                             stop_date:str, \
                             override: bool=False, \
-                            nbdays: int=300):
+                            nbdays: int=300, \
+                            incremental: bool=False):
 
         # Transform string date to datetime object.
         start_date = datetime.strptime(start_date, "%Y-%m-%dT%H:%M:%S")
@@ -47,6 +59,11 @@ class TopoGenerator:
             cur_d = d.strftime("%Y-%m-%dT%H:%M:%S")
             paramslist.append([self.db_dir, cur_d, override, nbdays, self.prefix_dir])
 
+        if incremental:
+            for params in paramslist:
+                print (TopoGenerator.print_prefix()+TopoGenerator.get_topo_date_incremental(params))
+            return
+
         with futures.ProcessPoolExecutor(self.max_workers) as executor:
             for result in executor.map(TopoGenerator.get_topo_date, paramslist):
                 print (TopoGenerator.print_prefix()+result)
@@ -66,7 +83,13 @@ class TopoGenerator:
         date = datetime.strptime(datestr, "%Y-%m-%dT%H:%M:%S")
 
         # In case the full topology already exists, we just return the corresponding file.
-        if os.path.isfile(db_dir+'/'+prefix_dir+'/{}.txt'.format(date.strftime("%Y-%m-%d"))) and not override:
+        fname = db_dir+'/'+prefix_dir+'/{}.txt'.format(date.strftime("%Y-%m-%d"))
+        if os.path.isfile(fname) and not override:
+            # Topologies merged before the binary format existed only have the text file.
+            if not os.path.isfile(binary_topology_file(fname)):
+                topo = load_text_topology(fname)
+                write_binary_topology(binary_topology_file(fname), *topo.edge_arrays())
+                return "{}: New edge topology already exists, binary snapshot written.".format(datestr)
             return "{}: New edge topology already exists.".format(datestr)
 
         # Get the date for the first day of the X previous month.
@@ -111,8 +134,129 @@ class TopoGenerator:
             for as1, as2 in topo_all.edges():
                 fd.write("{} {}\n".format(as1, as2))
 
+        # Also write the binary snapshot, memory-mapped by the other modules.
+        write_binary_topology(binary_topology_file(fname), \
+                            [as1 for as1, _ in topo_all.edges()], \
+                            [as2 for _, as2 in topo_all.edges()])
+
         return '{}: Graph built and save'.format(datestr)
 
+    ####
+    # Incremental mode. The state of a day is the set of links seen during
+    # the window with, for every link, the last day it was seen (as an ordinal).
+    # The topology of a day is then obtained from the state of the previous day
+    # by only reading the files of the new day: the links seen that day are
+    # refreshed, and the links last seen before the start of the window expire.
+    ####
+
+    def state_filename(db_dir, prefix_dir, date):
+        return db_dir+'/'+prefix_dir+'/state/'+date.strftime("%Y-%m-%d")+'.npz'
+
+    def load_state(db_dir, prefix_dir, date, nbdays):
+        fname = TopoGenerator.state_filename(db_dir, prefix_dir, date)
+        if not os.path.isfile(fname):
+            return None
+
+        with np.load(fname) as state:
+            # A state built with a shorter window lacks some links.
+            if int(state['nbdays']) < nbdays:
+                return None
+            return state['keys'], state['last_seen']
+
+    def save_state(db_dir, prefix_dir, date, nbdays, keys, last_seen):
+        fname = TopoGenerator.state_filename(db_dir, prefix_dir, date)
+        fname_tmp = fname+'.tmp'
+        with open(fname_tmp, 'wb') as fd:
+            np.savez(fd, keys=keys, last_seen=last_seen, nbdays=np.array(nbdays))
+        os.replace(fname_tmp, fname)
+
+        # The states before the previous day are not needed anymore.
+        state_dir = db_dir+'/'+prefix_dir+'/state'
+        oldest = (date - timedelta(days=1)).strftime("%Y-%m-%d")
+        for f in os.listdir(state_dir):
+            if f.endswith('.npz') and f[:-4] < oldest:
+                os.remove(state_dir+'/'+f)
+
+    # Packed keys of all the links seen on a given day, in the updates and in the RIBs.
+    def read_day_keys(db_dir, cur_date):
+        filename = db_dir+'/topology/'+cur_date.strftime("%Y-%m-%d")+"_updates.txt"
+        if not os.path.isfile(filename):
+            print (TopoGenerator.print_prefix()+'Update file {} does not exist, skipping it.'.format(filename))
+
+        day = TopologyIndex(db_dir).day(cur_date)
+        if day is None:
+            return np.empty(0, dtype=np.uint64)
+
+        as1, as2 = unpack_edges(day.keys)
+        keep = as1 != as2
+
+        return np.unique(pack_edges(as1[keep], as2[keep]))
+
+    # Same as get_topo_date, but the topology is built from the state of the
+    # previous day when it is available. Also takes a list of params.
+    def get_topo_date_incremental(paramslist):
+        db_dir = paramslist[0]
+        datestr = paramslist[1]
+        override = paramslist[2]
+        nbdays = paramslist[3]
+        prefix_dir = paramslist[4]
+
+        date = datetime.strptime(datestr, "%Y-%m-%dT%H:%M:%S")
+        first_day = date - timedelta(days=nbdays)
+        fname = db_dir+'/'+prefix_dir+'/{}.txt'.format(date.strftime("%Y-%m-%d"))
+
+        # The state is still updated when the topology already exists, so that the next day can use it.
+        exists = os.path.isfile(fname) and not override
+        if exists and TopoGenerator.load_state(db_dir, prefix_dir, date, nbdays) is not None:
+            return "{}: New edge topology already exists.".format(datestr)
+
+        state = TopoGenerator.load_state(db_dir, prefix_dir, date - timedelta(days=1), nbdays)
+
+        if state is None:
+            # No state for the previous day: read all the days of the window.
+            print (TopoGenerator.print_prefix()+str(datestr)+': No state for the previous day, reading all the days of the window')
+            all_keys = []
+            all_last_seen = []
+            days = TopoGenerator.daterange(first_day, date + timedelta(days=1))
+        else:
+            all_keys = [state[0]]
+            all_last_seen = [state[1]]
+            days = [date]
+
+        for cur_date in days:
+            day_keys = TopoGenerator.read_day_keys(db_dir, cur_date)
+            all_keys.append(day_keys)
+            all_last_seen.append(np.full(len(day_keys), cur_date.toordinal(), dtype=np.int32))
+
+        keys = np.concatenate(all_keys) if len(all_keys) else np.empty(0, dtype=np.uint64)
+        last_seen = np.concatenate(all_last_seen) if len(all_last_seen) else np.empty(0, dtype=np.int32)
+
+        # Keep the most recent day for every link, the result is sorted by key.
+        order = np.lexsort((last_seen, keys))
+        keys = keys[order]
+        last_seen = last_seen[order]
+        last = np.append(keys[1:] != keys[:-1], True) if len(keys) else np.empty(0, dtype=bool)
+        keys = keys[last]
+        last_seen = last_seen[last]
+
+        # Expire the links that were not seen during the window.
+        valid = last_seen >= first_day.toordinal()
+        keys = keys[valid]
+        last_seen = last_seen[valid]
+
+        TopoGenerator.save_state(db_dir, prefix_dir, date, nbdays, keys, last_seen)
+
+        if exists:
+            return "{}: New edge topology already exists, state updated.".format(datestr)
+
+        as1, as2 = unpack_edges(keys)
+        with open(fname, 'w') as fd:
+            fd.write(''.join("{} {}\n".format(a, b) for a, b in zip(as1.tolist(), as2.tolist())))
+
+        write_binary_topology(binary_topology_file(fname), as1, as2)
+
+        return '{}: Graph built incrementally and save ({} links)'.format(datestr, len(keys))
+
 # Make the CLI.
 @click.command()
 @click.option('--date', help='Date for which to collect the full topology, in the following format "YYYY-MM-DDThh:mm:ss".', type=str)
@@ -121,6 +265,7 @@ class TopoGenerator:
 @click.option('--nbdays', default=300, help='Number of prior days to consider, default=300.', type=int)
 @click.option('--override', default=False, help='Override existing files.', type=bool)
 @click.option('--max_workers', default=10, help='Max number of worker when interval of time is used.', type=int)
+@click.option('--incremental', default=False, help='Build every topology from the state of the previous day, reading only the files of the new day.', type=bool)
 
 def generate_topology(\
     date, \
@@ -128,17 +273,23 @@ def generate_topology(\
     db_dir, \
     nbdays, \
     override, \
-    max_workers):
+    max_workers, \
+    incremental):
     """ Get the full (ie merged) topology from the downloaded updates and rib."""
 
     tc = TopoGenerator(db_dir, max_workers)
     if date_end is None:
-        tc.get_topo_date(date, override, nbdays=nbdays)
+        params = [db_dir, date, override, nbdays, tc.prefix_dir]
+        if incremental:
+            print (TopoGenerator.print_prefix()+TopoGenerator.get_topo_date_incremental(params))
+        else:
+            print (TopoGenerator.print_prefix()+TopoGenerator.get_topo_date(params))
     else:
         tc.get_topo_interval(date, \
                             date_end, \
                             override, \
-                            nbdays=nbdays)
+                            nbdays=nbdays, \
+                            incremental=incremental)
 
 if __name__ == "__main__":
     generate_topology()
\ No newline at end of file
@@ -1,9 +1,9 @@
 import os
-import csv
-import networkx as nx
+import numpy as np
 from datetime import datetime, timedelta
 import click 
 import time
+import heapq
 
 import psycopg
 from ipaddress import ip_network, ip_address
@@ -14,10 +14,16 @@ from colorama import init
 init(autoreset=True)
 
 from utils.get_paths import GetPath
+from utils import api_cache
+from utils.topology_index import TopologyIndex
+from utils.topology_loader import load_topology
+from utils.edge_keys import pack_edges
+from utils.suspicious_store import SuspiciousEdgeStore
 
 
 class NewEdgeFinder:
-    def __init__(self, db_dir: str, store_results_in_db: bool, store_results_in_file: bool, max_vps_per_newedge: int, max_workers: int):
+    def __init__(self, db_dir: str, store_results_in_db: bool, store_results_in_file: bool, max_vps_per_newedge: int, max_workers: int, vps_subset_mode: str='exact', \
+        max_concurrency: int=1, max_requests_per_second: float=0, max_retries: int=3):
         self.db_dir = db_dir
         self.results_db_config = {
             'dbname': os.getenv('DFOH_DB_NAME'),
@@ -27,7 +33,12 @@ class NewEdgeFinder:
             'port': 5432
         } if store_results_in_db else None
         self.max_vps_per_newedge = max_vps_per_newedge
+        self.vps_subset_mode = vps_subset_mode
+        self.vps_subset_counters = {'picks': 0, 'pops': 0, 'updates': 0}
         self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self.max_requests_per_second = max_requests_per_second
+        self.max_retries = max_retries
         self.prefix_dir = 'new_edge'
         self.store_results_in_file = store_results_in_file
 
@@ -94,25 +105,59 @@ class NewEdgeFinder:
             if count_vps_per_newedge[newedge] < self.max_vps_per_newedge:
                 new_tmp_mapping[newedge] = new_vps_set
 
-        count_newedges_per_vp = {}
+        # Step 3: Inverted index, with the new edges seen by every remaining VP.
+        newedges_per_vp = {}
         for newedge, vps in new_tmp_mapping.items():
             for vp in vps:
-                count_newedges_per_vp[vp] = count_newedges_per_vp.get(vp, 0) + 1
+                if vp not in newedges_per_vp:
+                    newedges_per_vp[vp] = []
+                newedges_per_vp[vp].append(newedge)
+
+        counters = {'picks': 0, 'pops': 0, 'updates': 0}
+
+        # Step 4: Greedy cover. In exact mode, the VPs are picked by decreasing
+        # number of new edges (computed once, ties broken by order of appearance).
+        # In lazy mode, they are picked by number of new edges not yet covered,
+        # using a lazy priority queue and bitsets of the uncovered new edges.
+        heap = [(-len(newedges), i, vp) for i, (vp, newedges) in enumerate(newedges_per_vp.items())]
+        heapq.heapify(heap)
+
+        if self.vps_subset_mode == 'lazy':
+            edge_ids = {newedge: i for i, newedge in enumerate(new_tmp_mapping)}
+            edge_bits = {}
+            for vp, newedges in newedges_per_vp.items():
+                bits = 0
+                for newedge in newedges:
+                    bits |= 1 << edge_ids[newedge]
+                edge_bits[vp] = bits
+            uncovered = (1 << len(edge_ids)) - 1
+
+        while new_tmp_mapping and heap:
+            _, i, max_vp = heapq.heappop(heap)
+            counters['pops'] += 1
+
+            if self.vps_subset_mode == 'lazy':
+                gain = (edge_bits[max_vp] & uncovered).bit_count()
+                if gain == 0:
+                    continue
+                # The gain of the VP has decreased since it was pushed, push it back.
+                if heap and gain < -heap[0][0]:
+                    heapq.heappush(heap, (-gain, i, max_vp))
+                    continue
 
-        while new_tmp_mapping and count_newedges_per_vp:
-            max_vp = max(count_newedges_per_vp, key=count_newedges_per_vp.get)
             vps_subset.add(max_vp)
-            del count_newedges_per_vp[max_vp]
+            counters['picks'] += 1
 
-            edges_to_remove = []
-            for newedge, vps in new_tmp_mapping.items():
-                if max_vp in vps:
+            for newedge in newedges_per_vp[max_vp]:
+                if newedge in new_tmp_mapping:
                     count_vps_per_newedge[newedge] += 1
+                    counters['updates'] += 1
                     if count_vps_per_newedge[newedge] >= self.max_vps_per_newedge:
-                        edges_to_remove.append(newedge)
+                        del new_tmp_mapping[newedge]
+                        if self.vps_subset_mode == 'lazy':
+                            uncovered &= ~(1 << edge_ids[newedge])
 
-            for newedge in edges_to_remove:
-                del new_tmp_mapping[newedge]
+        self.vps_subset_counters = counters
 
         return vps_subset
 
@@ -157,74 +202,51 @@ class NewEdgeFinder:
                 if conn:
                     conn.close()
         else:
-            for cur_date in NewEdgeFinder.daterange(first_day, date):
-                case_filename = self.db_dir+'/cases/'+cur_date.strftime("%Y-%m-%d")
-                if os.path.isfile(case_filename):
-                    with open(case_filename, 'r') as fd:
-                        for line in fd.readlines():
-                            if line.startswith('!sus'):
-                                linetab = line.rstrip().split(' ')
-                                as1 = int(linetab[1])
-                                as2 = int(linetab[2])
-
-                                if (as1, as2) not in suspicious_edges:
-                                    suspicious_edges[(as1, as2)] = cur_date
-
-                            if line.startswith('!leg'):
-                                linetab = line.rstrip().split(' ')
-                                as1 = int(linetab[1])
-                                as2 = int(linetab[2])
-                                if (as1, as2) in suspicious_edges:
-                                    del suspicious_edges[(as1, as2)]
-                                elif (as2, as1) in suspicious_edges:
-                                    del suspicious_edges[(as2, as1)]
+            with SuspiciousEdgeStore(self.db_dir) as store:
+                suspicious_edges = store.suspicious_edges(date, nbdays)
 
         print (NewEdgeFinder.print_prefix()+"Number of suspicious edges: {}.".format(len(suspicious_edges)))
 
-        # Load the graph before the date.
-        topo_before = nx.Graph()
-
+        # Load the links of the topology before the date, as packed keys.
+        keys_before = np.empty(0, dtype=np.uint64)
         filename = self.db_dir+'/merged_topology/'+(date - timedelta(days=1)).strftime("%Y-%m-%d")+".txt"
-        if os.path.isfile(filename): 
-            with open(filename, 'r') as fd:
-                csv_reader = csv.reader(fd, delimiter=' ')
-                for row in csv_reader:
-                    as1 = int(row[0])
-                    as2 = int(row[1])
-                    if ((as1, as2) not in suspicious_edges and (as2, as1) not in suspicious_edges) \
-                        or ((as1, as2) in suspicious_edges and date.day-suspicious_edges[(as1, as2)].day > 31) \
-                        or ((as2, as1) in suspicious_edges and date.day-suspicious_edges[(as2, as1)].day > 31):
-                        topo_before.add_edge(as1, as2)
-                    else:
-                        if (as1, as2) in suspicious_edges:
-                            print ('{} {} not added because suspicious {}'.format(as1, as2, suspicious_edges[(as1, as2)]))
-                        else:
-                            print ('{} {} not added because suspicious {}'.format(as1, as2, suspicious_edges[(as2, as1)]))
+        if os.path.isfile(filename):
+            keys_before = pack_edges(*load_topology(filename).edge_arrays())
+
+        # Omit the suspicious links, unless their first suspicious case is more than 31 days old.
+        if len(suspicious_edges) > 0:
+            sus = np.array([(as1, as2, (date.date()-sus_date).days) for (as1, as2), sus_date in suspicious_edges.items()], dtype=np.int64)
+            sus_keys = pack_edges(sus[:, 0], sus[:, 1])
+            recent_keys = np.setdiff1d(sus_keys[sus[:, 2] <= 31], sus_keys[sus[:, 2] > 31])
+
+            omitted = np.isin(keys_before, recent_keys, assume_unique=True)
+            keys_before = keys_before[~omitted]
+            print (NewEdgeFinder.print_prefix()+"{} suspicious edges omitted from the topology.".format(np.count_nonzero(omitted)))
 
         # Check the diff with the edges in the current day to find the new edges.
         filename = self.db_dir+'/topology/'+date.strftime("%Y-%m-%d")+"_updates.txt"
-        topo_after = nx.Graph()
+        nb_new_links = 0
         mapping_newedges_to_vps = {}
         new_edges_added = set()
         mapping_vps_to_newedges = {}
-        if os.path.isfile(filename): 
-            with open(filename, 'r') as fd:
-                csv_reader = csv.reader(fd, delimiter=' ')
-                for row in csv_reader:
-                    # Search for new link
-                    # Either the new link did not exist.
-                    as1 = int(row[0])
-                    as2 = int(row[1])
-                    if not topo_before.has_edge(as1, as2):
-                        topo_after.add_edge(as1, as2)
-                        if row[2] not in mapping_newedges_to_vps:
-                            mapping_newedges_to_vps[row[2]] = set()
-                        mapping_newedges_to_vps[row[2]].add((as1, as2))
-                        new_edges_added.add((as1, as2))
-
-                        if (as1, as2) not in mapping_vps_to_newedges:
-                            mapping_vps_to_newedges[(as1, as2)] = set()
-                        mapping_vps_to_newedges[(as1, as2)].add(row[2])
+        day = TopologyIndex(self.db_dir).day(date) if os.path.isfile(filename) else None
+        if day is not None:
+            as1, as2, vps = day.updates_rows()
+            keys_after = pack_edges(as1, as2)
+
+            # A link is new if it did not exist before (self-loops are not links).
+            new = (as1 != as2) & ~np.isin(keys_after, keys_before)
+            nb_new_links = len(np.unique(keys_after[new]))
+
+            for as1, as2, vp in zip(as1[new].tolist(), as2[new].tolist(), vps[new].tolist()):
+                if vp not in mapping_newedges_to_vps:
+                    mapping_newedges_to_vps[vp] = set()
+                mapping_newedges_to_vps[vp].add((as1, as2))
+                new_edges_added.add((as1, as2))
+
+                if (as1, as2) not in mapping_vps_to_newedges:
+                    mapping_vps_to_newedges[(as1, as2)] = set()
+                mapping_vps_to_newedges[(as1, as2)].add(vp)
 
         start = time.time()
         vps_subset = self.get_vps_subset(mapping_vps_to_newedges)
@@ -232,7 +254,7 @@ class NewEdgeFinder:
         for vp, newedges in mapping_newedges_to_vps.items():
             if vp in vps_subset:
                 new_mapping_newedges_to_vps[vp] = newedges
-        print(f"Time to compute the subset of VPs: {time.time() - start} seconds.")
+        print(f"Time to compute the subset of VPs: {time.time() - start} seconds ({self.vps_subset_counters['picks']} VPs picked, {self.vps_subset_counters['pops']} queue pops, {self.vps_subset_counters['updates']} edge updates).")
 
         print(f"Reduction from {len(mapping_newedges_to_vps)} VPs to {len(new_mapping_newedges_to_vps)} VPs")
 
@@ -244,7 +266,7 @@ class NewEdgeFinder:
 
         print (NewEdgeFinder.print_prefix()+datestr+': New edges computed. Found {} new edges.'.format(len(new_edges_added)))
 
-        gp = GetPath(self.max_workers)
+        gp = GetPath(self.max_workers, self.max_concurrency, self.max_requests_per_second, self.max_retries)
         edge_paths = gp.collect_paths(ts_start=date, ts_end=date + timedelta(days=1), ixp_file=ixp_file, mapping_newedges_to_vps=new_mapping_newedges_to_vps)
 
         # Prepare file and database connections outside the loop
@@ -257,7 +279,7 @@ class NewEdgeFinder:
             if self.store_results_in_file:
                 filename = self.db_dir + '/' + self.prefix_dir + '/' + date.strftime("%Y-%m-%d") + ".txt"
                 file_fd = open(filename, 'w', 1)
-                file_fd.write('# Number of edges found: {}\n'.format(topo_after.number_of_edges()))
+                file_fd.write('# Number of edges found: {}\n'.format(nb_new_links))
             
             # Setup database connection if needed
             if self.results_db_config:
@@ -324,7 +346,14 @@ class NewEdgeFinder:
 @click.option('--date', help='Date for which to collect the full topology, in the following format "YYYY-MM-DDThh:mm:ss".', type=str)
 @click.option('--max_vps_per_newedge', default=10, help='Maximum number of vantage points per new edge to collect AS paths.', type=int)
 @click.option('--max_workers', default=1, help='Maximum number of workers when downloading the updates.', type=int)
+@click.option('--max_concurrency', default=1, help='Maximum number of concurrent API requests per worker when downloading the updates.', type=int)
+@click.option('--max_requests_per_second', default=0, help='Maximum number of API requests per second (0 for no limit).', type=float)
+@click.option('--max_retries', default=3, help='Maximum number of retries of a failed API request.', type=int)
+@click.option('--vps_subset_mode', default='exact', help='How to pick the subset of VPs: "exact" (same VPs as before) or "lazy" (greedy on the new edges not covered yet, usually fewer VPs).', type=click.Choice(['exact', 'lazy']))
 @click.option('--db_dir', default="db", help='Directory where is database.', type=str)
+@click.option('--api_cache_dir', default=None, help='Directory of the cache of the bgproutes.io API responses (no cache if not set).', type=str)
+@click.option('--api_cache_mode', default='readwrite', help='"readwrite" to use and fill the API cache, "offline" to only replay it (no network).', type=click.Choice(['readwrite', 'offline']))
+@click.option('--api_cache_max_size', default=4096, help='Maximum size of the API cache, in MB.', type=int)
 @click.option('--store_results_in_db', default=True, help='If True, store results in the PostgreSQL db.', type=bool)
 @click.option('--store_results_in_file', default=False, help='If True, store results in the files.', type=bool)
 
@@ -332,19 +361,32 @@ def compute_new_edge(\
     date, \
     max_vps_per_newedge, \
     max_workers, \
+    max_concurrency, \
+    max_requests_per_second, \
+    max_retries, \
+    vps_subset_mode, \
     db_dir, \
+    api_cache_dir, \
+    api_cache_mode, \
+    api_cache_max_size, \
     store_results_in_db, \
     store_results_in_file):
     """ Get the new edge links that appear in a given day.
     This script relies on the merged topology.
     If they are not in the database, it builds them first."""
 
+    api_cache.configure(api_cache_dir, api_cache_mode, api_cache_max_size)
+
     nef = NewEdgeFinder( \
         db_dir=db_dir, \
         store_results_in_db=store_results_in_db, \
         store_results_in_file=store_results_in_file, \
         max_vps_per_newedge=max_vps_per_newedge, \
-        max_workers=max_workers)
+        max_workers=max_workers, \
+        vps_subset_mode=vps_subset_mode, \
+        max_concurrency=max_concurrency, \
+        max_requests_per_second=max_requests_per_second, \
+        max_retries=max_retries)
     nef.compute_new_edge(date, 300)
 
 if __name__ == "__main__":
@@ -0,0 +1,42 @@
+import numpy as np
+
+
+# Links are stored as packed 64-bit keys: min ASN << 32 | max ASN. ASNs fit on
+# 32 bits, so a set of links is a sorted array of uint64 and set operations
+# between topologies are sorted-array operations.
+
+def pack_edges(as1, as2):
+    as1 = np.asarray(as1, dtype=np.uint64)
+    as2 = np.asarray(as2, dtype=np.uint64)
+
+    return (np.minimum(as1, as2) << np.uint64(32)) | np.maximum(as1, as2)
+
+
+def unpack_edges(keys):
+    keys = np.asarray(keys, dtype=np.uint64)
+
+    return (keys >> np.uint64(32)).astype(np.int64), (keys & np.uint64(0xFFFFFFFF)).astype(np.int64)
+
+
+####
+# Reads a topology file with one "as1 as2 ..." link per line (the other
+# columns are ignored) and returns the sorted array of the packed keys of
+# its links, without duplicates and self-loops.
+####
+
+def read_edge_keys(filename):
+    as1 = []
+    as2 = []
+    with open(filename, 'r') as fd:
+        for line in fd:
+            linetab = line.split(' ', 2)
+            if len(linetab) < 2 or line.startswith('#'):
+                continue
+            as1.append(int(linetab[0]))
+            as2.append(int(linetab[1]))
+
+    as1 = np.array(as1, dtype=np.int64)
+    as2 = np.array(as2, dtype=np.int64)
+    keep = as1 != as2
+
+    return np.unique(pack_edges(as1[keep], as2[keep]))
@@ -1,84 +1,233 @@
 import os
+import time
+import random
+import asyncio
 from concurrent import futures
 from datetime import datetime
+from urllib.parse import urlparse
+import requests
+import numpy as np
 
+import pybgproutesapi._client
 from pybgproutesapi import updates, topology, vantage_points
-from utils.cleaning import remove_asprepending
+from utils.edge_keys import pack_edges
+from utils.path_tokens import tokenize_paths, path_links, paths_with_links, clean_paths, watched_keys
+from utils import api_cache
 
 from colorama import Fore
 from colorama import Style
 from colorama import init
 init(autoreset=True)
 
-def process_vps_chunk(mapping_newedges_to_vps, ixp_set, ts_start, ts_end):
-    edge_paths = {e: {} for edges_subset in mapping_newedges_to_vps.values() for e in edges_subset}
-    identifier = next(iter(mapping_newedges_to_vps), "N/A")
+# The API can be redirected to another server (e.g. a local stand-in for tests).
+if os.getenv('BGPROUTES_API_URL'):
+    pybgproutesapi._client.BASE_URL = os.getenv('BGPROUTES_API_URL')
 
-    print(f"{Fore.YELLOW}[{datetime.now()}] Start collecting aspaths ({identifier}) {Style.RESET_ALL}")
-    for vp_ip, edges_subset in mapping_newedges_to_vps.items():
+####
+# Limits the requests sent to the API: at most max_concurrency requests in
+# flight, at most rate requests per second and per host (token bucket, 0 for
+# no limit), and up to max_retries retries with exponential backoff.
+####
+
+# Network errors, server errors and rate limiting are worth retrying, as are
+# the error responses of the API without a status code.
+def is_retryable(e):
+    if isinstance(e, api_cache.ApiError):
+        return e.status_code is None or e.status_code >= 500 or e.status_code == 429
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code >= 500 or e.response.status_code == 429
+
+    return isinstance(e, requests.RequestException)
+
+
+class RequestLimiter:
+    def __init__(self, max_concurrency: int=1, rate: float=0, max_retries: int=3, backoff: float=1):
+        self.semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+        self.rate = rate
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.buckets = {}   # host -> [tokens, last refill time]
+
+    async def wait_token(self, host):
+        if self.rate <= 0:
+            return
+
+        # The bucket holds at least one token, otherwise a rate below 1 would never allow a request.
+        capacity = max(self.rate, 1)
+        bucket = self.buckets.setdefault(host, [capacity, time.monotonic()])
+        while True:
+            now = time.monotonic()
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return
+            await asyncio.sleep((1 - bucket[0]) / self.rate)
+
+    ####
+    # Runs the blocking API call func(**kwargs) in a thread, returns (result,
+    # number of retries). Responses in the API cache are returned directly.
+    ####
+
+    async def call(self, endpoint, func, volatile=False, **kwargs):
+        found, response = api_cache.lookup(endpoint, (), kwargs, volatile)
+        if found:
+            return response, 0
+
+        host = urlparse(pybgproutesapi._client.BASE_URL).netloc
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.semaphore:
+                    await self.wait_token(host)
+                    response = await asyncio.to_thread(func, **kwargs)
+                api_cache.store(endpoint, (), kwargs, response)
+                return response, attempt
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                await asyncio.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+
+
+async def process_vp(vp_ip, edges_subset, ixp_set, ts_start, ts_end, limiter, metrics):
+    edge_paths = {}
+    ixp_asns = np.array([int(asn) for asn in ixp_set if str(asn).isdigit()], dtype=np.int64)
+    start = time.monotonic()
+    nb_requests = 0
+    nb_retries = 0
+
+    try:
+        vp, retries = await limiter.call('vantage_points', vantage_points, volatile=True, vp_ips=vp_ip)  # one call per VP
+        nb_requests += 1
+        nb_retries += retries
+        topo, retries = await limiter.call('topology', topology, vps=vp,
+                        date=ts_start.strftime("%Y-%m-%d"),
+                        with_aspath=True, with_rib=False, with_updates=True,
+                        as_to_ignore=ixp_set, ignore_private_asns=True)
+        nb_requests += 1
+        nb_retries += retries
+    except Exception as e:
+        print(f"{Fore.RED}[{datetime.now()}] Error {e} when retrieving topology for VP {vp_ip} {Style.RESET_ALL}")
+        metrics[vp_ip] = (time.monotonic() - start, nb_requests, nb_retries, False)
+        return edge_paths
+
+    # Collect this VP's AS paths that touch watched edges
+    watched = watched_keys(edges_subset)
+    asns, offsets = tokenize_paths(topo['aspaths'])
+    matched = paths_with_links(asns, offsets, watched)
+    aspaths = set(aspath_str for aspath_str, m in zip(topo['aspaths'], matched.tolist()) if m)
+
+    # Chunk per VP if >20k
+    aspaths_list = list(aspaths)
+    success = True
+    for i in range(0, len(aspaths_list), 20000):
+        chunk = aspaths_list[i:i+20000]
+        if not chunk:
+            continue
         try:
-            vp = vantage_points(vp_ips=vp_ip)  # one call per VP
-            topo = topology(vps=vp,
-                            date=ts_start.strftime("%Y-%m-%d"),
-                            with_aspath=True, with_rib=False, with_updates=True,
-                            as_to_ignore=ixp_set, ignore_private_asns=True)
+            data, retries = await limiter.call('updates', updates,
+                vps=vp,
+                start_date=ts_start.strftime("%Y-%m-%dT%H:%M:%S"),
+                end_date=ts_end.strftime("%Y-%m-%dT%H:%M:%S"),
+                type_filter='A',
+                return_community=False,
+                return_aspath=True,
+                aspath_exact_match=chunk
+            )
+            nb_requests += 1
+            nb_retries += retries
         except Exception as e:
-            print(f"{Fore.RED}[{datetime.now()}] Error {e} when retrieving topology for VP {vp_ip} {Style.RESET_ALL}")
+            print(f"{Fore.RED}[{datetime.now()}] Error {e} when retrieving updates for VP {vp_ip} {Style.RESET_ALL}")
+            success = False
             continue
 
-        # Collect this VP's AS paths that touch watched edges
-        aspaths = set()
-        for aspath_str in topo['aspaths']:
-            aspath = [int(x) for x in aspath_str.split()]
-            for k in range(len(aspath)-1):
-                if ((aspath[k], aspath[k+1]) in edges_subset) or ((aspath[k+1], aspath[k]) in edges_subset):
-                    aspaths.add(aspath_str)
-                    break
-
-        # Chunk per VP if >20k
-        aspaths_list = list(aspaths)
-        for i in range(0, len(aspaths_list), 20000):
-            chunk = aspaths_list[i:i+20000]
-            if not chunk:
-                continue
-            try:
-                data = updates(
-                    vps=vp,
-                    start_date=ts_start.strftime("%Y-%m-%dT%H:%M:%S"),
-                    end_date=ts_end.strftime("%Y-%m-%dT%H:%M:%S"),
-                    type_filter='A',
-                    return_community=False,
-                    return_aspath=True,
-                    aspath_exact_match=chunk
-                )
-            except Exception as e:
-                print(f"{Fore.RED}[{datetime.now()}] Error {e} when retrieving updates for VP {vp_ip} {Style.RESET_ALL}")
-                continue
-
-            for updates_batch in data.get('bgp', {}).values():
-                for upd in updates_batch:
-                    aspath_str = upd[3]
-                    aspath = remove_asprepending([int(x) for x in aspath_str.split()], ixp_set)
-                    if aspath is None:
-                        continue
-                    aspath_str = ' '.join(map(str, aspath))
-                    ts, prefix, vp_asn = int(upd[0]), upd[2], aspath[0]
-                    for j in range(len(aspath) - 1):
-                        for edge in ((aspath[j], aspath[j+1]), (aspath[j+1], aspath[j])):
-                            if edge in edges_subset:
-                                cur = edge_paths[edge].get(aspath_str)
-                                if cur is None or cur[0] > ts:
-                                    edge_paths[edge][aspath_str] = (ts, prefix, vp_ip, vp_asn)
+        all_updates = [upd for updates_batch in data.get('bgp', {}).values() for upd in updates_batch]
+        if not all_updates:
+            continue
+
+        # Clean all the AS paths at once, and find the links that are watched.
+        asns, offsets = tokenize_paths([upd[3] for upd in all_updates])
+        asns, offsets = clean_paths(asns, offsets, ixp_asns)
+        as1s, as2s, paths, _ = path_links(asns, offsets)
+        matched = np.flatnonzero(np.isin(pack_edges(as1s, as2s), watched))
+
+        aspath_strs = {}
+        for k in matched.tolist():
+            i = int(paths[k])
+            if i not in aspath_strs:
+                aspath_strs[i] = ' '.join(map(str, asns[offsets[i]:offsets[i+1]].tolist()))
+            aspath_str = aspath_strs[i]
+            upd = all_updates[i]
+            ts, prefix, vp_asn = int(upd[0]), upd[2], int(asns[offsets[i]])
+            for edge in ((int(as1s[k]), int(as2s[k])), (int(as2s[k]), int(as1s[k]))):
+                if edge in edges_subset:
+                    if edge not in edge_paths:
+                        edge_paths[edge] = {}
+                    cur = edge_paths[edge].get(aspath_str)
+                    if cur is None or cur[0] > ts:
+                        edge_paths[edge][aspath_str] = (ts, prefix, vp_ip, vp_asn)
+
+    metrics[vp_ip] = (time.monotonic() - start, nb_requests, nb_retries, success)
+    return edge_paths
+
+
+# Prints the per-VP latency metrics of a chunk.
+def print_metrics(identifier, metrics):
+    if not metrics:
+        return
+
+    latencies = sorted(latency for latency, _, _, _ in metrics.values())
+    nb_requests = sum(m[1] for m in metrics.values())
+    nb_retries = sum(m[2] for m in metrics.values())
+    nb_failed = sum(1 for m in metrics.values() if not m[3])
+    slowest = max(metrics, key=lambda vp_ip: metrics[vp_ip][0])
+
+    print(f"{Fore.YELLOW}[{datetime.now()}] VP latency ({identifier}): {len(latencies)} VPs, {nb_requests} requests, {nb_retries} retries, {nb_failed} failed VPs, " \
+        f"p50 {latencies[len(latencies)//2]:.2f}s, p95 {latencies[min(len(latencies)-1, int(len(latencies)*0.95))]:.2f}s, " \
+        f"max {latencies[-1]:.2f}s ({slowest}){Style.RESET_ALL}")
+
+
+async def collect_vps_chunk(mapping_newedges_to_vps, ixp_set, ts_start, ts_end, max_concurrency, rate, max_retries):
+    edge_paths = {e: {} for edges_subset in mapping_newedges_to_vps.values() for e in edges_subset}
+    limiter = RequestLimiter(max_concurrency, rate, max_retries)
+    metrics = {}
+
+    results = await asyncio.gather(*[process_vp(vp_ip, edges_subset, ixp_set, ts_start, ts_end, limiter, metrics) \
+        for vp_ip, edges_subset in mapping_newedges_to_vps.items()])
+
+    # Merge the paths of the VPs in their order, so that the earliest update
+    # of every path is kept as when the VPs are processed one by one.
+    for edge_paths_vp in results:
+        for edge, paths in edge_paths_vp.items():
+            for aspath_str, info in paths.items():
+                cur = edge_paths[edge].get(aspath_str)
+                if cur is None or cur[0] > info[0]:
+                    edge_paths[edge][aspath_str] = info
+
+    return edge_paths, metrics
+
+
+def process_vps_chunk(mapping_newedges_to_vps, ixp_set, ts_start, ts_end, max_concurrency=1, rate=0, max_retries=3):
+    identifier = next(iter(mapping_newedges_to_vps), "N/A")
+
+    print(f"{Fore.YELLOW}[{datetime.now()}] Start collecting aspaths ({identifier}) {Style.RESET_ALL}")
+    edge_paths, metrics = asyncio.run(collect_vps_chunk(mapping_newedges_to_vps, ixp_set, ts_start, ts_end, max_concurrency, rate, max_retries))
+    print_metrics(identifier, metrics)
 
     print(f"{Fore.GREEN}[{datetime.now()}] Finished collecting updates ({identifier}) {Style.RESET_ALL}")
     return edge_paths
 
 class GetPath:
-    def __init__(self, max_workers: int=1):
+    def __init__(self, max_workers: int=1, max_concurrency: int=1, max_requests_per_second: float=0, max_retries: int=3):
 
         # Max number of processes when download mrt files.
         self.max_workers = max_workers
 
+        # Max number of concurrent API requests per process, max request rate
+        # per process (0 for no limit) and max number of retries per request.
+        self.max_concurrency = max_concurrency
+        self.max_requests_per_second = max_requests_per_second
+        self.max_retries = max_retries
+
     def print_prefix(self):
         return Fore.WHITE+Style.BRIGHT+"[get_paths.py]: "+Style.NORMAL
     
@@ -108,7 +257,9 @@ class GetPath:
         
         # Parallel processing of vantage points to collect prefixes
         with futures.ProcessPoolExecutor(max_workers=len(mapping_newedges_to_vps_chunks)) as executor:
-            futures_list = [executor.submit(process_vps_chunk, mapping_newedges_to_vps_chunks[i], ixp_set, ts_start, ts_end) for i in range(len(mapping_newedges_to_vps_chunks))]
+            rate = self.max_requests_per_second / len(mapping_newedges_to_vps_chunks) if mapping_newedges_to_vps_chunks else 0
+            futures_list = [executor.submit(process_vps_chunk, mapping_newedges_to_vps_chunks[i], ixp_set, ts_start, ts_end, \
+                self.max_concurrency, rate, self.max_retries) for i in range(len(mapping_newedges_to_vps_chunks))]
             for future in futures_list:
                 edge_paths_chunk = future.result()
                 for e, paths in edge_paths_chunk.items():
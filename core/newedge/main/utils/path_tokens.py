@@ -0,0 +1,107 @@
+import warnings
+import numpy as np
+
+from utils.edge_keys import pack_edges
+
+
+####
+# Batched processing of AS paths. A batch of AS path strings ("as1 as2 ...")
+# is tokenized into a flat int64 array of ASNs with offsets: the ASNs of the
+# i-th path are asns[offsets[i]:offsets[i+1]].
+####
+
+def tokenize_paths(aspath_strs):
+    lengths = np.fromiter(map(len, aspath_strs), dtype=np.int64, count=len(aspath_strs))
+    joined = '\n'.join(aspath_strs)
+
+    # Fast path: the paths are parsed at once by NumPy and the ASNs of each
+    # path are counted from the spaces in the joined string.
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        asns = np.fromstring(joined, dtype=np.int64, sep=' ') if len(joined) > 0 else np.empty(0, dtype=np.int64)
+
+    chars = np.frombuffer(joined.encode(), dtype=np.uint8)
+    spaces = np.zeros(len(chars) + 1, dtype=np.int64)
+    np.cumsum(chars == ord(' '), out=spaces[1:])
+    ends = np.cumsum(lengths + 1) - 1
+    counts = np.where(lengths > 0, spaces[ends] - spaces[ends - lengths] + 1, 0)
+
+    # Slow path, for paths that are not made of ASNs separated by single spaces.
+    if len(chars) != len(joined) or counts.sum() != len(asns):
+        tokens = [aspath_str.split() for aspath_str in aspath_strs]
+        counts = np.array([len(t) for t in tokens], dtype=np.int64)
+        asns = np.array([asn for t in tokens for asn in t], dtype=np.int64)
+
+    offsets = np.zeros(len(aspath_strs) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    return asns, offsets
+
+
+# Number of ASNs in every path.
+def path_lengths(offsets):
+    return np.diff(offsets)
+
+
+# Index of the path of every ASN.
+def path_index(offsets):
+    return np.repeat(np.arange(len(offsets) - 1), path_lengths(offsets))
+
+
+####
+# Returns the links between consecutive ASNs of the paths: the arrays
+# (as1, as2, index of the path, position of as1 in the flat array).
+####
+
+def path_links(asns, offsets):
+    if len(asns) < 2:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty
+
+    # A position starts a link unless it is the last ASN of its path.
+    starts = np.ones(len(asns), dtype=bool)
+    starts[offsets[1:][path_lengths(offsets) > 0] - 1] = False
+    pos = np.flatnonzero(starts)
+
+    return asns[pos], asns[pos + 1], path_index(offsets)[pos], pos
+
+
+# Returns the mask of the paths that contain at least one of the links in watched (packed edge keys).
+def paths_with_links(asns, offsets, watched):
+    as1, as2, path, _ = path_links(asns, offsets)
+    matched = np.isin(pack_edges(as1, as2), watched)
+
+    mask = np.zeros(len(offsets) - 1, dtype=bool)
+    mask[path[matched]] = True
+
+    return mask
+
+
+####
+# Vectorized equivalent of cleaning.remove_asprepending on all the paths:
+# removes the private and reserved ASNs and the IXPs, then the prepending.
+####
+
+def clean_paths(asns, offsets, ixps):
+    bad = ((asns > 64496) & (asns < 131071)) | (asns > 4200000000) | np.isin(asns, ixps)
+
+    path = path_index(offsets)[~bad]
+    asns = asns[~bad]
+
+    # Remove the repeated ASNs (prepending) in each path.
+    keep = np.ones(len(asns), dtype=bool)
+    keep[1:] = (asns[1:] != asns[:-1]) | (path[1:] != path[:-1])
+
+    new_offsets = np.zeros(len(offsets), dtype=np.int64)
+    np.cumsum(np.bincount(path[keep], minlength=len(offsets) - 1), out=new_offsets[1:])
+
+    return asns[keep], new_offsets
+
+
+def watched_keys(edges):
+    if len(edges) == 0:
+        return np.empty(0, dtype=np.uint64)
+
+    as1, as2 = zip(*edges)
+
+    return np.unique(pack_edges(as1, as2))
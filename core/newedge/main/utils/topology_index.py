@@ -0,0 +1,269 @@
+import os
+import re
+import numpy as np
+from datetime import datetime, timedelta
+import click
+
+from colorama import Fore
+from colorama import Style
+
+
+####
+# Columnar index of the topology/ directory. Every day has one partition
+# topology_index/YYYY-MM/DD.npz with one row per (directed link, VP, source):
+#
+#   keys     uint64   directed link as1 << 32 | as2, rows are sorted by key
+#   vp       int32    index of the VP IP in vps, -1 for the RIB links
+#   source   uint8    SOURCE_UPDATES or SOURCE_RIBS
+#   vps      str      dictionary of the VP IPs of the day
+#
+# A partition is built from the text files of the day the first time it is
+# needed (or by the migration CLI below), and rebuilt if a text file is newer.
+####
+
+SOURCE_UPDATES = 0
+SOURCE_RIBS = 1
+SOURCE_SUFFIX = {SOURCE_UPDATES: '_updates.txt', SOURCE_RIBS: '_ribs.txt'}
+
+
+def print_prefix():
+    return Fore.CYAN+Style.BRIGHT+"[TopologyIndex]: "+Style.NORMAL
+
+
+def pack_directed(as1, as2):
+    return (np.asarray(as1, dtype=np.uint64) << np.uint64(32)) | np.asarray(as2, dtype=np.uint64)
+
+
+def unpack_directed(keys):
+    keys = np.asarray(keys, dtype=np.uint64)
+    return (keys >> np.uint64(32)).astype(np.int64), (keys & np.uint64(0xFFFFFFFF)).astype(np.int64)
+
+
+# Undirected keys (min ASN << 32 | max ASN) of directed keys.
+def undirected(keys):
+    as1, as2 = unpack_directed(keys)
+    return pack_directed(np.minimum(as1, as2), np.maximum(as1, as2))
+
+
+class DayPartition:
+    def __init__(self, keys, vp, source, vps):
+        self.keys = keys
+        self.vp = vp
+        self.source = source
+        self.vps = vps
+
+    def select(self, source=None):
+        if source is None:
+            return np.ones(len(self.keys), dtype=bool)
+        return self.source == source
+
+    # Sorted unique directed links of the day.
+    def edges(self, source=None):
+        return np.unique(self.keys[self.select(source)])
+
+    # VP IPs that saw the directed link as1 -> as2 that day.
+    def edge_vps(self, as1, as2):
+        key = pack_directed(as1, as2)
+        start = np.searchsorted(self.keys, key, side='left')
+        stop = np.searchsorted(self.keys, key, side='right')
+        vp = self.vp[start:stop]
+        return set(self.vps[vp[vp >= 0]].tolist())
+
+    # Rows (as1, as2, vp_ip) of the updates of the day.
+    def updates_rows(self):
+        sel = self.select(SOURCE_UPDATES) & (self.vp >= 0)
+        as1, as2 = unpack_directed(self.keys[sel])
+        return as1, as2, self.vps[self.vp[sel]]
+
+
+class TopologyIndex:
+    def __init__(self, db_dir: str):
+        self.db_dir = db_dir
+        self.index_dir = db_dir+'/topology_index'
+
+    def text_filename(self, date, source):
+        return self.db_dir+'/topology/'+date.strftime("%Y-%m-%d")+SOURCE_SUFFIX[source]
+
+    def partition_filename(self, date):
+        return self.index_dir+'/'+date.strftime("%Y-%m")+'/'+date.strftime("%d")+'.npz'
+
+    def is_up_to_date(self, date):
+        fname = self.partition_filename(date)
+        if not os.path.isfile(fname):
+            return False
+
+        for source in SOURCE_SUFFIX:
+            text_file = self.text_filename(date, source)
+            if os.path.isfile(text_file) and os.path.getmtime(text_file) > os.path.getmtime(fname):
+                return False
+
+        return True
+
+    ####
+    # Builds the partition of a day from its text files. Returns False if there
+    # is no text file for that day.
+    ####
+
+    def ingest(self, date):
+        all_keys = []
+        all_vps = []
+        all_sources = []
+        vp_ids = {}
+
+        for source in SOURCE_SUFFIX:
+            text_file = self.text_filename(date, source)
+            if not os.path.isfile(text_file):
+                continue
+
+            as1 = []
+            as2 = []
+            with open(text_file, 'r') as fd:
+                for line in fd:
+                    linetab = line.split()
+                    if len(linetab) < 2 or line.startswith('#'):
+                        continue
+                    as1.append(int(linetab[0]))
+                    as2.append(int(linetab[1]))
+                    if source == SOURCE_UPDATES and len(linetab) > 2:
+                        all_vps.append(vp_ids.setdefault(linetab[2], len(vp_ids)))
+                    else:
+                        all_vps.append(-1)
+
+            all_keys.append(pack_directed(as1, as2))
+            all_sources.append(np.full(len(as1), source, dtype=np.uint8))
+
+        if len(all_keys) == 0:
+            return False
+
+        keys = np.concatenate(all_keys)
+        vp = np.array(all_vps, dtype=np.int32)
+        source = np.concatenate(all_sources)
+
+        # Remove the duplicated rows and sort by key.
+        rows = np.unique(np.rec.fromarrays([keys, source, vp], names='keys,source,vp'))
+
+        vps = np.array(sorted(vp_ids, key=vp_ids.get), dtype=str)
+        if len(vps) == 0:
+            vps = np.empty(0, dtype='<U1')
+
+        fname = self.partition_filename(date)
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        fname_tmp = fname+'.{}.tmp'.format(os.getpid())
+        with open(fname_tmp, 'wb') as fd:
+            np.savez(fd, keys=rows['keys'], vp=rows['vp'], source=rows['source'], vps=vps)
+        os.replace(fname_tmp, fname)
+
+        return True
+
+    # Returns the partition of a day, or None if there is no data for that day.
+    def day(self, date):
+        if not self.is_up_to_date(date) and not self.ingest(date):
+            return None
+
+        with np.load(self.partition_filename(date)) as part:
+            return DayPartition(part['keys'], part['vp'], part['source'], part['vps'])
+
+    # Sorted unique directed links of a day (empty if no data).
+    def edges(self, date, source=None):
+        part = self.day(date)
+        if part is None:
+            return np.empty(0, dtype=np.uint64)
+        return part.edges(source)
+
+    ####
+    # Directed links seen in the window [start, end] (both included), with the
+    # number of days each link was seen.
+    ####
+
+    def edges_in_window(self, start, end, source=None):
+        all_keys = []
+        cur_date = start
+        while cur_date <= end:
+            all_keys.append(self.edges(cur_date, source))
+            cur_date += timedelta(days=1)
+
+        if len(all_keys) == 0:
+            return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+
+        return np.unique(np.concatenate(all_keys), return_counts=True)
+
+    # Days of the window [start, end] during which the directed link as1 -> as2 was seen.
+    def days_with_edge(self, as1, as2, start, end, source=None):
+        key = pack_directed(as1, as2)
+        days = []
+        cur_date = start
+        while cur_date <= end:
+            edges = self.edges(cur_date, source)
+            i = np.searchsorted(edges, key)
+            if i < len(edges) and edges[i] == key:
+                days.append(cur_date)
+            cur_date += timedelta(days=1)
+
+        return days
+
+    # VPs that saw the directed link as1 -> as2 on a given day.
+    def edge_vps(self, date, as1, as2):
+        part = self.day(date)
+        if part is None:
+            return set()
+        return part.edge_vps(as1, as2)
+
+
+####
+# Returns the sorted directed links of a topology/<date>_updates.txt or
+# topology/<date>_ribs.txt file, through the index of its database. Any other
+# file with one "as1 as2 ..." link per line is parsed directly.
+####
+
+def read_topology_file_keys(filename):
+    m = re.match(r'^(.*)/topology/+(\d{4}-\d{2}-\d{2})(_updates|_ribs)\.txt$', filename)
+    if m is not None:
+        date = datetime.strptime(m.group(2), "%Y-%m-%d")
+        source = SOURCE_UPDATES if m.group(3) == '_updates' else SOURCE_RIBS
+        return TopologyIndex(m.group(1)).edges(date, source)
+
+    as1 = []
+    as2 = []
+    with open(filename, 'r') as fd:
+        for line in fd:
+            linetab = line.split()
+            if len(linetab) < 2 or line.startswith('#'):
+                continue
+            as1.append(int(linetab[0]))
+            as2.append(int(linetab[1]))
+
+    return np.unique(pack_directed(as1, as2))
+
+
+# Migration tool, builds the index of an existing database.
+@click.command()
+@click.option('--db_dir', default="db", help='Directory where is database.', type=str)
+@click.option('--date_start', default=None, help='First day to index, in the format "YYYY-MM-DD". Default is the first day of the topology directory.', type=str)
+@click.option('--date_end', default=None, help='Last day to index (included), in the format "YYYY-MM-DD". Default is the last day of the topology directory.', type=str)
+@click.option('--override', default=False, help='Rebuild the partitions that already exist.', type=bool)
+
+def build_index(db_dir, date_start, date_end, override):
+    """ Build the columnar index of the topology directory."""
+
+    all_dates = set()
+    for f in os.listdir(db_dir+'/topology'):
+        m = re.match(r'^(\d{4}-\d{2}-\d{2})(_updates|_ribs)\.txt$', f)
+        if m is not None:
+            all_dates.add(m.group(1))
+
+    ti = TopologyIndex(db_dir)
+    nb_done = 0
+    for datestr in sorted(all_dates):
+        if (date_start is not None and datestr < date_start) or (date_end is not None and datestr > date_end):
+            continue
+
+        date = datetime.strptime(datestr, "%Y-%m-%d")
+        if override or not ti.is_up_to_date(date):
+            ti.ingest(date)
+            nb_done += 1
+            print (print_prefix()+'{}: partition built.'.format(datestr))
+
+    print (print_prefix()+'{} partitions built.'.format(nb_done))
+
+if __name__ == "__main__":
+    build_index()
@@ -2,7 +2,7 @@ from concurrent.futures import ProcessPoolExecutor
 import os
 import sys
 from datetime import datetime
-import pandas as pd
+from contextlib import contextmanager
 import click 
 from multiprocessing import Process
 
@@ -16,11 +16,21 @@ init(autoreset=True)
 from utils.country import CountryFeaturesComputation
 from utils.facility import FacilityFeaturesComputation
 from utils.ixp import IXPFeaturesComputation
-from utils.cosine import CosineDistance
+from utils.cosine import compute_link_distances
+from utils.topology_loader import load_topology
+from utils.feature_cache import NodeFeatureCache
 from time import mktime
 
+# Distance features of the links: (column, name of the nodes' features in the cache).
+DISTANCE_FEATURES = [
+    ('country_dist', 'country'),
+    ('facility_fac_dist', 'facility_fac'),
+    ('facility_country_dist', 'facility_country'),
+    ('facility_cities_dist', 'facility_cities'),
+    ('ixp_dist', 'ixp')]
+
 class Orchestrator:
-    def __init__(self, method, db_dir: str=None):
+    def __init__(self, method, db_dir: str=None, cache_size: int=7):
         self.db_dir = db_dir+'/'
         self.method = method
 
@@ -29,8 +39,6 @@ class Orchestrator:
             sys.exit(0)
         if not os.path.isdir(self.db_dir+'/features'):
             os.mkdir(self.db_dir+'/features')
-        if not os.path.isdir(self.db_dir+'/features/tmp_peeringdb'):
-            os.mkdir(self.db_dir+'/features/tmp_peeringdb')
         if not os.path.isdir(self.db_dir+'/features/positive/peeringdb_{}'.format(method)):
             os.mkdir(self.db_dir+'/features/positive/peeringdb_{}'.format(method))
         if not os.path.isdir(self.db_dir+'/features/negative/peeringdb/'):
@@ -38,60 +46,72 @@ class Orchestrator:
 
         self.country_features_obj = None
 
+        # Nodes' features, computed at most once per day.
+        self.cache = NodeFeatureCache(self.db_dir+'/features/peeringdb_cache', size=cache_size)
+
+        # Last topology loaded, shared by all the feature computations.
+        self.topo_file = None
+        self.topo = None
+
     def print_prefix(self):
         return Fore.GREEN+Style.BRIGHT+"[Orchestrator.py]: "+Style.NORMAL
 
+    # Loads the topology only once for all the feature computations.
+    def get_topology(self, topo_file):
+        if self.topo is None or self.topo_file != topo_file:
+            print (self.print_prefix()+"Loading the topology {}".format(topo_file), file=sys.stderr)
+            self.topo = load_topology(topo_file)
+            self.topo_file = topo_file
+
+        return self.topo
+
     def compute_country_feature_helper(self, topo_file, country_file, outfile_country):
-        CountryFeaturesComputation(topo_file, country_file).construct_features(outfile_country)
+        CountryFeaturesComputation(topo_file, country_file, topo=self.get_topology(topo_file)).construct_features(outfile_country)
 
     def compute_facility_features_helper(self, topo_file, facility_file, outfile_facility_fac, outfile_facility_country, outfile_facility_cities, date):
-        ffc = FacilityFeaturesComputation(topo_file, facility_file)
+        ffc = FacilityFeaturesComputation(topo_file, facility_file, topo=self.get_topology(topo_file))
         ffc.construct_features(ffc.node_to_facilities, ffc.mapping_facilities, outfile_facility_fac)
         ffc.construct_features(ffc.node_to_countries, ffc.mapping_countries, outfile_facility_country)
         ffc.construct_features(ffc.node_to_cities, ffc.mapping_cities, outfile_facility_cities)
 
     def compute_ixp_feature_helper(self, topo_file, ixp_file, outfile_ixp):
-        IXPFeaturesComputation(topo_file, ixp_file).construct_features(outfile=outfile_ixp)
+        IXPFeaturesComputation(topo_file, ixp_file, topo=self.get_topology(topo_file)).construct_features(outfile=outfile_ixp)
         
-    def compute_nodes_features(self, ts: str=None, override: bool=False):
-        date = datetime.strptime(ts, "%Y-%m-%d")
+    ####
+    # Context manager that yields the nodes' features files of a day (name ->
+    # filename) from the cache, and keeps them from being removed until it
+    # exits. They are computed again only if the cached ones are older than
+    # the input files, or if override is True.
+    ####
+
+    @contextmanager
+    def nodes_features(self, date, override: bool=False):
         topo_file = self.db_dir+'/merged_topology/'+date.strftime("%Y-%m-%d")+".txt"
         country_file = self.db_dir+'peeringdb/'+date.strftime("%Y-%m-%d")+"_country.txt"
         facility_file = self.db_dir+'peeringdb/'+date.strftime("%Y-%m-%d")+"_facility.txt"
         ixp_file = self.db_dir+'peeringdb/'+date.strftime("%Y-%m-%d")+"_ixp.txt"
 
-        plist = []
-
-        #Compute the country features.
-        outfile_country = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_country.pkl"
-        if not os.path.isfile(outfile_country) or override: 
+        def compute(files):
+            # Compute the country features.
             print (self.print_prefix()+"Computing nodes' country features for: {}".format(date), file=sys.stderr)
-            self.compute_country_feature_helper(topo_file, country_file, outfile_country)
+            self.compute_country_feature_helper(topo_file, country_file, files['country'])
 
-        # Compute the facility features.
-        outfile_facility_fac = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_facility_fac.pkl"
-        outfile_facility_country = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_facility_country.pkl"
-        outfile_facility_cities = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_facility_cities.pkl"
-
-        if (not os.path.isfile(outfile_facility_fac) or \
-            not os.path.isfile(outfile_facility_country) or \
-            not os.path.isfile(outfile_facility_cities)) or override: 
+            # Compute the facility features.
             print (self.print_prefix()+"Computing nodes' facility features for: {}".format(date), file=sys.stderr)
-            self.compute_facility_features_helper(topo_file, facility_file, outfile_facility_fac, outfile_facility_country, outfile_facility_cities, date)
+            self.compute_facility_features_helper(topo_file, facility_file, files['facility_fac'], files['facility_country'], files['facility_cities'], date)
 
-        # Compute the ixp features.
-        outfile_ixp = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_ixp.pkl"
-        if not os.path.isfile(outfile_ixp) or override: 
+            # Compute the ixp features.
             print (self.print_prefix()+"Computing nodes' ixp features for: {}".format(date), file=sys.stderr)
-            self.compute_ixp_feature_helper(topo_file, ixp_file, outfile_ixp)
+            self.compute_ixp_feature_helper(topo_file, ixp_file, files['ixp'])
+
+        with self.cache.get_or_compute(date, date, compute, [topo_file, country_file, facility_file, ixp_file], override) as files:
+            yield files
 
-        # Start the processes.
-        # for p in plist:
-        #     p.start()
+    def compute_nodes_features(self, ts: str=None, override: bool=False):
+        date = datetime.strptime(ts, "%Y-%m-%d")
 
-        # # Wait for the processes to terminate.
-        # for p in plist:
-        #     p.join()
+        with self.nodes_features(date, override):
+            pass
 
     def compute_edge_features_daily_sampling(self, ts: str=None, override: bool=False):
         date = datetime.strptime(ts, "%Y-%m-%d")
@@ -103,7 +123,6 @@ class Orchestrator:
         if os.path.isfile(outfile_positive) and os.path.isfile(outfile_negative) and not override:
             return
 
-        topo_file = self.db_dir+'/merged_topology/'+date.strftime("%Y-%m-%d")+".txt"
         sample_file_positive = self.db_dir+'/sampling/positive/sampling_{}/'.format(self.method)+date.strftime("%Y-%m-%d")+"_positive.txt"
         sample_file_negative = self.db_dir+'/sampling/negative/sampling/'+date.strftime("%Y-%m-%d")+"_negative.txt"
 
@@ -112,63 +131,15 @@ class Orchestrator:
             print (self.print_prefix()+"Sample files not available. Please do the sampling first.".format(date), file=sys.stderr)
             return 
         
-        # Parsing the sampled AS links, and creating the dataframe for positive and negative cases.
-        positive_links = []
-        self.df_positive = pd.DataFrame(columns=['as1', 'as2'])
-        with open(sample_file_positive, 'r') as fd:
-            for line in fd.readlines():
-                linetab = line.split(',')[0].split(' ')
-                if int(linetab[0]) > int(linetab[1]):
-                    as1 = linetab[1]
-                    as2 = linetab[0]
-                else:
-                    as1 = linetab[0]
-                    as2 = linetab[1]
-                positive_links.append((int(as1), int(as2)))
-                self.df_positive.loc[len(self.df_positive)] = [int(as1), int(as2)]
-
-        negative_links = []
-        self.df_negative = pd.DataFrame(columns=['as1', 'as2'])
-        with open(sample_file_negative, 'r') as fd:
-            for line in fd.readlines():
-                linetab = line.split(',')[0].split(' ')
-                if int(linetab[0]) > int(linetab[1]):
-                    as1 = linetab[1]
-                    as2 = linetab[0]
-                else:
-                    as1 = linetab[0]
-                    as2 = linetab[1]
-                negative_links.append((int(as1), int(as2)))
-                self.df_negative.loc[len(self.df_negative)] = [int(as1), int(as2)]            
-
-        # Compute cosine distance for country feature.
-        country_features = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_country.pkl"
-        cd = CosineDistance(topo_file, country_features)
-        self.df_positive = self.df_positive.merge(cd.compute_distance(positive_links), how='left').rename(columns = {'distance':'country_dist'})
-        self.df_negative = self.df_negative.merge(cd.compute_distance(negative_links), how='left').rename(columns = {'distance':'country_dist'})
-
-        # Compute cosine distance for facility features.
-        outfile_facility_fac = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_facility_fac.pkl"
-        outfile_facility_country = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_facility_country.pkl"
-        outfile_facility_cities = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_facility_cities.pkl"
-
-        cd = CosineDistance(topo_file, outfile_facility_fac)
-        self.df_positive = self.df_positive.merge(cd.compute_distance(positive_links), how='left').rename(columns = {'distance':'facility_fac_dist'})
-        self.df_negative = self.df_negative.merge(cd.compute_distance(negative_links), how='left').rename(columns = {'distance':'facility_fac_dist'})
-
-        cd = CosineDistance(topo_file, outfile_facility_country)
-        self.df_positive = self.df_positive.merge(cd.compute_distance(positive_links), how='left').rename(columns = {'distance':'facility_country_dist'})
-        self.df_negative = self.df_negative.merge(cd.compute_distance(negative_links), how='left').rename(columns = {'distance':'facility_country_dist'})
-
-        cd = CosineDistance(topo_file, outfile_facility_cities)
-        self.df_positive = self.df_positive.merge(cd.compute_distance(positive_links), how='left').rename(columns = {'distance':'facility_cities_dist'})
-        self.df_negative = self.df_negative.merge(cd.compute_distance(negative_links), how='left').rename(columns = {'distance':'facility_cities_dist'})
-
-         # Compute cosine distance for country feature.
-        ixp_features = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_ixp.pkl"
-        cd = CosineDistance(topo_file, ixp_features)
-        self.df_positive = self.df_positive.merge(cd.compute_distance(positive_links), how='left').rename(columns = {'distance':'ixp_dist'})
-        self.df_negative = self.df_negative.merge(cd.compute_distance(negative_links), how='left').rename(columns = {'distance':'ixp_dist'})
+        # Parsing the sampled AS links, for positive and negative cases.
+        positive_links = load_sample_file(sample_file_positive)
+        negative_links = load_sample_file(sample_file_negative)
+
+        # Compute the cosine distances for all the features (country, facility and ixp).
+        with self.nodes_features(date) as files:
+            features_files = [(column, files[name]) for column, name in DISTANCE_FEATURES]
+            self.df_positive = compute_link_distances(positive_links, features_files)
+            self.df_negative = compute_link_distances(negative_links, features_files)
 
         # Writing the resulting dataframe.
         self.df_positive.to_csv(outfile_positive, sep=' ', index=False)
@@ -179,36 +150,10 @@ class Orchestrator:
         date = datetime.strptime(ts, "%Y-%m-%d")
         print (self.print_prefix()+"Computing edges' features for: {}".format(date), file=sys.stderr)
 
-        df = pd.DataFrame(columns=['as1', 'as2'])
-
-        for as1, as2, in links:
-            df.loc[len(df)] = [as1, as2]
-
-        topo_file = self.db_dir+'/merged_topology/'+date.strftime("%Y-%m-%d")+".txt"
-
-        # Compute cosine distance for country feature.
-        country_features = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_country.pkl"
-        cd = CosineDistance(topo_file, country_features)
-        df = df.merge(cd.compute_distance(links), how='left').rename(columns = {'distance':'country_dist'})
-
-        # Compute cosine distance for facility features.
-        outfile_facility_fac = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_facility_fac.pkl"
-        outfile_facility_country = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_facility_country.pkl"
-        outfile_facility_cities = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_facility_cities.pkl"
-
-        cd = CosineDistance(topo_file, outfile_facility_fac)
-        df = df.merge(cd.compute_distance(links), how='left').rename(columns = {'distance':'facility_fac_dist'})
-
-        cd = CosineDistance(topo_file, outfile_facility_country)
-        df = df.merge(cd.compute_distance(links), how='left').rename(columns = {'distance':'facility_country_dist'})
-
-        cd = CosineDistance(topo_file, outfile_facility_cities)
-        df = df.merge(cd.compute_distance(links), how='left').rename(columns = {'distance':'facility_cities_dist'})
-
-        # Compute cosine distance for country feature.
-        ixp_features = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_ixp.pkl"
-        cd = CosineDistance(topo_file, ixp_features)
-        df = df.merge(cd.compute_distance(links), how='left').rename(columns = {'distance':'ixp_dist'})
+        # Compute the cosine distances for all the features (country, facility and ixp).
+        with self.nodes_features(date) as files:
+            features_files = [(column, files[name]) for column, name in DISTANCE_FEATURES]
+            df = compute_link_distances(links, features_files)
 
         # Writing the resulting dataframe in stdout.
         if outfile:
@@ -218,29 +163,24 @@ class Orchestrator:
             df.to_csv(sys.stdout, sep=' ', index=False)
 
     def clean_files(self, ts: str=None):
-        # This function removes all the temporary files (pickle files).
-        date = datetime.strptime(ts, "%Y-%m-%d")
-        print (self.print_prefix()+"Cleaning up pickle files for: {}".format(date), file=sys.stderr)
-
-        outfile_country = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_country.pkl"
-        if os.path.isfile(outfile_country):
-            os.remove(outfile_country) 
-
-        outfile_facility_fac = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_facility_fac.pkl"
-        if os.path.isfile(outfile_facility_fac):
-            os.remove(outfile_facility_fac)
-
-        outfile_facility_country = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_facility_country.pkl"
-        if os.path.isfile(outfile_facility_country):
-            os.remove(outfile_facility_country)
-
-        outfile_facility_cities = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_facility_cities.pkl"
-        if os.path.isfile(outfile_facility_cities):
-            os.remove(outfile_facility_cities)
+        # This function trims the cache of the nodes' features to the most recent days.
+        # The features of the current days are kept for the next requests.
+        print (self.print_prefix()+"Cleaning up the nodes' features cache (keeping {} days)".format(self.cache.size), file=sys.stderr)
+        self.cache.evict()
+
+# Links (as1 < as2) of a sampling file, in the order of the file.
+def load_sample_file(sample_file):
+    links = []
+    with open(sample_file, 'r') as fd:
+        for line in fd:
+            linetab = line.split(',')[0].split(' ')
+            as1 = int(linetab[0])
+            as2 = int(linetab[1])
+            if as1 > as2:
+                as1, as2 = as2, as1
+            links.append((as1, as2))
 
-        outfile_ixp = self.db_dir+'/features/tmp_peeringdb/'+date.strftime("%Y-%m-%d")+"_ixp.pkl"
-        if os.path.isfile(outfile_ixp):
-            os.remove(outfile_ixp)
+    return links
 
 def load_link_file(link_file):
     links = set()
@@ -294,14 +234,15 @@ def get_links_from_db(date):
 @click.command()
 @click.option('--date', help='Date for which to compute peeringdb features, in the following format "YYYY-MM-DD".', type=str)
 @click.option('--db_dir', default="db", help='Directory where is database.', type=str)
-@click.option('--override', default=False, help='Override the existing output files. Default is False.', type=bool)
+@click.option('--override', default=False, help='Override the existing output files (and the cached nodes\' features with --cache_only). Default is False.', type=bool)
 @click.option("--daily_sampling", default=False, help="Builds the daily sampling, in terms of positive and negative samples. Should be passed with option --date", type=bool)
 @click.option('--store_results_in_db', is_flag=True, help='If set, store the results in the PostgreSQL database.')
 @click.option("--link_list", default=None, help="List of links to test, in the form \"as1-as2,as3-as4,as5-as6\"", type=str)
 @click.option("--link_file", default=None, help="file with the links to read. Each line of the file must be on the form \"as1 as2,whatever you want\" or \"as1 as2 whatever you want\". Basically, these files corresponds to the sampling files", type=str)
 @click.option("--method", default="clusters", help="Sampling method used", type=str)
-@click.option("--clean", default=True, help="Boolean indicating whether temporary files (which are long to generate) should be cleaned up or not", type=bool)
+@click.option("--clean", default=True, help="Boolean indicating whether the cache of the nodes' features (which are long to generate) should be trimmed to the --cache_size most recent days", type=bool)
 @click.option("--cache_only", default=False, help="Boolean indicating whether only the nodes' features should be computed and stored for caching", type=bool)
+@click.option("--cache_size", default=7, help="Number of days for which the nodes' features are kept in the cache", type=int)
 @click.option("--outfile", default=None, help="File to print the results", type=str)
 
 def launch_orchestrator(
@@ -315,14 +256,17 @@ def launch_orchestrator(
     method, 
     clean, 
     cache_only, 
+    cache_size, 
     outfile):
     """Compute peeringDB features and store them in the database."""
 
     if cache_only:
-        o = Orchestrator(method, db_dir=db_dir)
-        o.compute_nodes_features(date)
+        o = Orchestrator(method, db_dir=db_dir, cache_size=cache_size)
+        o.compute_nodes_features(date, override)
+        if clean:
+            o.clean_files(date)
     elif daily_sampling:
-        o = Orchestrator(method, db_dir=db_dir)
+        o = Orchestrator(method, db_dir=db_dir, cache_size=cache_size)
 
         outfile_positive = db_dir+'/features/positive/peeringdb_{}/'.format(method)+date+"_positive.txt"
         outfile_negative = db_dir+'/features/negative/peeringdb/'+date+"_negative.txt"
@@ -331,9 +275,9 @@ def launch_orchestrator(
             print (o.print_prefix()+"Sampling for day {} already exists, skipped...".format(date), file=sys.stderr)
             return
         
-        o.compute_nodes_features(date, override)
         o.compute_edge_features_daily_sampling(date, override)
-        o.clean_files(date)
+        if clean:
+            o.clean_files(date)
     else:
         links = set()
         if store_results_in_db:
@@ -361,9 +305,7 @@ def launch_orchestrator(
             print("No links collection option provided. Please provide either --link_list or --link_file or set --store_results_in_db.", file=sys.stderr)
             exit(1)
 
-        o = Orchestrator(method, db_dir=db_dir)
-        o.compute_nodes_features(date, override)
-        print("We compute node features for date {}".format(date), file=sys.stderr)
+        o = Orchestrator(method, db_dir=db_dir, cache_size=cache_size)
         o.compute_edge_features_links(date, outfile, links=links)
         print("We Compute edge features for date {}".format(date), file=sys.stderr)
         if clean:
@@ -1,9 +1,9 @@
-import networkx as nx
+from utils.sparse_features import read_features
 import sys
 import csv
 import pandas as pd
 import numpy as np
-from scipy.spatial import distance
+from scipy import sparse
 from sklearn.feature_selection import VarianceThreshold
 
 from colorama import Fore
@@ -12,63 +12,102 @@ from colorama import init
 init(autoreset=True)
 
 class CosineDistance:
-    def __init__(self, topo_file, data_file, feature_selection_threshold=0):
-        self.topo_file = topo_file
+    def __init__(self, data_file, feature_selection_threshold=0):
         self.data_file = data_file
 
-        # Build the AS-level topology.
-        print (self.print_prefix()+'Building the topology.', file=sys.stderr)
-        self.topo = nx.Graph()
-
-        with open(topo_file, 'r') as fd:
-            for line in fd.readlines():
-                if line.startswith('#'):
-                    continue
-
-                linetab = line.rstrip('\n').split(' ')
-                as1 = int(linetab[0])
-                as2 = int(linetab[1])
-
-                self.topo.add_edge(as1, as2)
-
         print (self.print_prefix()+'Loading the features', file=sys.stderr)
-        # Load the pickle object with the features.
-        self.features = pd.read_pickle(data_file)
+        # Load the sparse features (one row per AS in self.index).
+        self.index, self.features = read_features(data_file)
         # Run the features selection.
         # By default, this will remove columns for which all the values are equal to 0. 
         sel = VarianceThreshold(feature_selection_threshold)
-        # print ("Before features selection")
-        # print (self.features)
-        self.features = pd.DataFrame(sel.fit_transform(self.features), index=self.features.index)  
-        # print ("After features selection")
-        # print (self.features)
+        self.features = sparse.csr_matrix(sel.fit_transform(self.features))
 
     def print_prefix(self):
         return Fore.MAGENTA+Style.BRIGHT+"[cosine.py]: "+Style.NORMAL
 
-    def compute_distance(self, links):
+    # Row of every AS in the features (-1 if it is not in the index).
+    def rows(self, as1s, as2s):
+        pos1 = self.index.get_indexer(as1s)
+        pos2 = self.index.get_indexer(as2s)
+
+        for i in np.flatnonzero((pos1 < 0) | (pos2 < 0)).tolist():
+            if pos1[i] < 0:
+                print (self.print_prefix()+self.print_prefix()+'AS {} not in index'.format(as1s[i]), file=sys.stderr)
+            if pos2[i] < 0:
+                print (self.print_prefix()+self.print_prefix()+'AS {} not in index'.format(as2s[i]), file=sys.stderr)
+
+        return pos1, pos2
+
+    ####
+    # Cosine distance between the rows pos1[i] and pos2[i] of the features, or
+    # -1 if one of them is missing or has no features. The distances are
+    # computed by batches of batch_size links.
+    ####
+
+    def distance_rows(self, pos1, pos2, batch_size: int=4096):
+        sums = np.asarray(self.features.sum(axis=1)).ravel()
+        sq_norms = np.asarray(self.features.multiply(self.features).sum(axis=1)).ravel()
+
+        valid = np.flatnonzero((pos1 >= 0) & (pos2 >= 0))
+        valid = valid[(sums[pos1[valid]] > 0) & (sums[pos2[valid]] > 0)]
+
+        # Same as scipy.spatial.distance.cosine, on all the rows at once.
+        distances = np.full(len(pos1), -1, dtype=np.float64)
+        for start in range(0, len(valid), batch_size):
+            rows = valid[start:start+batch_size]
+            uv = np.asarray(self.features[pos1[rows]].multiply(self.features[pos2[rows]]).sum(axis=1)).ravel()
+            distances[rows] = np.clip(1.0 - uv / np.sqrt(sq_norms[pos1[rows]] * sq_norms[pos2[rows]]), 0.0, 2.0)
+
+        return distances
+
+    # Cosine distance between the features of the two ASes of every link.
+    def compute_distance(self, links, batch_size: int=4096):
         print (self.print_prefix()+'Computing cosine distance', file=sys.stderr)
 
-        df = pd.DataFrame(columns=['as1', 'as2', 'distance'])
+        links = list(links)
+        if len(links) == 0:
+            return pd.DataFrame(columns=['as1', 'as2', 'distance'])
+
+        as1s = [as1 for as1, _ in links]
+        as2s = [as2 for _, as2 in links]
+        pos1, pos2 = self.rows(as1s, as2s)
+
+        return pd.DataFrame({'as1': as1s, 'as2': as2s, 'distance': self.distance_rows(pos1, pos2, batch_size)})
+
+
+####
+# Computes all the distance features of the links in one pass: returns a
+# dataframe with the columns as1, as2 and one column per (column, features
+# file) in features_files. The rows of the ASes are only looked up again when
+# a features file does not have the same ASes as the previous one.
+####
+
+def compute_link_distances(links, features_files, batch_size: int=4096):
+    links = list(links)
+    as1s = [as1 for as1, _ in links]
+    as2s = [as2 for _, as2 in links]
+
+    df = pd.DataFrame({'as1': pd.Series(as1s, dtype=np.int64), 'as2': pd.Series(as2s, dtype=np.int64)})
+
+    index = None
+    for column, features_file in features_files:
+        cd = CosineDistance(features_file)
+        print (cd.print_prefix()+'Computing cosine distance ({})'.format(column), file=sys.stderr)
 
-        for as1, as2 in links:
-            if as1 in self.features.index and as2 in self.features.index and self.features.loc[as1].sum() > 0 and self.features.loc[as2].sum() > 0:
-                df.loc[len(df)] = [as1, as2, distance.cosine(self.features.loc[as1], self.features.loc[as2])]
-            else:
-                if as1 not in self.features.index:
-                    print (self.print_prefix()+self.print_prefix()+'AS {} not in index'.format(as1), file=sys.stderr)
-                if as2 not in self.features.index:
-                    print (self.print_prefix()+self.print_prefix()+'AS {} not in index'.format(as2), file=sys.stderr)
+        if index is None or not cd.index.equals(index):
+            index = cd.index
+            pos1, pos2 = cd.rows(as1s, as2s)
 
-                df.loc[len(df)] = [as1, as2, -1]
+        df[column] = cd.distance_rows(pos1, pos2, batch_size)
 
-        return df
+    return df
 
 if __name__ == "__main__":
 
     # fac threshold = 0.001
 
-    cd = CosineDistance('/home/holterbach/data/merged_topo/2021-11-30:00-00-00_merged.txt', \
+    cd = CosineDistance( \
         '/home/holterbach/bgp_leaks_hijacks_detection/detection/link_prediction/tmp/peeringdb_features_country.pkl', feature_selection_threshold=0)
     # cd.sample(100, [0, 10, 50, 100, 500, 1000, 1500, 3000, 5000, 100000])
     # cd.load_sample(\
@@ -1,27 +1,16 @@
 import sys
-import networkx as nx
+from utils.topology_loader import load_topology
+from utils.sparse_features import neighborhood_features, write_features
 import csv 
-import pandas as pd
-from sklearn.preprocessing import Normalizer
 
 class CountryFeaturesComputation:
-    def __init__(self, topo_file, country_file):
+    def __init__(self, topo_file, country_file, topo=None):
         self.topo_file = topo_file
         self.country_file = country_file
 
-        # Build the AS-level topology.
-        self.topo = nx.Graph()
-
-        with open(topo_file, 'r') as fd:
-            for line in fd.readlines():
-                if line.startswith('#'):
-                    continue
-
-                linetab = line.rstrip('\n').split(' ')
-                as1 = int(linetab[0])
-                as2 = int(linetab[1])
-
-                self.topo.add_edge(as1, as2)
+        # Build the AS-level topology, unless it is given already loaded.
+        # The binary snapshot of the topology is memory-mapped when available.
+        self.topo = topo if topo is not None else load_topology(topo_file)
 
         # Build the variables pertained to the country information.
         self.header = []
@@ -77,32 +66,15 @@ class CountryFeaturesComputation:
         return fval
 
     def construct_features(self, outfile, normalized: bool=True):
-        iter_n = 0
-        cur_fval = []
-        findex = []
-
-        # Compute the country feature for every node.
-        for node in self.topo.nodes():
-            cur_fval.append(self.construct_features_node(node))
-            findex.append(node)
-
-        # Build the dataframe.
-        features = pd.DataFrame(cur_fval, \
-            columns=self.header, \
-            index=findex)
+        # Compute the features of every node at once (sparse matrix, one row per node).
+        node_to_countries = {node: (country,) for node, (country, _) in self.node_to_country.items()}
+        mapping = {country: position for position, country in enumerate(self.header)}
+        features = neighborhood_features(self.topo, node_to_countries, mapping, normalized)
 
         if outfile is not None:
-            if normalized:
-                # Normalize the data.
-                transformer = Normalizer().fit(features)  # fit does nothing.
-                tmp = transformer.transform(features)
-                features_normalized = pd.DataFrame(tmp, \
-                    columns=self.header, \
-                    index=features.index)
-
-                features_normalized.to_pickle(outfile)
-            else:
-                features.to_pickle(outfile)
+            write_features(outfile, self.topo.asns, features)
+
+        return features
 
 if __name__ == "__main__":
 
@@ -110,5 +82,5 @@ if __name__ == "__main__":
         '2022-01-01_full.txt', \
         '2022-01-01_country.txt')
 
-    cfc.construct_features(outfile="features.pkl")
+    cfc.construct_features(outfile="features.npz")
     # cfc.construct_features_node(60341)
\ No newline at end of file
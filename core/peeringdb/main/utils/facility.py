@@ -1,27 +1,16 @@
 import sys
-import networkx as nx
+from utils.topology_loader import load_topology
+from utils.sparse_features import neighborhood_features, write_features
 import csv 
-import pandas as pd
-from sklearn.preprocessing import Normalizer
 
 class FacilityFeaturesComputation:
-    def __init__(self, topo_file, facility_file):
+    def __init__(self, topo_file, facility_file, topo=None):
         self.topo_file = topo_file
         self.facility_file = facility_file
 
-        # Build the AS-level topology.
-        self.topo = nx.Graph()
-
-        with open(topo_file, 'r') as fd:
-            for line in fd.readlines():
-                if line.startswith('#'):
-                    continue
-
-                linetab = line.rstrip('\n').split(' ')
-                as1 = int(linetab[0])
-                as2 = int(linetab[1])
-
-                self.topo.add_edge(as1, as2)
+        # Build the AS-level topology, unless it is given already loaded.
+        # The binary snapshot of the topology is memory-mapped when available.
+        self.topo = topo if topo is not None else load_topology(topo_file)
 
         self.node_to_facilities = {}
         self.node_to_cities = {}
@@ -110,31 +99,13 @@ class FacilityFeaturesComputation:
         return fval
 
     def construct_features(self, features_node, features_mapping, outfile, normalized: bool=True):
-        iter_n = 0
-        cur_fval = []
-        findex = []
-
-        # Compute the country feature for every node.
-        for node in self.topo.nodes():
-            cur_fval.append(self.construct_features_node(node, features_node, features_mapping))
-            findex.append(node)
-           
-        features = pd.DataFrame(cur_fval, \
-            columns=list(range(0, len(features_mapping))), \
-            index=findex)
+        # Compute the features of every node at once (sparse matrix, one row per node).
+        features = neighborhood_features(self.topo, features_node, features_mapping, normalized)
 
         if outfile is not None:
-            if normalized:
-                # Normalize the data.
-                transformer = Normalizer().fit(features)  # fit does nothing.
-                tmp = transformer.transform(features)
-                features_normalized = pd.DataFrame(tmp, \
-                    columns=list(range(0, len(features_mapping))), \
-                    index=features.index)
-
-                features_normalized.to_pickle(outfile)
-            else:
-                features.to_pickle(outfile)
+            write_features(outfile, self.topo.asns, features)
+
+        return features
             
 
 if __name__ == "__main__":
@@ -143,9 +114,9 @@ if __name__ == "__main__":
         '2022-01-01_full.txt', \
         '2022-01-01_facility.txt')
 
-    cfc.construct_features(cfc.node_to_facilities, cfc.mapping_facilities, outfile="features_facility.pkl")
-    cfc.construct_features(cfc.node_to_cities, cfc.mapping_cities, outfile="features_facility_cities.pkl")
-    cfc.construct_features(cfc.node_to_countries, cfc.mapping_countries, outfile="features_facility_countries.pkl")
+    cfc.construct_features(cfc.node_to_facilities, cfc.mapping_facilities, outfile="features_facility.npz")
+    cfc.construct_features(cfc.node_to_cities, cfc.mapping_cities, outfile="features_facility_cities.npz")
+    cfc.construct_features(cfc.node_to_countries, cfc.mapping_countries, outfile="features_facility_countries.npz")
     # cfc.construct_features_node(1782)
     # print (cfc.features)
 
@@ -0,0 +1,185 @@
+import os
+import re
+import sys
+import time
+import fcntl
+import shutil
+import socket
+from contextlib import contextmanager
+
+from colorama import Fore
+from colorama import Style
+
+
+####
+# Cache of the nodes' PeeringDB features, shared by the daily sampling, the
+# broker and the live inference. Every entry is keyed by the date of the
+# topology and the date of the PeeringDB snapshot it is computed from, and
+# every computation of an entry is a new version of it:
+#
+#   <cache_dir>/<topology date>_<peeringdb date>/<version>/<name>.npz
+#
+# A version is computed in a temporary directory and renamed once complete,
+# and it is never modified afterwards. Readers pin the version they use with
+# a reference file refs/<key>/<host>_<pid> holding the version name, so the
+# versions in use are never removed: an older version is pruned once it is no
+# longer referenced, and only the size most recent entries are kept.
+#
+# The references, the publication of the versions and the removals are done
+# under a lock on the cache directory (the computation is not).
+####
+
+FEATURE_NAMES = ['country', 'facility_fac', 'facility_country', 'facility_cities', 'ixp']
+
+# References older than this (in seconds) are from dead processes.
+REF_TIMEOUT = 6 * 3600
+
+def print_prefix():
+    return Fore.CYAN+Style.BRIGHT+"[NodeFeatureCache]: "+Style.NORMAL
+
+
+class NodeFeatureCache:
+    def __init__(self, cache_dir: str, size: int=7):
+        self.cache_dir = cache_dir
+        self.refs_dir = cache_dir+'/refs'
+        self.size = size
+
+        os.makedirs(self.refs_dir, exist_ok=True)
+
+    def key(self, topo_date, peeringdb_date):
+        return '{}_{}'.format(topo_date.strftime("%Y-%m-%d"), peeringdb_date.strftime("%Y-%m-%d"))
+
+    @contextmanager
+    def lock(self):
+        with open(self.cache_dir+'/.lock', 'a') as fd:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    # Versions of an entry, oldest first.
+    def versions(self, key):
+        entry_dir = self.cache_dir+'/'+key
+        if not os.path.isdir(entry_dir):
+            return []
+
+        return sorted(f for f in os.listdir(entry_dir) if not f.startswith('.') and os.path.isdir(entry_dir+'/'+f))
+
+    # Features files of a version, name -> filename.
+    def files(self, key, version):
+        return {name: '{}/{}/{}/{}.npz'.format(self.cache_dir, key, version, name) for name in FEATURE_NAMES}
+
+    # True if the version is not older than any of the source files.
+    def is_up_to_date(self, key, version, source_files=()):
+        version_time = os.path.getmtime('{}/{}/{}'.format(self.cache_dir, key, version))
+        return all(os.path.getmtime(fn) <= version_time for fn in source_files if os.path.isfile(fn))
+
+    def ref_file(self, key):
+        return '{}/{}/{}_{}'.format(self.refs_dir, key, socket.gethostname(), os.getpid())
+
+    # Pins a version of an entry for this process (lock held).
+    def add_ref(self, key, version):
+        os.makedirs(self.refs_dir+'/'+key, exist_ok=True)
+        with open(self.ref_file(key), 'w') as fd:
+            fd.write(version)
+
+    # Versions of an entry referenced by live processes (lock held).
+    def referenced_versions(self, key):
+        ref_dir = self.refs_dir+'/'+key
+        if not os.path.isdir(ref_dir):
+            return set()
+
+        now = time.time()
+        versions = set()
+        for f in os.listdir(ref_dir):
+            fn = ref_dir+'/'+f
+            if now - os.path.getmtime(fn) <= REF_TIMEOUT:
+                with open(fn, 'r') as fd:
+                    versions.add(fd.read())
+            else:
+                os.remove(fn)
+
+        return versions
+
+    # Removes the versions of an entry but the latest one, except the versions in use (lock held).
+    def prune(self, key):
+        referenced = self.referenced_versions(key)
+        for version in self.versions(key)[:-1]:
+            if version not in referenced:
+                shutil.rmtree('{}/{}/{}'.format(self.cache_dir, key, version), ignore_errors=True)
+
+    # Computes a new version of an entry: compute(files) must write every features file of files.
+    def store(self, key, compute):
+        tmp_dir = '{}/.tmp_{}_{}_{}'.format(self.cache_dir, key, socket.gethostname(), os.getpid())
+        version = '{:020d}_{}_{}'.format(time.time_ns(), socket.gethostname(), os.getpid())
+
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        try:
+            compute({name: '{}/{}.npz'.format(tmp_dir, name) for name in FEATURE_NAMES})
+
+            with self.lock():
+                os.makedirs(self.cache_dir+'/'+key, exist_ok=True)
+                os.rename(tmp_dir, '{}/{}/{}'.format(self.cache_dir, key, version))
+                self.add_ref(key, version)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        return version
+
+    ####
+    # Context manager that yields the features files (name -> filename) of an
+    # entry, and holds a reference on them until it exits. The latest version
+    # is used if it is not older than the source files (and override is
+    # False), otherwise a new version is computed with compute(files).
+    ####
+
+    @contextmanager
+    def get_or_compute(self, topo_date, peeringdb_date, compute, source_files=(), override: bool=False):
+        key = self.key(topo_date, peeringdb_date)
+
+        version = None
+        with self.lock():
+            versions = self.versions(key)
+            if len(versions) > 0 and not override and self.is_up_to_date(key, versions[-1], source_files):
+                version = versions[-1]
+                self.add_ref(key, version)
+
+        if version is None:
+            version = self.store(key, compute)
+        else:
+            print (print_prefix()+'Nodes\' features {} found in the cache.'.format(key), file=sys.stderr)
+
+        try:
+            yield self.files(key, version)
+        finally:
+            with self.lock():
+                if os.path.isfile(self.ref_file(key)):
+                    os.remove(self.ref_file(key))
+                self.prune(key)
+
+    ####
+    # Removes all the entries but the size most recent ones (by topology date,
+    # then PeeringDB date), except the entries in use. The temporary
+    # directories left by dead processes are removed as well.
+    ####
+
+    def evict(self):
+        with self.lock():
+            now = time.time()
+            keys = []
+            for f in os.listdir(self.cache_dir):
+                fn = self.cache_dir+'/'+f
+                if re.match(r'^\d{4}-\d{2}-\d{2}_\d{4}-\d{2}-\d{2}$', f):
+                    keys.append(f)
+                elif f.startswith('.tmp_') and now - os.path.getmtime(fn) > REF_TIMEOUT:
+                    shutil.rmtree(fn, ignore_errors=True)
+
+            for key in sorted(keys, reverse=True)[self.size:]:
+                if len(self.referenced_versions(key)) > 0:
+                    continue
+
+                print (print_prefix()+'Evicting {}'.format(key), file=sys.stderr)
+                shutil.rmtree(self.cache_dir+'/'+key, ignore_errors=True)
+                shutil.rmtree(self.refs_dir+'/'+key, ignore_errors=True)
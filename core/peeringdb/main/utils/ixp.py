@@ -1,27 +1,16 @@
 import sys
-import networkx as nx
+from utils.topology_loader import load_topology
+from utils.sparse_features import neighborhood_features, write_features
 import csv 
-import pandas as pd
-from sklearn.preprocessing import Normalizer
 
 class IXPFeaturesComputation:
-    def __init__(self, topo_file, ixp_file):
+    def __init__(self, topo_file, ixp_file, topo=None):
         self.topo_file = topo_file
         self.ixp_file = ixp_file
 
-        # Build the AS-level topology.
-        self.topo = nx.Graph()
-
-        with open(topo_file, 'r') as fd:
-            for line in fd.readlines():
-                if line.startswith('#'):
-                    continue
-
-                linetab = line.rstrip('\n').split(' ')
-                as1 = int(linetab[0])
-                as2 = int(linetab[1])
-
-                self.topo.add_edge(as1, as2)
+        # Build the AS-level topology, unless it is given already loaded.
+        # The binary snapshot of the topology is memory-mapped when available.
+        self.topo = topo if topo is not None else load_topology(topo_file)
 
         self.node_to_ixp = {}
         self.mapping_ixp = {}
@@ -91,32 +80,13 @@ class IXPFeaturesComputation:
         return fval
 
     def construct_features(self, outfile, normalized: bool=True):
-        iter_n = 0
-        cur_fval = []
-        findex = []
-
-        # Compute the country feature for every node.
-        for node in self.topo.nodes():
-            cur_fval.append(self.construct_features_node_neighborhood(node))
-            findex.append(node)
-      
-        # Build the dataframe.
-        features = pd.DataFrame(cur_fval, \
-            columns=list(range(0, len(self.mapping_ixp))), \
-            index=findex)
+        # Compute the features of every node at once (sparse matrix, one row per node).
+        features = neighborhood_features(self.topo, self.node_to_ixp, self.mapping_ixp, normalized)
 
         if outfile is not None:
-            if normalized:
-                # Normalize the data.
-                transformer = Normalizer().fit(features)  # fit does nothing.
-                tmp = transformer.transform(features)
-                features_normalized = pd.DataFrame(tmp, \
-                    columns=list(range(0, len(self.mapping_ixp))), \
-                    index=features.index)
-
-                features_normalized.to_pickle(outfile)
-            else:
-                features.to_pickle(outfile)
+            write_features(outfile, self.topo.asns, features)
+
+        return features
 
 if __name__ == "__main__":
 
@@ -124,7 +94,7 @@ if __name__ == "__main__":
         '/home/holterbach/data/merged_topo/2021-11-30:00-00-00_merged.txt', \
         '/home/holterbach/data/peeringdb/as_ixp_caida.txt')
 
-    cfc.construct_features(outfile="features_ixp.pkl")
+    cfc.construct_features(outfile="features_ixp.npz")
     # cfc.construct_features_node(1782)
     # print (cfc.features)
 
@@ -0,0 +1,84 @@
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+####
+# Sparse node features. The feature vector of a node counts the attributes
+# (facilities, IXPs, countries, ...) of its neighbors, so the features of all
+# the nodes are the product of the adjacency matrix of the topology with the
+# node -> attribute incidence matrix. Both matrices are very sparse, and so is
+# the result.
+#
+# The features are stored in an .npz file holding the ASN of every row
+# (index) and the CSR arrays of the matrix (data, indices, indptr, shape).
+####
+
+# Adjacency matrix of the topology, rows and columns in the order of topo.asns.
+def adjacency_matrix(topo):
+    n = len(topo.asns)
+    indices = np.asarray(topo.indices, dtype=np.int32)
+
+    return sparse.csr_matrix((np.ones(len(indices), dtype=np.float64), indices, np.asarray(topo.indptr)), shape=(n, n))
+
+
+####
+# Incidence matrix of the attributes of the nodes: entry (i, mapping[attr])
+# is 1 if attr is in node_to_attrs[asns[i]].
+####
+
+def incidence_matrix(asns, node_to_attrs, mapping):
+    rows = []
+    cols = []
+    for i, asn in enumerate(asns.tolist()):
+        for attr in node_to_attrs.get(asn, ()):
+            rows.append(i)
+            cols.append(mapping[attr])
+
+    return sparse.csr_matrix((np.ones(len(rows), dtype=np.float64), (rows, cols)), shape=(len(asns), len(mapping)))
+
+
+# Same as sklearn's Normalizer (L2 norm): every non-empty row is scaled to unit norm.
+def l2_normalize(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+
+    return sparse.diags(1.0 / norms).dot(matrix).tocsr()
+
+
+# Features of all the nodes of the topology.
+def neighborhood_features(topo, node_to_attrs, mapping, normalized: bool=True):
+    features = adjacency_matrix(topo).dot(incidence_matrix(topo.asns, node_to_attrs, mapping)).tocsr()
+    features.sort_indices()
+
+    return l2_normalize(features) if normalized else features
+
+
+####
+# Writes the features in outfile, under a temporary name first.
+####
+
+def write_features(outfile, index, matrix):
+    matrix = sparse.csr_matrix(matrix)
+
+    outfile_tmp = '{}.{}.tmp'.format(outfile, os.getpid())
+    with open(outfile_tmp, 'wb') as fd:
+        np.savez(fd, index=np.asarray(index, dtype=np.int64), data=matrix.data, \
+            indices=matrix.indices, indptr=matrix.indptr, shape=np.array(matrix.shape))
+    os.replace(outfile_tmp, outfile)
+
+
+####
+# Returns (index, matrix) from a features file. The legacy pickle files
+# (dense DataFrames indexed by ASN) are also accepted.
+####
+
+def read_features(infile):
+    if infile.endswith('.pkl'):
+        df = pd.read_pickle(infile)
+        return pd.Index(df.index.astype(np.int64)), sparse.csr_matrix(df.to_numpy(dtype=np.float64))
+
+    with np.load(infile) as f:
+        matrix = sparse.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+        return pd.Index(f['index']), matrix
@@ -0,0 +1,198 @@
+import numpy as np
+import os
+
+
+####
+# Binary format of the merged topologies. The file merged_topology/<date>.bin
+# is written by the merger next to merged_topology/<date>.txt and holds the
+# same undirected topology in CSR format:
+#
+#   header   8 bytes magic, uint64 number of nodes n, uint64 number of entries nnz
+#   nodes    int64[n]     ASNs, sorted
+#   indptr   int64[n+1]   neighbors of nodes[i] are indices[indptr[i]:indptr[i+1]]
+#   indices  int32[nnz]   index of the neighbors (sorted), each link appears twice
+#
+# All the sections are aligned, so that they can be memory-mapped directly.
+####
+
+MAGIC = b"DFOHTOP1"
+HEADER_SIZE = len(MAGIC) + 16
+
+
+def binary_topology_file(fn):
+    return "{}.bin".format(fn[:-4] if fn.endswith(".txt") else fn)
+
+
+####
+# Builds the CSR arrays (nodes, indptr, indices) of the undirected graph with
+# the links src[i]-dst[i]. Self-loops and duplicated links are removed.
+####
+
+def build_csr(src, dst):
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+
+    # Remove the self-loops and the duplicated links
+    as1 = np.minimum(src, dst)
+    as2 = np.maximum(src, dst)
+    keep = as1 != as2
+    keys = np.unique((as1[keep].astype(np.uint64) << np.uint64(32)) | as2[keep].astype(np.uint64))
+    as1 = (keys >> np.uint64(32)).astype(np.int64)
+    as2 = (keys & np.uint64(0xFFFFFFFF)).astype(np.int64)
+
+    # Relabel the ASes with integers
+    nodes = np.unique(np.concatenate((as1, as2)))
+    i1 = np.searchsorted(nodes, as1)
+    i2 = np.searchsorted(nodes, as2)
+
+    # Both directions of every link, sorted by row then by column
+    rows = np.concatenate((i1, i2))
+    cols = np.concatenate((i2, i1))
+    order = np.lexsort((cols, rows))
+
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(nodes)), out=indptr[1:])
+
+    return nodes, indptr, cols[order].astype(np.int32)
+
+
+####
+# Writes the topology with the links src[i]-dst[i] in binary format. The file
+# is written under a temporary name first, so readers never see a partial file.
+####
+
+def write_binary_topology(fn_bin, src, dst):
+    nodes, indptr, indices = build_csr(src, dst)
+
+    fn_tmp = "{}.{}.tmp".format(fn_bin, os.getpid())
+    with open(fn_tmp, "wb") as fd:
+        fd.write(MAGIC)
+        fd.write(np.array([len(nodes), len(indices)], dtype="<u8").tobytes())
+        fd.write(nodes.astype("<i8").tobytes())
+        fd.write(indptr.astype("<i8").tobytes())
+        fd.write(indices.astype("<i4").tobytes())
+    os.replace(fn_tmp, fn_bin)
+
+
+def map_section(fn_bin, dtype, offset, count):
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+
+    return np.memmap(fn_bin, dtype=dtype, mode="r", offset=offset, shape=(count,))
+
+
+####
+# Read-only undirected topology in CSR format, with the subset of the
+# Networkx API used by the modules. Nodes are integer ASNs.
+####
+
+class Topology:
+    def __init__(self, nodes, indptr, indices):
+        self.asns = nodes           # Sorted ASNs
+        self.indptr = indptr        # Row pointers
+        self.indices = indices      # Neighbor indices
+
+    def find(self, asn):
+        i = int(np.searchsorted(self.asns, asn))
+        if i < len(self.asns) and self.asns[i] == asn:
+            return i
+
+        return None
+
+    def __contains__(self, asn):
+        return self.has_node(asn)
+
+    def __len__(self):
+        return len(self.asns)
+
+    def has_node(self, asn):
+        return self.find(int(asn)) is not None
+
+    def nodes(self):
+        return self.asns.tolist()
+
+    def number_of_nodes(self):
+        return len(self.asns)
+
+    def number_of_edges(self):
+        return len(self.indices) // 2
+
+    def neighbors(self, asn):
+        i = self.find(int(asn))
+        if i is None:
+            raise KeyError(asn)
+
+        return self.asns[self.indices[self.indptr[i]:self.indptr[i+1]]].tolist()
+
+    def degree(self, asn):
+        i = self.find(int(asn))
+        if i is None:
+            raise KeyError(asn)
+
+        return int(self.indptr[i+1] - self.indptr[i])
+
+    # Degree of every node, as a dictionary ASN -> degree
+    def degrees(self):
+        return dict(zip(self.asns.tolist(), np.diff(self.indptr).tolist()))
+
+    # Arrays (as1, as2) of all the links, with as1 < as2
+    def edge_arrays(self):
+        rows = np.repeat(np.arange(len(self.asns)), np.diff(self.indptr))
+        forward = self.indices > rows
+        return self.asns[rows[forward]], self.asns[self.indices[forward]]
+
+    def edges(self):
+        as1, as2 = self.edge_arrays()
+        return zip(as1.tolist(), as2.tolist())
+
+
+def load_binary_topology(fn_bin):
+    with open(fn_bin, "rb") as fd:
+        header = fd.read(HEADER_SIZE)
+    if len(header) != HEADER_SIZE or header[:len(MAGIC)] != MAGIC:
+        raise ValueError("{} is not a binary topology file".format(fn_bin))
+
+    n, nnz = np.frombuffer(header[len(MAGIC):], dtype="<u8").tolist()
+
+    offset = HEADER_SIZE
+    nodes = map_section(fn_bin, "<i8", offset, n)
+    offset += 8 * n
+    indptr = map_section(fn_bin, "<i8", offset, n + 1)
+    offset += 8 * (n + 1)
+    indices = map_section(fn_bin, "<i4", offset, nnz)
+
+    return Topology(nodes, indptr, indices)
+
+
+def load_text_topology(fn):
+    src = []
+    dst = []
+    with open(fn, "r") as fd:
+        for line in fd:
+            if line.startswith("#"):
+                continue
+            linetab = line.split()
+            if len(linetab) < 2:
+                continue
+            src.append(int(linetab[0]))
+            dst.append(int(linetab[1]))
+
+    return Topology(*build_csr(src, dst))
+
+
+####
+# Loads the topology in fn (a merged_topology/<date>.txt file). The binary
+# snapshot is memory-mapped if it exists and is not older than the text file,
+# otherwise the text file is parsed.
+####
+
+def load_topology(fn):
+    fn_bin = binary_topology_file(fn)
+
+    if os.path.isfile(fn_bin) and (not os.path.isfile(fn) or os.path.getmtime(fn_bin) >= os.path.getmtime(fn)):
+        try:
+            return load_binary_topology(fn_bin)
+        except (ValueError, OSError):
+            pass
+
+    return load_text_topology(fn)
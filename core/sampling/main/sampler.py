@@ -84,7 +84,7 @@ class Sampling:
 
     
     def build_negative_sampling(self, size):
-        fn_aspaths = "{}/paths/{}-{}-01_paths.txt".format(self.db_dir, self.date.split("-")[0], self.date.split("-")[1])
+        fn_aspaths = ut.aspaths_file(self.db_dir, self.date)
         fn_sampling = "{}/sampling/negative/sampling/{}_negative.txt".format(self.db_dir, self.date)
 
         if os.path.exists(fn_sampling) and not self.overide:
@@ -107,7 +107,7 @@ class Sampling:
 
     
     def build_positive_sampling(self, size, thresholds):
-        fn_aspaths = "{}/paths/{}-{}-01_paths.txt".format(self.db_dir, self.date.split("-")[0], self.date.split("-")[1])
+        fn_aspaths = ut.aspaths_file(self.db_dir, self.date)
         fn_sampling = "{}/sampling/positive/sampling_{}/{}_positive.txt".format(self.db_dir, self.method, self.date)
 
         if os.path.exists(fn_sampling) and not self.overide:
@@ -138,7 +138,7 @@ class Sampling:
 
     
     def build_negative_sampling_aspath(self, size):
-        fn_aspaths = "{}/paths/{}-{}-01_paths.txt".format(self.db_dir, self.date.split("-")[0], self.date.split("-")[1])
+        fn_aspaths = ut.aspaths_file(self.db_dir, self.date)
         fn_sampling = "{}/sampling/negative/sampling_aspath/{}_negative.txt".format(self.db_dir, self.date)
 
         if os.path.exists(fn_sampling) and not self.overide:
@@ -161,7 +161,7 @@ class Sampling:
 
     
     def build_positive_sampling_aspath(self, size, thresholds):
-        fn_aspaths = "{}/paths/{}-{}-01_paths.txt".format(self.db_dir, self.date.split("-")[0], self.date.split("-")[1])
+        fn_aspaths = ut.aspaths_file(self.db_dir, self.date)
         fn_sampling = "{}/sampling/positive/sampling_aspath_{}/{}_positive.txt".format(self.db_dir, self.method, self.date)
 
         if os.path.exists(fn_sampling) and not self.overide:
@@ -26,7 +26,7 @@ def load_existing_as_paths_positive_sampling(infile):
         exit(1)
     
     all_paths = dict()
-    with open(infile, "r") as f:
+    with ut.open_text(infile) as f:
         for line in f:
             asp = line.replace("\n", "")
 
@@ -59,7 +59,7 @@ def load_existing_as_paths_negative_sampling(infile):
 
     all_paths = dict()
 
-    with open(infile, "r") as f:
+    with ut.open_text(infile) as f:
         for line in f:
 
             asp = line.replace("\n", "")
@@ -100,7 +100,7 @@ def load_possible_as_paths_negative_sampling(infile):
 
     all_paths = dict()
 
-    with open(infile, "r") as f:
+    with ut.open_text(infile) as f:
         for line in f:
 
             asp = line.replace("\n", "")
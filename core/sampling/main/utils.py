@@ -4,10 +4,12 @@ import networkx as nx
 from colorama import Fore, Style
 import os
 import sys
+import gzip
 from datetime import datetime
 from sklearn.cluster import KMeans
 import pandas as pd
 from datetime import datetime, timedelta
+from topology_loader import binary_topology_file, load_topology
 
 
 def aspath_to_list(path):
@@ -95,6 +97,13 @@ def parse_topo_file_line(line):
 
 def load_topo_file(fn):
     G = nx.Graph()
+
+    # Build the graph from the binary snapshot of the merged topology if there is one
+    if os.path.isfile(binary_topology_file(fn)):
+        topo = load_topology(fn)
+        G.add_edges_from((str(as1), str(as2)) for as1, as2 in topo.edges())
+        return G
+
     with open(fn, "r") as f:
         for line in f:
             as1, as2 = parse_topo_file_line(line)
@@ -132,6 +141,22 @@ def create_directory(dir):
     if not os.path.isdir(dir):
         os.mkdir(dir)
 
+# File with the AS paths of the RIBs of the month of date (datestr). The paths
+# are now stored gzip-compressed, the plain text files are still accepted.
+def aspaths_file(db_dir, datestr):
+    fn = "{}/paths/{}-{}-01_paths.txt".format(db_dir, datestr.split("-")[0], datestr.split("-")[1])
+    if not os.path.isfile(fn) and os.path.isfile(fn+".gz"):
+        return fn+".gz"
+
+    return fn
+
+# Opens a text file, gzip-compressed or not.
+def open_text(fn):
+    if fn.endswith(".gz"):
+        return gzip.open(fn, "rt")
+
+    return open(fn, "r")
+
 
 tier_one = ["174", "209", "286", "701", "1239", "1299", "2828", "2914", "3257", "3320", "3356", "3491", "5511", "6453", "6461", "6762", "6830", "7018", "12956", "6939", "1273", "9002", "4637", "7473"]
 
@@ -155,23 +180,17 @@ def get_all_cone_sizes(date, db_dir):
 
 def get_all_degrees(date, db_dir):
     fn = "{}/merged_topology/{}.txt".format(db_dir, date)
-    G = nx.Graph()
 
-    if os.path.exists(fn):
-        with open(fn, "r") as f:
-            for line in f:
-                as1 = line.strip("\n").split(" ")[0]
-                as2 = line.strip("\n").split(" ")[1]
+    degrees = dict()
 
-                G.add_edge(as1, as2)
+    if os.path.exists(fn) or os.path.exists(binary_topology_file(fn)):
+        topo = load_topology(fn)
+        for node, degree in topo.degrees().items():
+            degrees[str(node)] = degree
 
     else:
         print("Unable to find file {}".format(fn))
 
-    degrees = dict()
-    for node in G.nodes:
-        degrees[node] = G.degree[node]
-
     return degrees
 
 def merge_degree_cones(degrees :dict, cones :dict, topo, topo_irr):
@@ -1,8 +1,11 @@
 import networkx as nx
+import numpy as np
 from time import time
+from math import log
 from colorama import Fore, Style
 import sys
 from datetime import datetime
+from csr_graph import CSRGraph
 
 
 res_zero = {"closeness_centrality_as1": 0, \
@@ -118,6 +121,9 @@ def compute_simrank_similarity(G :nx.Graph, as1, as2):
 def compute_harmonic_closeness_centrality_eccentricity_aux(G: nx.Graph, focus):
     dists = nx.shortest_path_length(G, source=focus, weight=None)
 
+    return harmonic_closeness_eccentricity_from_dists(dists, len(G))
+
+def harmonic_closeness_eccentricity_from_dists(dists, nb_nodes):
     # Conputation of the harmonic centrality.
     harm = 0
     for d in dists.values():
@@ -127,9 +133,9 @@ def compute_harmonic_closeness_centrality_eccentricity_aux(G: nx.Graph, focus):
 
     # computation of the closeness centrality
     totsp = sum(dists.values())
-    if totsp > 0.0 and len(G) > 1:
+    if totsp > 0.0 and nb_nodes > 1:
         clos = (len(dists)-1.0) / totsp
-        s = (len(dists)-1.0) / ( len(G) - 1 )
+        s = (len(dists)-1.0) / ( nb_nodes - 1 )
         clos *= s
     else:
         clos = 0.0
@@ -175,7 +181,7 @@ base_func_link = {
 ####
 # This function computes all the graph features, but exculde some of these features
 # 
-# @param G              Networkx undirected graph
+# @param G              Networkx undirected graph or CSRGraph
 # @param as1            First focus AS
 # @param as2            Second focus AS
 # @param feat_exclude   Features to exclude during the computation
@@ -183,6 +189,10 @@ base_func_link = {
 
 def compute_all_features(G :nx.Graph, as1, as2, feat_exclude=["pagerank", "eigenvector_centrality", "square_clustering", "number_of_cliques", "simrank_similarity"]):
 
+    # A CSRGraph cannot be modified, the features are computed on the graph as it is
+    if isinstance(G, CSRGraph):
+        return compute_all_features_overlay(G, as1, as2, G.has_edge(as1, as2), feat_exclude)
+
     results = dict()
 
     # Switch for convention
@@ -237,7 +247,651 @@ def compute_all_features(G :nx.Graph, as1, as2, feat_exclude=["pagerank", "eigen
         stop = time() - start
         prefix("compute_harmonic_closeness_centrality for link {}-{} took {:.4f} s".format(as1, as2, stop))
 
-    
+
+    return results
+
+
+
+##############################################################
+## Copy-free computation of the features with and without ####
+## a link. Instead of copying the whole topology for every ####
+## link, the features are computed on a read-only overlay ####
+## of the shared graph in which only the presence of the  ####
+## link (as1, as2) is toggled.                            ####
+##############################################################
+
+class EdgeOverlay:
+    def __init__(self, G :nx.Graph, as1, as2, with_edge):
+        self.G = G                      # Shared topology, never modified
+        self.as1 = as1                  # First end of the toggled link
+        self.as2 = as2                  # Second end of the toggled link
+        self.with_edge = with_edge      # Whether the link is in the overlay
+        self.dists = dict()             # Cache of the shortest path lengths
+
+        # The ends of the link that are not in G only appear with the link.
+        self.nb_nodes = len(G)
+        if with_edge:
+            self.nb_nodes += int(as1 not in G) + int(as2 not in G)
+
+    def number_of_nodes(self):
+        return self.nb_nodes
+
+    def neighbors(self, node):
+        if node == self.as1:
+            other = self.as2
+        elif node == self.as2:
+            other = self.as1
+        else:
+            return self.G._adj[node]
+
+        nghs = [w for w in self.G._adj[node] if w != other] if node in self.G else []
+        if self.with_edge:
+            nghs.append(other)
+
+        return nghs
+
+    def degree(self, node):
+        if node == self.as1 or node == self.as2:
+            return len(self.neighbors(node))
+
+        return self.G.degree(node)
+
+    # Breadth-first search from source, the result is cached as it is shared
+    # by the shortest path and the harmonic/closeness/eccentricity features.
+    def shortest_path_length(self, source):
+        if source in self.dists:
+            return self.dists[source]
+
+        seen = {source: 0}
+        level = 0
+        nextlevel = [source]
+
+        while nextlevel:
+            level += 1
+            thislevel = nextlevel
+            nextlevel = []
+            for v in thislevel:
+                for w in self.neighbors(v):
+                    if w not in seen:
+                        seen[w] = level
+                        nextlevel.append(w)
+
+        self.dists[source] = seen
+
+        return seen
+
+def common_neighbors_overlay(O :EdgeOverlay, as1, as2):
+    nghs_as2 = set(O.neighbors(as2))
+
+    return [w for w in O.neighbors(as1) if w in nghs_as2 and w not in (as1, as2)]
+
+def compute_degree_centrality_overlay(O :EdgeOverlay, as1, as2):
+    s = 1.0 / (O.number_of_nodes() - 1.0)
+
+    return O.degree(as1) * s, O.degree(as2) * s
+
+def compute_average_neighbor_degree_overlay(O :EdgeOverlay, as1, as2):
+    res = []
+    for node in [as1, as2]:
+        deg = O.degree(node)
+        if deg == 0:
+            deg = 1
+        res.append(sum(O.degree(w) for w in O.neighbors(node)) / float(deg))
+
+    return res[0], res[1]
+
+# Returns the number of triangles and the degree (self-loops excluded) of node,
+# as done by networkx in nx.triangles and nx.clustering.
+def triangles_and_degree_overlay(O :EdgeOverlay, node):
+    vs = set(O.neighbors(node)) - {node}
+    ntriangles = sum(len(vs & (set(O.neighbors(w)) - {w})) for w in vs)
+
+    return ntriangles, len(vs)
+
+def compute_triangles_overlay(O :EdgeOverlay, as1, as2):
+    t_as1, _ = triangles_and_degree_overlay(O, as1)
+    t_as2, _ = triangles_and_degree_overlay(O, as2)
+
+    return t_as1 // 2, t_as2 // 2
+
+def compute_clustering_overlay(O :EdgeOverlay, as1, as2):
+    res = []
+    for node in [as1, as2]:
+        t, d = triangles_and_degree_overlay(O, node)
+        res.append(0 if t == 0 else t / (d * (d - 1)))
+
+    return res[0], res[1]
+
+def compute_shortest_path_overlay(O :EdgeOverlay, as1, as2):
+    # Same as the length of nx.shortest_path, which counts the nodes of the path.
+    return O.shortest_path_length(as1)[as2] + 1
+
+def compute_jaccard_overlay(O :EdgeOverlay, as1, as2):
+    union_size = len(set(O.neighbors(as1)) | set(O.neighbors(as2)))
+    if union_size == 0:
+        return 0
+
+    return len(common_neighbors_overlay(O, as1, as2)) / union_size
+
+def compute_adamic_adar_overlay(O :EdgeOverlay, as1, as2):
+    return sum(1 / log(O.degree(w)) for w in common_neighbors_overlay(O, as1, as2))
+
+def compute_preferential_attachment_overlay(O :EdgeOverlay, as1, as2):
+    return O.degree(as1) * O.degree(as2)
+
+def compute_harmonic_closeness_centrality_eccentricity_overlay(O :EdgeOverlay, as1, as2):
+    harm_as1, clos_as1, ecce_as1 = harmonic_closeness_eccentricity_from_dists(O.shortest_path_length(as1), O.number_of_nodes())
+    harm_as2, clos_as2, ecce_as2 = harmonic_closeness_eccentricity_from_dists(O.shortest_path_length(as2), O.number_of_nodes())
+
+    return harm_as1, clos_as1, ecce_as1, harm_as2, clos_as2, ecce_as2
+
+
+# Overlay counterparts of base_func and base_func_link. The features
+# that are not in these dictionaries (pagerank, eigenvector centrality,
+# ...) are global ones and still require a copy of the graph.
+overlay_func = {
+    "degree_centrality": compute_degree_centrality_overlay,
+    "average_neighbor_degree": compute_average_neighbor_degree_overlay,
+    "triangles": compute_triangles_overlay,
+    "clustering": compute_clustering_overlay
+    }
+
+overlay_func_link = {
+    "shortest_path": compute_shortest_path_overlay,
+    "jaccard": compute_jaccard_overlay,
+    "adamic_adar": compute_adamic_adar_overlay,
+    "preferential_attachement": compute_preferential_attachment_overlay
+}
+
+
+####
+# Returns True if all the features that are not excluded can be computed
+# on an EdgeOverlay, i.e., without copying the graph.
+####
+
+def overlay_supported(feat_exclude):
+    for feat in list(base_func.keys()) + list(base_func_link.keys()):
+        if feat not in feat_exclude and feat not in overlay_func and feat not in overlay_func_link:
+            return False
+
+    return True
+
+
+##############################################################
+## Same features computed on a CSRGraph (see csr_graph.py). ##
+## The nodes are integer indices and the neighbors of a   ####
+## node are a slice of a NumPy array, so that the features ###
+## are computed with vectorized operations.               ####
+##############################################################
+
+class CSREdgeOverlay:
+    def __init__(self, C :CSRGraph, as1, as2, with_edge):
+        self.C = C                      # Shared CSR topology, never modified
+        self.with_edge = with_edge      # Whether the link is in the overlay
+        self.dists = dict()             # Cache of the BFS distance arrays
+        self.cache = C.node_cache       # Per-node features of C, if available
+        self.in_graph = False           # Whether the link is in C
+        self.nb_common = None           # Number of common neighbors of the two ends
+
+        # The ends of the link that are not in C get the indices n and n+1,
+        # they only exist when the link is in the overlay.
+        n = len(C)
+        self.u = C.find(as1)
+        self.v = C.find(as2)
+        if (self.u is None or self.v is None) and not with_edge:
+            raise KeyError("{} or {} is not in G".format(as1, as2))
+
+        self.nb_nodes = n
+        if self.u is None:
+            self.u = self.nb_nodes
+            self.nb_nodes += 1
+        if self.v is None:
+            self.v = self.nb_nodes
+            self.nb_nodes += 1
+
+        # Neighbors of the two ends of the link, in the overlay
+        self.nghs = dict()
+        for x, other in [(self.u, self.v), (self.v, self.u)]:
+            nghs = C.neighbors_index(x) if x < n else np.empty(0, dtype=C.indices.dtype)
+            nghs_without = nghs[nghs != other]
+            self.in_graph = len(nghs_without) != len(nghs)
+            nghs = nghs_without
+            if with_edge:
+                nghs = np.append(nghs, np.array([other], dtype=nghs.dtype))
+            self.nghs[x] = nghs
+
+    def number_of_nodes(self):
+        return self.nb_nodes
+
+    def neighbors(self, x):
+        if x in self.nghs:
+            return self.nghs[x]
+
+        return self.C.neighbors_index(x)
+
+    def degree(self, x):
+        return len(self.neighbors(x))
+
+    # Degrees of an array of nodes
+    def degrees(self, nodes):
+        nodes = np.asarray(nodes, dtype=np.int64)
+        res = np.empty(len(nodes), dtype=np.int64)
+        regular = nodes < len(self.C)
+        res[regular] = self.C.degrees[nodes[regular]]
+        res[nodes == self.u] = self.degree(self.u)
+        res[nodes == self.v] = self.degree(self.v)
+
+        return res
+
+    # Concatenation of the neighbors of an array of nodes
+    def gather(self, nodes):
+        is_end = (nodes == self.u) | (nodes == self.v)
+        res = [self.C.gather(nodes[~is_end])]
+        for x in nodes[is_end]:
+            res.append(self.nghs[int(x)])
+
+        return np.concatenate(res)
+
+    # Frontier-vectorized breadth-first search from source. Returns the array of
+    # the distances to source, -1 for the nodes that cannot be reached
+    def shortest_path_length(self, source):
+        if source in self.dists:
+            return self.dists[source]
+
+        dist = np.full(self.nb_nodes, -1, dtype=np.int32)
+        dist[source] = 0
+        level = 0
+        frontier = np.array([source], dtype=np.int64)
+
+        while len(frontier):
+            level += 1
+            nextlevel = self.gather(frontier)
+            nextlevel = np.unique(nextlevel[dist[nextlevel] < 0])
+            dist[nextlevel] = level
+            frontier = nextlevel.astype(np.int64)
+
+        self.dists[source] = dist
+
+        return dist
+
+    # Returns twice the number of triangles and the degree of x
+    def triangles_and_degree(self, x):
+        nghs = self.neighbors(x)
+        mark = np.zeros(self.nb_nodes, dtype=bool)
+        mark[nghs] = True
+
+        return int(np.count_nonzero(mark[self.gather(nghs.astype(np.int64))])), len(nghs)
+
+    def number_of_common_neighbors(self):
+        if self.nb_common is None:
+            self.nb_common = len(np.intersect1d(self.nghs[self.u], self.nghs[self.v], assume_unique=True))
+
+        return self.nb_common
+
+    # With the node feature cache, the features of the two ends of the link are
+    # the cached ones, corrected by the contribution of the link.
+    def triangles(self, x):
+        if self.cache is None:
+            return self.triangles_and_degree(x)[0] // 2
+        if x >= len(self.C):
+            return 0
+
+        # The triangles that contain the link are closed by the common neighbors
+        t = int(self.cache["triangles"][x])
+        if self.in_graph:
+            t -= self.number_of_common_neighbors()
+        if self.with_edge:
+            t += self.number_of_common_neighbors()
+
+        return t
+
+    def nbr_degree_sum(self, x):
+        if self.cache is None:
+            return int(self.degrees(self.neighbors(x)).sum())
+
+        other = self.v if x == self.u else self.u
+        s = int(self.cache["nbr_degree_sum"][x]) if x < len(self.C) else 0
+        if self.in_graph:
+            s -= int(self.C.degrees[other])
+        if self.with_edge:
+            s += self.degree(other)
+
+        return s
+
+def harmonic_closeness_eccentricity_from_dist_array(dist, nb_nodes):
+    dists = dist[dist >= 0].astype(np.int64)
+
+    harm = float(np.sum(1 / dists[dists > 0])) if len(dists) > 1 else 0
+
+    totsp = int(dists.sum())
+    if totsp > 0.0 and nb_nodes > 1:
+        clos = (len(dists)-1.0) / totsp
+        s = (len(dists)-1.0) / ( nb_nodes - 1 )
+        clos *= s
+    else:
+        clos = 0.0
+
+    ecce = int(dists.max())
+
+    return harm, clos, ecce
+
+def compute_degree_centrality_csr(O :CSREdgeOverlay, as1, as2):
+    s = 1.0 / (O.number_of_nodes() - 1.0)
+
+    return O.degree(O.u) * s, O.degree(O.v) * s
+
+def compute_average_neighbor_degree_csr(O :CSREdgeOverlay, as1, as2):
+    res = []
+    for x in [O.u, O.v]:
+        deg = O.degree(x)
+        if deg == 0:
+            deg = 1
+        res.append(O.nbr_degree_sum(x) / float(deg))
+
+    return res[0], res[1]
+
+def compute_triangles_csr(O :CSREdgeOverlay, as1, as2):
+    return O.triangles(O.u), O.triangles(O.v)
+
+def compute_clustering_csr(O :CSREdgeOverlay, as1, as2):
+    res = []
+    for x in [O.u, O.v]:
+        t, d = 2 * O.triangles(x), O.degree(x)
+        res.append(0 if t == 0 else t / (d * (d - 1)))
+
+    return res[0], res[1]
+
+def compute_shortest_path_csr(O :CSREdgeOverlay, as1, as2):
+    d = int(O.shortest_path_length(O.u)[O.v])
+    if d < 0:
+        raise nx.NetworkXNoPath("No path between {} and {}".format(as1, as2))
+
+    return d + 1
+
+def compute_jaccard_csr(O :CSREdgeOverlay, as1, as2):
+    union_size = len(np.union1d(O.neighbors(O.u), O.neighbors(O.v)))
+    if union_size == 0:
+        return 0
+
+    return len(np.intersect1d(O.neighbors(O.u), O.neighbors(O.v), assume_unique=True)) / union_size
+
+def compute_adamic_adar_csr(O :CSREdgeOverlay, as1, as2):
+    common = np.intersect1d(O.neighbors(O.u), O.neighbors(O.v), assume_unique=True)
+    if len(common) == 0:
+        return 0
+
+    return float(np.sum(1 / np.log(O.degrees(common))))
+
+def compute_preferential_attachment_csr(O :CSREdgeOverlay, as1, as2):
+    return O.degree(O.u) * O.degree(O.v)
+
+def compute_harmonic_closeness_centrality_eccentricity_csr(O :CSREdgeOverlay, as1, as2):
+    harm_as1, clos_as1, ecce_as1 = harmonic_closeness_eccentricity_from_dist_array(O.shortest_path_length(O.u), O.number_of_nodes())
+    harm_as2, clos_as2, ecce_as2 = harmonic_closeness_eccentricity_from_dist_array(O.shortest_path_length(O.v), O.number_of_nodes())
+
+    return harm_as1, clos_as1, ecce_as1, harm_as2, clos_as2, ecce_as2
+
+
+# CSR counterparts of overlay_func and overlay_func_link
+csr_func = {
+    "degree_centrality": compute_degree_centrality_csr,
+    "average_neighbor_degree": compute_average_neighbor_degree_csr,
+    "triangles": compute_triangles_csr,
+    "clustering": compute_clustering_csr
+    }
+
+csr_func_link = {
+    "shortest_path": compute_shortest_path_csr,
+    "jaccard": compute_jaccard_csr,
+    "adamic_adar": compute_adamic_adar_csr,
+    "preferential_attachement": compute_preferential_attachment_csr
+}
+
+
+##############################################################
+## Batched computation of the shortest path, harmonic,   #####
+## closeness and eccentricity features for many links.   #####
+## A bit-parallel BFS runs from the two ends of up to 32 #####
+## links at once (one bit of a uint64 per source), each  #####
+## source ignoring its own link. The distances with the  #####
+## link are then obtained by repairing the distances     #####
+## without it, instead of running new BFS.               #####
+##############################################################
+
+BATCH_SIZE = 64             # Number of BFS sources per batch (bits of a uint64)
+DIST_INF = 65535            # Distance of the nodes that cannot be reached
+
+# Runs a bit-parallel BFS from all the sources. The edges in blocked_pos (CSR
+# positions) cannot be used by the sources whose bit is not set in blocked_keep.
+# Returns a (number of nodes x BATCH_SIZE) matrix of distances.
+def bit_parallel_bfs(C :CSRGraph, sources, blocked_pos, blocked_keep):
+    n = len(C)
+    nonempty = C.degrees > 0
+    starts = C.indptr[:-1][nonempty]
+
+    dist = np.full((n, BATCH_SIZE), DIST_INF, dtype=np.uint16)
+    frontier = np.zeros(n, dtype=np.uint64)
+    for b, s in enumerate(sources):
+        frontier[s] |= np.uint64(1) << np.uint64(b)
+        dist[s, b] = 0
+    visited = frontier.copy()
+
+    level = 0
+    while True:
+        level += 1
+
+        # Node i reaches at this level the sources that reached one of its
+        # neighbors at the previous level, except through the blocked edges
+        vals = frontier[C.indices]
+        vals[blocked_pos] &= blocked_keep
+        nextlevel = np.zeros(n, dtype=np.uint64)
+        nextlevel[nonempty] = np.bitwise_or.reduceat(vals, starts)
+
+        nextlevel &= ~visited
+        rows = np.nonzero(nextlevel)[0]
+        if len(rows) == 0:
+            break
+
+        visited |= nextlevel
+        bits = np.unpackbits(nextlevel[rows].view(np.uint8).reshape(len(rows), 8), axis=1, bitorder="little").astype(bool)
+        block = dist[rows]
+        block[bits] = level
+        dist[rows] = block
+
+        frontier = nextlevel
+
+    return dist
+
+# Harmonic, closeness centrality and eccentricity for every column of a
+# distance matrix, same formulas as harmonic_closeness_eccentricity_from_dists
+def harmonic_closeness_eccentricity_from_dist_matrix(dist, nb_nodes):
+    reached = dist != DIST_INF
+    d = np.where(reached, dist, 0).astype(np.int64)
+
+    nb_reached = reached.sum(axis=0)
+    harm = np.where(d > 0, 1 / np.maximum(d, 1), 0.0).sum(axis=0)
+    totsp = d.sum(axis=0)
+    ecce = d.max(axis=0)
+
+    clos = np.zeros(dist.shape[1])
+    valid = (totsp > 0) & (nb_nodes > 1)
+    clos[valid] = ((nb_reached[valid] - 1.0) / totsp[valid]) * ((nb_reached[valid] - 1.0) / (nb_nodes - 1))
+
+    return harm, clos, ecce, nb_reached
+
+def batch_features(dist_as1, dist_as2, as1_index, as2_index, nb_nodes):
+    res = dict()
+
+    d = int(dist_as1[as2_index])
+    res["shortest_path"] = None if d == DIST_INF else d + 1
+
+    harm, clos, ecce, nb_reached = harmonic_closeness_eccentricity_from_dist_matrix(np.stack((dist_as1, dist_as2), axis=1), nb_nodes)
+    for i, end in enumerate(["as1", "as2"]):
+        res["harmonic_centrality_{}".format(end)] = float(harm[i]) if nb_reached[i] > 1 else 0
+        res["closeness_centrality_{}".format(end)] = float(clos[i])
+        res["eccentricity_{}".format(end)] = int(ecce[i])
+
+    return res
+
+
+####
+# Computes the shortest path, harmonic centrality, closeness centrality and
+# eccentricity features of all the links, without and with the link.
+# The links with one AS that is not in C are ignored.
+#
+# @param C              CSRGraph
+# @param links          List of links (as1, as2)
+#
+# Returns a dictionary link -> (features without the link, features with the link)
+####
+
+def compute_harmonic_closeness_eccentricity_batch(C :CSRGraph, links):
+    results = dict()
+
+    # Only keep the links for which the two ends are in C
+    todo = []
+    for (as1, as2) in links:
+        if int(as1) > int(as2):
+            as1, as2 = as2, as1
+        u = C.find(as1)
+        v = C.find(as2)
+        if u is not None and v is not None and u != v and (as1, as2) not in results:
+            results[(as1, as2)] = None
+            todo.append((as1, as2, u, v))
+
+    n = len(C)
+    per_batch = BATCH_SIZE // 2
+
+    for i in range(0, len(todo), per_batch):
+        batch = todo[i:i+per_batch]
+
+        sources = []
+        blocked_pos = []
+        blocked_keep = []
+        for k, (_, _, u, v) in enumerate(batch):
+            sources += [u, v]
+
+            # The two sources of the link cannot use the link itself
+            keep = ~((np.uint64(1) << np.uint64(2*k)) | (np.uint64(1) << np.uint64(2*k+1)))
+            for x, y in [(u, v), (v, u)]:
+                nghs = C.neighbors_index(x)
+                j = np.searchsorted(nghs, y)
+                if j < len(nghs) and nghs[j] == y:
+                    blocked_pos.append(C.indptr[x] + j)
+                    blocked_keep.append(keep)
+
+        dist = bit_parallel_bfs(C, sources, np.array(blocked_pos, dtype=np.int64), np.array(blocked_keep, dtype=np.uint64))
+
+        for k, (as1, as2, u, v) in enumerate(batch):
+            dist_u = dist[:, 2*k]
+            dist_v = dist[:, 2*k+1]
+
+            feats_before = batch_features(dist_u, dist_v, u, v, n)
+
+            # With the link, a node is either reached as before or through the
+            # link, i.e., one hop more than from the other end of the link
+            dist_u_after = np.minimum(dist_u, np.minimum(dist_v.astype(np.int64) + 1, DIST_INF)).astype(np.uint16)
+            dist_v_after = np.minimum(dist_v, np.minimum(dist_u.astype(np.int64) + 1, DIST_INF)).astype(np.uint16)
+
+            feats_after = batch_features(dist_u_after, dist_v_after, u, v, n)
+
+            results[(as1, as2)] = (feats_before, feats_after)
+
+    return results
+
+
+####
+# Same as compute_all_features, but computes the features on the shared graph G
+# in which only the presence of the link (as1, as2) is toggled. G is not modified.
+# G can either be a Networkx graph or a CSRGraph. The features that cannot be
+# computed that way (see overlay_supported) are set to None.
+#
+# @param G              Networkx undirected graph or CSRGraph
+# @param as1            First focus AS
+# @param as2            Second focus AS
+# @param with_edge      Whether the features are computed with or without the link
+# @param feat_exclude   Features to exclude during the computation
+# @param precomputed    Features already computed (e.g., by compute_harmonic_closeness_eccentricity_batch)
+####
+
+def compute_all_features_overlay(G, as1, as2, with_edge, feat_exclude=["pagerank", "eigenvector_centrality", "square_clustering", "number_of_cliques", "simrank_similarity"], precomputed=None):
+
+    results = dict()
+
+    # Switch for convention
+    if int(as1) > int(as2):
+        as1, as2 = as2, as1
+
+    if isinstance(G, CSRGraph):
+        funcs, funcs_link, func_harm = csr_func, csr_func_link, compute_harmonic_closeness_centrality_eccentricity_csr
+        try:
+            O = CSREdgeOverlay(G, as1, as2, with_edge)
+        except KeyError:
+            # One of the AS is not in G, every feature will be None
+            O = None
+    else:
+        funcs, funcs_link, func_harm = overlay_func, overlay_func_link, compute_harmonic_closeness_centrality_eccentricity_overlay
+        O = EdgeOverlay(G, as1, as2, with_edge)
+
+    if precomputed is None:
+        precomputed = dict()
+
+    # Add the two AS in the result dictionary
+    results["as1"] = as1
+    results["as2"] = as2
+
+    # First compute the features for all the per-node features
+    for feat in base_func:
+        if feat not in feat_exclude:
+            if "{}_as1".format(feat) in precomputed:
+                results["{}_as1".format(feat)], results["{}_as2".format(feat)] = precomputed["{}_as1".format(feat)], precomputed["{}_as2".format(feat)]
+                continue
+            if warning_:
+                start = time()
+            try:
+                results["{}_as1".format(feat)], results["{}_as2".format(feat)] = funcs[feat](O, as1, as2)
+            except:
+                results["{}_as1".format(feat)], results["{}_as2".format(feat)] = None, None
+
+            if warning_:
+                stop = time() - start
+                prefix("compute_{}_overlay for link {}-{} took {:.4f} s".format(feat, as1, as2, stop))
+
+    # Then compute the features for all the per-edge features
+    for feat in base_func_link:
+        if feat not in feat_exclude:
+            if feat in precomputed:
+                results[feat] = precomputed[feat]
+                continue
+            if warning_:
+                start = time()
+            try:
+                results[feat] = funcs_link[feat](O, as1, as2)
+            except:
+                # E.g., no path between as1 and as2 without the link
+                results[feat] = None
+
+            if warning_:
+                stop = time() - start
+                prefix("compute_{}_overlay for link {}-{} took {:.4f} s".format(feat, as1, as2, stop))
+
+    if "harmonic_centrality_as1" in precomputed:
+        for end in ["as1", "as2"]:
+            for feat in ["harmonic_centrality", "closeness_centrality", "eccentricity"]:
+                results["{}_{}".format(feat, end)] = precomputed["{}_{}".format(feat, end)]
+        return results
+
+    if warning_:
+        start = time()
+    try:
+        results["harmonic_centrality_as1"], results["closeness_centrality_as1"], results["eccentricity_as1"], results["harmonic_centrality_as2"], results["closeness_centrality_as2"], results["eccentricity_as2"] = func_harm(O, as1, as2)
+    except:
+        results["harmonic_centrality_as1"], results["closeness_centrality_as1"], results["eccentricity_as1"], results["harmonic_centrality_as2"], results["closeness_centrality_as2"], results["eccentricity_as2"] = None, None, None, None, None, None
+
+    if warning_:
+        stop = time() - start
+        prefix("compute_harmonic_closeness_centrality_overlay for link {}-{} took {:.4f} s".format(as1, as2, stop))
+
     return results
 
 if __name__ == "__main__":
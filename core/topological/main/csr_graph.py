@@ -0,0 +1,170 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+import topology_loader
+
+
+# Arrays of a CSRGraph that are moved into shared memory by CSRGraph.share
+SHARED_ARRAYS = ["nodes", "indptr", "indices", "degrees", "node_cache"]
+
+# Shared memory blocks attached by the current process, by name. They are kept
+# for the lifetime of the process so that a worker attaches each block only once.
+attached_shm = dict()
+
+
+####
+# Compact and read-only representation of an undirected AS topology. The
+# ASes are relabelled with integers (their index in the sorted array of ASNs)
+# and the adjacency is stored in CSR format: the neighbors of the node at
+# index i are indices[indptr[i]:indptr[i+1]], sorted in ascending order.
+# Self-loops are not kept.
+####
+
+class CSRGraph:
+    def __init__(self, nodes, indptr, indices):
+        self.nodes = nodes                                  # Sorted ASNs (int64)
+        self.indptr = indptr                                # Row pointers (int64)
+        self.indices = indices                              # Neighbor indices (int32)
+        self.degrees = np.diff(indptr).astype(np.int64)     # Degree of every node
+        self.node_cache = None                              # Optional per-node features (see node_cache.py)
+        self.shm = None                                     # Shared memory blocks, if shared
+
+    ####
+    # Moves the arrays into shared memory. A shared CSRGraph is pickled as the
+    # names of its shared memory blocks only, so that the workers of a process
+    # pool attach the arrays without copying them.
+    ####
+
+    def share(self):
+        if self.shm is not None:
+            return
+
+        self.shm = dict()
+        for name in SHARED_ARRAYS:
+            arr = getattr(self, name)
+            if arr is None:
+                continue
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            shared = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+            shared[...] = arr
+            setattr(self, name, shared)
+            self.shm[name] = shm
+
+    ####
+    # Moves the arrays back into the memory of the process and frees the
+    # shared memory blocks. Must be called by the process that called share.
+    ####
+
+    def release(self):
+        if self.shm is None:
+            return
+
+        for name, shm in self.shm.items():
+            setattr(self, name, np.array(getattr(self, name)))
+            shm.close()
+            shm.unlink()
+        self.shm = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.shm is not None:
+            for name, shm in self.shm.items():
+                state[name] = (shm.name, state[name].shape, state[name].dtype)
+            state["shm"] = list(self.shm.keys())
+
+        return state
+
+    def __setstate__(self, state):
+        shared = state["shm"]
+        if shared is not None:
+            for name in shared:
+                shm_name, shape, dtype = state[name]
+                if shm_name not in attached_shm:
+                    attached_shm[shm_name] = shared_memory.SharedMemory(name=shm_name)
+                arr = np.ndarray(shape, dtype=dtype, buffer=attached_shm[shm_name].buf)
+                arr.flags.writeable = False
+                state[name] = arr
+
+            # Only the process that created the blocks owns them
+            state["shm"] = None
+
+        self.__dict__.update(state)
+
+    @classmethod
+    def from_edges(cls, src, dst):
+        return cls(*topology_loader.build_csr(src, dst))
+
+    @classmethod
+    def from_nx(cls, G):
+        src = np.fromiter((int(as1) for as1, _ in G.edges), dtype=np.int64, count=G.number_of_edges())
+        dst = np.fromiter((int(as2) for _, as2 in G.edges), dtype=np.int64, count=G.number_of_edges())
+
+        return cls.from_edges(src, dst)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, asn):
+        return self.has_node(asn)
+
+    def number_of_nodes(self):
+        return len(self.nodes)
+
+    def number_of_edges(self):
+        return len(self.indices) // 2
+
+    # Returns the index of the AS, or None if it is not in the graph
+    def find(self, asn):
+        asn = int(asn)
+        i = int(np.searchsorted(self.nodes, asn))
+        if i < len(self.nodes) and self.nodes[i] == asn:
+            return i
+
+        return None
+
+    def index(self, asn):
+        i = self.find(asn)
+        if i is None:
+            raise KeyError(asn)
+
+        return i
+
+    def has_node(self, asn):
+        return self.find(asn) is not None
+
+    def neighbors_index(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i+1]]
+
+    def has_edge(self, as1, as2):
+        i = self.find(as1)
+        j = self.find(as2)
+        if i is None or j is None:
+            return False
+
+        nghs = self.neighbors_index(i)
+        k = np.searchsorted(nghs, j)
+
+        return bool(k < len(nghs) and nghs[k] == j)
+
+    # Concatenation of the neighbors of all the nodes in rows
+    def gather(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        lengths = self.degrees[rows]
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=self.indices.dtype)
+
+        offsets = np.repeat(self.indptr[rows] - np.cumsum(lengths) + lengths, lengths)
+
+        return self.indices[offsets + np.arange(total)]
+
+
+####
+# Loads a topology file (one "as1 as2" link per line) directly into a CSRGraph.
+# The binary snapshot written by the merger is memory-mapped when available.
+####
+
+def load_topo_file(fn):
+    topo = topology_loader.load_topology(fn)
+
+    return CSRGraph(topo.asns, topo.indptr, topo.indices)
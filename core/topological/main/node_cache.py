@@ -0,0 +1,113 @@
+import numpy as np
+import os
+
+import utils as ut
+from csr_graph import CSRGraph
+
+
+# Columns of the per-node feature cache. Rows are sorted by ASN, i.e., row i
+# corresponds to the node at index i of the CSRGraph of the same topology.
+NODE_CACHE_DTYPE = np.dtype([
+    ("asn", np.int64),              # ASN of the node
+    ("degree", np.int64),           # Degree of the node
+    ("triangles", np.int64),        # Number of triangles the node belongs to
+    ("nbr_degree_sum", np.int64)    # Sum of the degrees of the neighbors
+])
+
+
+def node_cache_file(fn_topo):
+    return "{}_nodefeat.npy".format(fn_topo[:-4] if fn_topo.endswith(".txt") else fn_topo)
+
+
+####
+# Computes the node features of all the nodes of C. The triangles are counted
+# once each, by orienting every link from the lower-degree end to the other.
+####
+
+def build_node_cache(C :CSRGraph, chunk_size: int=10000000):
+    n = len(C)
+    cache = np.zeros(n, dtype=NODE_CACHE_DTYPE)
+    cache["asn"] = C.nodes
+    cache["degree"] = C.degrees
+
+    # Sum of the degrees of the neighbors of every node
+    rows = np.repeat(np.arange(n), C.degrees)
+    cache["nbr_degree_sum"] = np.bincount(rows, weights=C.degrees[C.indices], minlength=n).astype(np.int64)
+
+    # Rank of every node: degree first, index second
+    rank = np.empty(n, dtype=np.int64)
+    rank[np.lexsort((np.arange(n), C.degrees))] = np.arange(n)
+
+    # Out-neighbors of every node in the oriented graph, in CSR format
+    forward = rank[C.indices] > rank[rows]
+    out_indices = C.indices[forward]
+    out_indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows[forward], minlength=n), out=out_indptr[1:])
+
+    # Sorted keys (i * n + j) of the oriented links, to look up the closing links
+    out_rows = rows[forward]
+    out_keys = out_rows * n + out_indices
+
+    # Every oriented link (i, j) opens one wedge (i, j, k) per out-neighbor k
+    # of j; the wedges are built by chunks of about chunk_size.
+    lengths_all = np.diff(out_indptr)[out_indices]
+    bounds = np.searchsorted(np.cumsum(lengths_all), np.arange(chunk_size, int(lengths_all.sum()) + chunk_size, chunk_size), side='right')
+
+    triangles = np.zeros(n, dtype=np.int64)
+    start = 0
+    for stop in np.unique(np.append(bounds, len(out_indices))).tolist():
+        if stop <= start:
+            continue
+
+        lengths = lengths_all[start:stop]
+        total = int(lengths.sum())
+        if total > 0:
+            src = np.repeat(out_rows[start:stop], lengths)
+            mid = np.repeat(out_indices[start:stop], lengths)
+            offsets = np.repeat(out_indptr[out_indices[start:stop]] - np.cumsum(lengths) + lengths, lengths)
+            ends = out_indices[offsets + np.arange(total)]
+
+            # Each closed wedge (i, j, k) is a triangle
+            keys = src * n + ends
+            pos = np.minimum(np.searchsorted(out_keys, keys), len(out_keys) - 1)
+            closed = out_keys[pos] == keys
+            triangles += np.bincount(np.concatenate((src[closed], mid[closed], ends[closed])), minlength=n)
+
+        start = stop
+
+    cache["triangles"] = triangles
+
+    return cache
+
+
+####
+# Loads the node feature cache of the topology in fn_topo, memory-mapped.
+# The cache is (re)built if it does not exist, is older than the topology
+# file, or does not match the nodes of C.
+####
+
+def load_node_cache(fn_topo, C :CSRGraph):
+    fn_cache = node_cache_file(fn_topo)
+
+    if os.path.exists(fn_cache) and os.path.getmtime(fn_cache) >= os.path.getmtime(fn_topo):
+        try:
+            cache = np.load(fn_cache, mmap_mode="r")
+            if cache.dtype == NODE_CACHE_DTYPE and len(cache) == len(C) and np.array_equal(cache["asn"], C.nodes):
+                return cache
+        except (ValueError, OSError):
+            pass
+        ut.wrn_msg("Node feature cache {} does not match the topology, rebuilt".format(fn_cache))
+
+    cache = build_node_cache(C)
+
+    # Write in a temporary file first, so that concurrent readers never see a partial cache
+    try:
+        fn_tmp = "{}.{}.tmp".format(fn_cache, os.getpid())
+        with open(fn_tmp, "wb") as f:
+            np.save(f, cache)
+        os.replace(fn_tmp, fn_cache)
+    except OSError:
+        ut.wrn_msg("Unable to write the node feature cache {}".format(fn_cache))
+        return cache
+
+    return np.load(fn_cache, mmap_mode="r")
@@ -1,6 +1,8 @@
 from cgitb import reset
 from concurrent.futures import ProcessPoolExecutor
 import compute_topo_features as cptf
+import csr_graph
+import node_cache
 import os
 from colorama import Fore, Style
 import utils as ut
@@ -139,11 +141,18 @@ class TopoFeatComputer:
             print_prefix("Loading topology graph...")
 
             start_ts = time()
-            # Then load it
-            self.G = ut.load_topo_file(fn_topo)
+            # Then load it. The CSR representation is much more compact, but it
+            # only supports the features that can be computed on an overlay
+            if cptf.overlay_supported(self.feat_to_remove):
+                self.G = csr_graph.load_topo_file(fn_topo)
+
+                # Per-node features, built once per day and shared by all the links
+                self.G.node_cache = node_cache.load_node_cache(fn_topo, self.G)
+            else:
+                self.G = ut.load_topo_file(fn_topo)
             stop_ts = time()
 
-            print_prefix("Topology loaded in {:.4f} s ({} links)".format(stop_ts - start_ts, len(self.G.edges)))
+            print_prefix("Topology loaded in {:.4f} s ({} links)".format(stop_ts - start_ts, self.G.number_of_edges()))
 
         # Else, raise an error
         else:
@@ -152,11 +161,49 @@ class TopoFeatComputer:
             
 
 
+    ####
+    # Same as compute_one_link, but the features with and without the link are
+    # computed on an overlay of self.G, which avoids copying the graph for every link
+    ####
+
+    def compute_one_link_overlay(self, as1, as2, precomputed=None):
+        # Features already computed in batch, without and with the link
+        pre_before, pre_after = precomputed if precomputed is not None else (None, None)
+
+        # Compute the features without the edge
+        if not self.G.has_node(as1) or not self.G.has_node(as2):
+            ut.wrn_msg("Either {} or {} is not in G".format(as1, as2))
+            feats_before = cptf.res_zero
+        else:
+            feats_before = cptf.compute_all_features_overlay(self.G, as1, as2, False, feat_exclude=self.feat_to_remove, precomputed=pre_before)
+
+        if None in list(feats_before.values()):
+            feats_before = cptf.res_zero
+
+        # Compute the features after the edge apears
+        feats_after = cptf.compute_all_features_overlay(self.G, as1, as2, True, feat_exclude=self.feat_to_remove, precomputed=pre_after)
+
+        if None in list(feats_after.values()):
+            return None
+
+        diff_feat = dict()
+
+        # Compute the difference between each feature
+        for feat in feats_after.keys():
+            if feat not in ["as1", "as2"]:
+                diff_feat[feat] = feats_after[feat] - feats_before[feat]
+
+        # append the ases
+        diff_feat["as1"] = as1
+        diff_feat["as2"] = as2
+
+        return diff_feat
+
     ####
     # Function used to compute the topological-based features for one single link
     ####
 
-    def compute_one_link(self, as1, as2):
+    def compute_one_link(self, as1, as2, precomputed=None):
         ret = False
 
         # First check if both nodes are in the graph
@@ -167,6 +214,16 @@ class TopoFeatComputer:
 
         cptf.warning_ = self.debug
 
+        # When all the requested features support it, compute the features on an
+        # overlay of the shared graph rather than on a copy of it.
+        if isinstance(self.G, csr_graph.CSRGraph):
+            # Self-loops are not kept in the CSR representation
+            if as1 == as2:
+                return None
+            return self.compute_one_link_overlay(as1, as2, precomputed)
+        if as1 != as2 and cptf.overlay_supported(self.feat_to_remove):
+            return self.compute_one_link_overlay(as1, as2)
+
         topo = self.G.copy()
 
         # Remove the edge (only if it is a negative sample)
@@ -210,8 +267,14 @@ class TopoFeatComputer:
     def compute_bunch_links(self, links):
         all_res = []
 
+        # With the CSR representation, the BFS-based features of all the
+        # links are computed at once
+        batch = dict()
+        if isinstance(self.G, csr_graph.CSRGraph):
+            batch = cptf.compute_harmonic_closeness_eccentricity_batch(self.G, links)
+
         for (as1, as2) in links:
-            all_res.append((self.compute_one_link(as1, as2), as1, as2))
+            all_res.append((self.compute_one_link(as1, as2, batch.get((as1, as2))), as1, as2))
 
         return all_res
 
@@ -246,24 +309,33 @@ class TopoFeatComputer:
 
             proc_list = []
 
-            with ProcessPoolExecutor(max_workers=self.max_workers) as exec:
-                for i in range(0, len(all_chunks)):
-                    proc_list.append(exec.submit(self.compute_bunch_links, list(all_chunks[i])))
-
-                for p in proc_list:
-                    res = p.result()
-
-                    # For each edge in result
-                    for (feats, as1, as2) in res:
-                        # For each feature of the edge
-                        if feats is None:
-                            ut.err_msg("Link {} {} cannot be computed because either {} or {} are not in G, skipped...".format(as1, as2, as1, as2))
-                        else:
-                            if None in list(feats.values()):
-                                ut.err_msg("Link {} {} cannot be computed because of a Networkx error, skipped...".format(as1, as2))
+            # The CSR topology is put in shared memory, so that the workers
+            # attach it instead of receiving a copy of it
+            if isinstance(self.G, csr_graph.CSRGraph):
+                self.G.share()
+
+            try:
+                with ProcessPoolExecutor(max_workers=self.max_workers) as exec:
+                    for i in range(0, len(all_chunks)):
+                        proc_list.append(exec.submit(self.compute_bunch_links, list(all_chunks[i])))
+
+                    for p in proc_list:
+                        res = p.result()
+
+                        # For each edge in result
+                        for (feats, as1, as2) in res:
+                            # For each feature of the edge
+                            if feats is None:
+                                ut.err_msg("Link {} {} cannot be computed because either {} or {} are not in G, skipped...".format(as1, as2, as1, as2))
                             else:
-                                for (feat, val) in feats.items():
-                                    self.feats[feat].append(val)
+                                if None in list(feats.values()):
+                                    ut.err_msg("Link {} {} cannot be computed because of a Networkx error, skipped...".format(as1, as2))
+                                else:
+                                    for (feat, val) in feats.items():
+                                        self.feats[feat].append(val)
+            finally:
+                if isinstance(self.G, csr_graph.CSRGraph):
+                    self.G.release()
 
         tick = time() - start
         print_prefix("Link list for day {} took {:.4f} s".format(self.date, tick))
@@ -133,7 +133,7 @@ class Checker:
         success = True
 
         fn = self.db_dir+"/paths/{}_paths.txt".format(date.replace(day=1).strftime("%Y-%m-%d"))
-        if not os.path.isfile(fn): 
+        if not os.path.isfile(fn) and not os.path.isfile(fn+".gz"): 
             if not silent:
                 print (self.print_prefix()+"Missing {}".format(fn))
             success = False
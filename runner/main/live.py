@@ -47,6 +47,8 @@ def run_docker_live(db_dir, docker_image, nb_vps, log_name):
 
     print (print_prefix()+"DONE: {}".format(log_name))
 
+# Fills the nodes' features cache of the peeringdb container for that day, so
+# that the inferences running in parallel do not all compute them.
 def create_peeringdb_cache(db_dir, date):
     # kill and remove the docker container.
     subprocess.run("docker kill peeringdb_live_cache", shell=True)
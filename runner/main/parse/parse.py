@@ -6,6 +6,8 @@ import psycopg2
 import pytricia
 import pandas as pd
 
+from topo.suspicious_store import SuspiciousEdgeStore
+
 
 class Parser:
     def __init__(self, db_dir: str, date: str, store_results_in_db: bool, store_results_in_file: bool):
@@ -224,6 +226,9 @@ class Parser:
                         dic_tags[(as1, as2)]['local'] = [True]
                         
 
+        # Cases of the day, recorded in the suspicious edges store at the end.
+        cases = []
+
         # Prepare file and database connections outside the loop
         fd_out = None
         conn :psycopg2.extensions.connection = None
@@ -260,6 +265,8 @@ class Parser:
                     else:
                         sus += 1
                     asp_count = count_0 + count_1
+
+                cases.append((as1, as2, 'leg' if sus == 0 else 'sus'))
                 
                 # Write to file if enabled
                 if fd_out:
@@ -353,6 +360,11 @@ class Parser:
             if conn:
                 conn.close()
 
+        # Update the state of the suspicious edges with the cases of the day.
+        outfile = "{}/cases/{}".format(self.db_dir, self.date.strftime("%Y-%m-%d"))
+        with SuspiciousEdgeStore(self.db_dir) as store:
+            store.record_day(self.date, cases, os.path.getmtime(outfile) if self.write_cases_file else 0)
+
 # def parse_dir(indir, outdir):
 #     onlyfiles = [f for f in listdir(indir) if isfile(join(indir, f))]
 
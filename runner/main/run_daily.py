@@ -60,6 +60,7 @@ def run_database(date :str, db_dir):
             --nb_vps=200 \
             --max_workers=5 \
             --max_workers_rib=2 \
+            --api_cache_dir=\"/tmp/db/api_cache\" \
             --db_dir=\"/tmp/db/\"".format(date.strftime("%Y-%m-%d"))
 
         run_cmd(db_dir, "unistrahijackdetection/dfoh_db", [command], date, 'database')
@@ -82,7 +83,8 @@ def run_database(date :str, db_dir):
             --db_dir=\"/tmp/db/\" \
             --nbdays=300 \
             --max_workers=10 \
-            --override=0".format(date.strftime("%Y-%m-%d"), (date + timedelta(days=1)).strftime("%Y-%m-%d"))
+            --override=0 \
+            --incremental=1".format(date.strftime("%Y-%m-%d"), (date + timedelta(days=1)).strftime("%Y-%m-%d"))
         
         run_cmd(db_dir, "unistrahijackdetection/dfoh_newedge", [command], date, 'merger')
 
@@ -187,6 +189,7 @@ def run_new_edges(date, db_dir, store_results_in_db, store_results_in_file):
             --db_dir=\"/tmp/db/\" \
             --store_results_in_db={} \
             --store_results_in_file={} \
+            --api_cache_dir=\"/tmp/db/api_cache\" \
             --max_workers=1".format(date.strftime("%Y-%m-%d"), store_results_in_db, store_results_in_file)
             # max_workers needs to be set to 1 because bgproutesapi does not support parallel downloads by default.
             # If you want to use parallel downloads, please contact the team: contact@bgproutes.io
@@ -95,7 +95,7 @@ class RequestBroker:
 @click.option("--store_results_in_db", default=False, help='If True, store results in PostrgreSQL db.', type=bool)
 @click.option("--input_file", default=None, help="File where each line contains an AS link and the corresponding AS path (comma separated). Output is printed in outfile.", type=str)
 @click.option("--input_link", default=None, help="String with link and as path in the form as1-as2-aspath1,aspath2,.... Output is printed in stdout", type=str)
-@click.option("--peeringdb_clean", default=True, help="Boolean indicating whether temporary files (which are long to generate) should be cleaned up or not for the peeringdb features", type=bool)
+@click.option("--peeringdb_clean", default=True, help="Boolean indicating whether the cache of the nodes' peeringdb features (which are long to generate) should be trimmed to its most recent days or not", type=bool)
 @click.option("--outfile", default="results.txt", help="File where to store the results in text format (when using input_file)", type=str)
 
 
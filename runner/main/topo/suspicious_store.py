@@ -0,0 +1,130 @@
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+from colorama import Fore
+from colorama import Style
+
+
+####
+# Persistent state of the suspicious edges, in db_dir/suspicious_edges.sqlite.
+#
+#   edge_case(as1, as2, date, classification)   one row per edge and per day
+#       with a case, 'sus' or 'leg', with as1 < as2.
+#   case_day(date, mtime)   days already recorded, with the modification time
+#       of their cases/<date> file (0 if there is none).
+#
+# The parser records the cases of each day once they are inferred. Days with a
+# cases file that is not (or no longer) recorded are read back from cases/,
+# so the store is rebuilt automatically if it is missing.
+####
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS edge_case (
+    as1 INTEGER NOT NULL,
+    as2 INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    classification TEXT NOT NULL,
+    PRIMARY KEY (as1, as2, date)
+);
+CREATE INDEX IF NOT EXISTS edge_case_date ON edge_case (date);
+CREATE TABLE IF NOT EXISTS case_day (
+    date TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+);
+"""
+
+# Suspicious cases seen in the window that are not followed by a legitimate
+# case of the same edge, with the date of the first of them.
+QUERY_SUSPICIOUS = """
+SELECT s.as1, s.as2, MIN(s.date) FROM edge_case s
+WHERE s.classification = 'sus' AND s.date >= ? AND s.date < ?
+AND NOT EXISTS (
+    SELECT 1 FROM edge_case l
+    WHERE l.as1 = s.as1 AND l.as2 = s.as2 AND l.classification = 'leg'
+    AND l.date >= s.date AND l.date < ?
+)
+GROUP BY s.as1, s.as2
+"""
+
+
+class SuspiciousEdgeStore:
+    def __init__(self, db_dir: str):
+        self.db_dir = db_dir
+        self.filename = db_dir+'/suspicious_edges.sqlite'
+
+        self.conn = sqlite3.connect(self.filename, timeout=60)
+        self.conn.executescript(SCHEMA)
+
+    def print_prefix():
+        return Fore.MAGENTA+Style.BRIGHT+"[SuspiciousEdgeStore]: "+Style.NORMAL
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    ####
+    # Records the cases of a day, given as a list of (as1, as2, classification).
+    # The cases previously recorded for that day are replaced.
+    ####
+
+    def record_day(self, date, cases, mtime=0):
+        datestr = date.strftime("%Y-%m-%d")
+        rows = [(min(int(as1), int(as2)), max(int(as1), int(as2)), datestr, classification) for as1, as2, classification in cases]
+
+        with self.conn:
+            self.conn.execute("DELETE FROM edge_case WHERE date = ?", (datestr,))
+            self.conn.executemany("INSERT OR REPLACE INTO edge_case VALUES (?, ?, ?, ?)", rows)
+            self.conn.execute("INSERT OR REPLACE INTO case_day VALUES (?, ?)", (datestr, mtime))
+
+    def read_cases_file(case_filename):
+        cases = []
+        with open(case_filename, 'r') as fd:
+            for line in fd:
+                if line.startswith('!sus') or line.startswith('!leg'):
+                    linetab = line.rstrip().split(' ')
+                    cases.append((linetab[1], linetab[2], linetab[0][1:]))
+
+        return cases
+
+    # Records the cases files of the window [start, end) that are not recorded yet or that changed since.
+    def sync_cases(self, start, end):
+        recorded = dict(self.conn.execute("SELECT date, mtime FROM case_day WHERE date >= ? AND date < ?", \
+            (start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))).fetchall())
+
+        nb_synced = 0
+        cur_date = start
+        while cur_date < end:
+            datestr = cur_date.strftime("%Y-%m-%d")
+            case_filename = self.db_dir+'/cases/'+datestr
+            if os.path.isfile(case_filename):
+                mtime = os.path.getmtime(case_filename)
+                if datestr not in recorded or recorded[datestr] < mtime:
+                    self.record_day(cur_date, SuspiciousEdgeStore.read_cases_file(case_filename), mtime)
+                    nb_synced += 1
+            cur_date += timedelta(days=1)
+
+        if nb_synced > 0:
+            print (SuspiciousEdgeStore.print_prefix()+"{} days of cases recorded from {}/cases.".format(nb_synced, self.db_dir))
+
+    ####
+    # Returns the edges that are suspicious at the given date, considering the
+    # cases of the nbdays previous days: {(as1, as2): date of the first suspicious case}.
+    ####
+
+    def suspicious_edges(self, date, nbdays):
+        start = date - timedelta(days=nbdays)
+        self.sync_cases(start, date)
+
+        startstr = start.strftime("%Y-%m-%d")
+        endstr = date.strftime("%Y-%m-%d")
+        suspicious_edges = {}
+        for as1, as2, first_date in self.conn.execute(QUERY_SUSPICIOUS, (startstr, endstr, endstr)):
+            suspicious_edges[(as1, as2)] = datetime.strptime(first_date, "%Y-%m-%d").date()
+
+        return suspicious_edges
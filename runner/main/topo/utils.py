@@ -9,6 +9,8 @@ init(autoreset=True)
 
 from datetime import date, datetime, timedelta
 
+from topo.suspicious_store import SuspiciousEdgeStore
+
 
 def print_prefix():
     return Fore.YELLOW+Style.BRIGHT+"[NewEdgeFinder]: "+Style.NORMAL
@@ -21,31 +23,9 @@ def daterange(start_date, end_date):
 def load_topo(db_dir, nbdays=300):
     topo = nx.Graph()
 
-    # Get the date for the first day of the X previous month.
-    first_day = date.today() - timedelta(days=nbdays)
-
     # All the suspicious cases detected the last nbdays days (to omit them).
-    suspicious_edges = {}
-    for cur_date in daterange(first_day, date.today()):
-        case_filename = db_dir+'/cases/'+cur_date.strftime("%Y-%m-%d")
-        if os.path.isfile(case_filename):
-            with open(case_filename, 'r') as fd:
-                for line in fd.readlines():
-                    if line.startswith('!sus'):
-                        linetab = line.rstrip().split(' ')
-                        as1 = int(linetab[1])
-                        as2 = int(linetab[2])
-
-                        if (as1, as2) not in suspicious_edges:
-                            suspicious_edges[(as1, as2)] = cur_date
-
-                    if line.startswith('!leg'):
-                        linetab = line.rstrip().split(' ')
-                        as1 = int(linetab[1])
-                        as2 = int(linetab[2])
-                        if (as1, as2) in suspicious_edges:
-                            del suspicious_edges[(as1, as2)]
-
+    with SuspiciousEdgeStore(db_dir) as store:
+        suspicious_edges = store.suspicious_edges(date.today(), nbdays)
 
     delta = 1
     filename = db_dir+'/merged_topology/'+(date.today() - timedelta(days=delta)).strftime("%Y-%m-%d")+".txt"